@@ -22,10 +22,14 @@
 
 # COMMAND ----------
 
-version = "v3.0.81"
+import os, sys
+sys.path.append(os.path.abspath("CloudLabs" if os.path.isdir("CloudLabs") else "../CloudLabs"))
+
+from library_cache import dbacademy_pip_command
 
-library_url = f"https://github.com/databricks-academy/dbacademy/releases/download/{version}/dbacademy-{version[1:]}-py3-none-any.whl"
-pip_command = f"install --quiet --disable-pip-version-check {library_url}"
+# Installed from the library cache in DBFS, and not at all when already installed; see library_cache.py
+version = "v3.0.81"
+pip_command = dbacademy_pip_command(version)
 
 # And print just for reference...
 print(pip_command)
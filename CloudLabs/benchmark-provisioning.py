@@ -0,0 +1,198 @@
+"""
+Benchmarks the provisioning (create_workspace), shared datasets (attach_shared_datasets), audit (get_workspace_config)
+and teardown (remove_workspace) flows against a local MockDatabricksServer at several fleet sizes, reporting throughput and the number of REST calls each
+flow makes per workspace.
+
+    python benchmark-provisioning.py --scales 1,10,100 --output bench.json
+    python benchmark-provisioning.py --latency-ms 50 --rate-limit 0.01 --baseline bench.json
+
+Each flow is also held to a declared budget of REST calls per workspace (see CALL_BUDGETS), counted on the client
+side so that retries do not count against it; the run fails when a flow exceeds its budget. With --baseline, the run
+also fails when any flow makes more requests per workspace than the baseline did, so request-count regressions are
+caught without a live workspace.
+"""
+import argparse, contextlib, importlib.util, io, json, os, sys, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+
+from mock_databricks_server import MockDatabricksServer
+from simplified_rest_client import count_calls, assert_call_budget
+from client_registry import clients
+from scim_directory_cache import ScimDirectoryCache
+import preflight
+from shared_datasets import attach_shared_datasets
+
+
+def load_script(file_name: str, module_name: str):
+    """The CloudLabs scripts are not importable by name because of the hyphens in their file names."""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(os.path.dirname(os.path.abspath(__file__)), file_name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+setup_script = load_script("cloudlabs-setup-script.py", "cloudlabs_setup_script")
+check_config_script = load_script("cloudlabs-check-config-script.py", "cloudlabs_check_config_script")
+
+# The setup job's spec, read from the repo rather than downloaded from GitHub
+JOB_SPEC_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "universal-workspace-setup-job-config.json")
+
+
+# REST calls allowed per workspace for each flow. The mock completes workspace provisioning and the setup job on the
+# first poll, so a single poll of each is included; against a live workspace, polls add to these. Provisioning
+# includes fetching the compute catalog for the preflight, which only the first workspace of a cloud does.
+CALL_BUDGETS = {
+    "provisioning": lambda config: 33 + 2 * len(config.instructors) + len(config.users),
+    "shared-datasets": lambda config: 12,
+    "audit": lambda config: 11,
+    "teardown": lambda config: 8,
+}
+
+
+def make_config(server: MockDatabricksServer, index: int, user_count: int):
+    workspace_name = f"classroom-{index:03d}"
+    return setup_script.WorkspaceConfig(
+        account_id="mock-account",
+        account_username="mock",
+        account_password="mock",
+        cloud="AWS",
+        lab_id=index,
+        lab_description=f"Classroom {index:03d}",
+        workspace_name=workspace_name,
+        region="us-west-2",
+        instructors=[f"instructor+{index:03d}@databricks.com"],
+        instructors_group_name=f"instructors-{workspace_name}",
+        users=setup_script.generate_usernames(1, user_count),
+        default_dbr="11.3.x-cpu-ml-scala2.12",
+        default_node_type_id="i3.xlarge",
+        credentials_name="default",
+        storage_configuration="us-west-2",
+        uc_storage_root="s3://unity-catalogs-us-west-2/",
+        uc_aws_iam_role_arn="arn:aws:iam::000000000000:role/Unity-Catalog-Role",
+        uc_msa_access_connector_id=None,
+        entitlements={"allow-cluster-create": False, "databricks-sql-access": True, "workspace-access": True},
+        job_name="DBAcademy Workspace-Setup",
+        courseware_urls=list(),
+        datasets=["example-course"],
+        accounts_url=server.url,
+        workspace_url_format=server.url + "/{deployment_name}",
+        job_spec_path=JOB_SPEC_PATH,
+    )
+
+
+def audit_workspace(server: MockDatabricksServer, config) -> dict:
+    client = clients.get(url=server.workspace_url(config.workspace_name), token="mock")
+    return check_config_script.get_workspace_config(client)
+
+
+def attach_datasets(server: MockDatabricksServer, config) -> str:
+    client = clients.get(url=server.workspace_url(config.workspace_name), token="mock")
+    return attach_shared_datasets(client, "s3://dbacademy-datasets-us-west-2/datasets/", credential_name=config.workspace_name)
+
+
+def run_flow(server: MockDatabricksServer, flow: str, function, configs: list, workers: int) -> dict:
+    server.reset_counters()
+    start = time.time()
+    with count_calls() as stats, contextlib.redirect_stdout(io.StringIO()):  # The flows are chatty; keep the report readable.
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(function, configs))
+    seconds = time.time() - start
+
+    budget = sum(CALL_BUDGETS[flow](c) for c in configs)
+    try:
+        assert_call_budget(stats, budget, f"The {flow} flow")
+        budget_error = None
+    except AssertionError as e:
+        budget_error = str(e)
+
+    return {
+        "flow": flow,
+        "workspaces": len(configs),
+        "seconds": round(seconds, 3),
+        "workspaces_per_second": round(len(configs) / seconds, 3),
+        "calls": stats.total,
+        "call_budget": budget,
+        "call_budget_error": budget_error,
+        "retries": stats.retries,
+        "requests": server.request_count,
+        "requests_per_workspace": round(server.request_count / len(configs), 2),
+        "connections": server.connection_count,
+        "request_bytes": server.bytes_received,
+        "response_bytes": server.bytes_sent,
+        "endpoints": {f"{method} {route}": count for (method, route), count in sorted(server.requests.items())},
+    }
+
+
+def benchmark(scale: int, args: argparse.Namespace) -> list[dict]:
+    with MockDatabricksServer(latency_seconds=args.latency_ms / 1000,
+                              rate_limit_probability=args.rate_limit,
+                              request_limit_exceeded_probability=args.request_limit_exceeded,
+                              seed=args.seed) as server:
+        configs = [make_config(server, i, args.users) for i in range(1, scale + 1)]
+        cache_dir = tempfile.TemporaryDirectory()
+        # Each scale starts with empty directory and compute catalog caches, as a fleet on a fresh machine would
+        setup_script.directory_cache = ScimDirectoryCache(os.path.join(cache_dir.name, "scim-directory.sqlite"))
+        preflight.catalog_cache = preflight.ComputeCatalogCache(cache_dir.name)
+        try:
+            return [
+                {"scale": scale, **run_flow(server, "provisioning", setup_script.create_workspace, configs, args.workers)},
+                {"scale": scale, **run_flow(server, "shared-datasets", lambda c: attach_datasets(server, c), configs, args.workers)},
+                {"scale": scale, **run_flow(server, "audit", lambda c: audit_workspace(server, c), configs, args.workers)},
+                {"scale": scale, **run_flow(server, "teardown", setup_script.remove_workspace, configs, args.workers)},
+            ]
+        finally:
+            clients.close()  # The server, and with it every pooled connection, goes away with this scale
+            cache_dir.cleanup()
+
+
+def find_regressions(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    expected = {(r.get("scale"), r.get("flow")): r for r in baseline}
+    regressions = list()
+    for result in results:
+        previous = expected.get((result.get("scale"), result.get("flow")))
+        if previous is None:
+            continue
+        if result.get("requests_per_workspace") > previous.get("requests_per_workspace") * (1 + tolerance):
+            regressions.append(f"""{result.get("flow")} at {result.get("scale")} workspaces: {result.get("requests_per_workspace")} requests per workspace, """
+                               f"""baseline {previous.get("requests_per_workspace")}""")
+    return regressions
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="1,10,100", help="Comma separated numbers of workspaces to provision.")
+    parser.add_argument("--users", type=int, default=5, help="Users added to each workspace.")
+    parser.add_argument("--workers", type=int, default=8, help="Workspaces processed concurrently.")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency added to every request by the mock server.")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Probability of a 429 response.")
+    parser.add_argument("--request-limit-exceeded", type=float, default=0.0, help="Probability of a 500 REQUEST_LIMIT_EXCEEDED response.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", help="Fail if requests per workspace exceed those of this results file.")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="Allowed fractional increase over the baseline.")
+    args = parser.parse_args(argv)
+
+    results = list()
+    for scale in [int(s) for s in args.scales.split(",")]:
+        results.extend(benchmark(scale, args))
+
+    print(f"{'scale':>6} {'flow':<16} {'seconds':>9} {'ws/sec':>8} {'calls':>7} {'budget':>7} {'requests':>9} {'req/ws':>8} {'conns':>6} {'KiB req':>9} {'KiB resp':>9}")
+    for r in results:
+        print(f"{r['scale']:>6} {r['flow']:<16} {r['seconds']:>9.3f} {r['workspaces_per_second']:>8.2f} {r['calls']:>7} {r['call_budget']:>7} {r['requests']:>9} "
+              f"{r['requests_per_workspace']:>8.2f} {r['connections']:>6} {r['request_bytes'] / 1024:>9.1f} {r['response_bytes'] / 1024:>9.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    regressions = [r.get("call_budget_error") for r in results if r.get("call_budget_error")]
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions.extend(find_regressions(results, json.load(f), args.tolerance))
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Replays a recorded course query mix against a SQL warehouse, as a class of students working through the course at
+once, measuring query latency and calibrating the course's load in warehouse_sizing.py.
+
+    python benchmark-warehouse.py --course data-analysis-with-databricks-sql --students 250
+    python benchmark-warehouse.py --recording dawd.jsonl --url https://hostname.cloud.databricks.com --token dapi... --warehouse-id 1234
+
+A recording is a JSON-lines file of one student's queries, {"offset_seconds": 12.5, "statement": "SELECT ..."}, e.g.
+exported from the query history of a class; without one, the course's modelled query rate is replayed with trivial
+statements. Each student replays the recording from a random start within --ramp-seconds, the burst at the start of a
+lab. Before the class, a single student runs a few queries alone to measure their unqueued run time, from which the
+course's load is calibrated.
+
+Without --url, the class runs against a local MockDatabricksServer with a warehouse sized by size_warehouse(), whose
+queries run for the course's modelled run time. Every duration is then multiplied by --time-scale so that a class is
+replayed in a fraction of its time, and latencies are reported at full scale; much below 0.1, the replay's own HTTP
+overhead distorts them.
+"""
+import argparse, json, random, statistics, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+from mock_databricks_server import MockDatabricksServer
+from simplified_rest_client import SimpleRestClient
+from warehouse_sizing import calibrate, course_load, size_warehouse
+
+
+def load_recording(path: str) -> list[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return sorted((json.loads(line) for line in f if line.strip()), key=lambda q: q.get("offset_seconds"))
+
+
+def modelled_recording(queries_per_student_minute: float, minutes: float) -> list[dict]:
+    interval = 60 / queries_per_student_minute
+    return [{"offset_seconds": i * interval, "statement": "SELECT 1"} for i in range(int(minutes * 60 / interval))]
+
+
+def run_statement(client: SimpleRestClient, warehouse_id: str, statement: str) -> float:
+    """Runs the statement to completion, returning its latency in seconds."""
+    start = time.time()
+    response = client.call("POST", "/api/2.0/sql/statements", {"statement": statement, "warehouse_id": warehouse_id, "wait_timeout": "50s"})
+    while response.get("status", dict()).get("state") in ["PENDING", "RUNNING"]:
+        time.sleep(0.5)
+        response = client.call("GET", f"""/api/2.0/sql/statements/{response.get("statement_id")}""")
+    if response.get("status", dict()).get("state") != "SUCCEEDED":
+        raise Exception(f"""The statement "{statement}" {response.get("status", dict()).get("state")}.""")
+    return time.time() - start
+
+
+def replay(client: SimpleRestClient, warehouse_id: str, recording: list[dict], students: int, ramp_seconds: float, time_scale: float, seed: int) -> list[float]:
+    """Replays the recording as `students` students at once, returning every query's latency at full scale."""
+    latencies = list()
+    lock = threading.Lock()
+    starts = random.Random(seed).sample(range(students), students)
+
+    def student(index: int) -> None:
+        start = time.time() + starts[index] / students * ramp_seconds * time_scale
+        for query in recording:
+            delay = start + query.get("offset_seconds") * time_scale - time.time()
+            if delay > 0:
+                time.sleep(delay)  # Otherwise the student is behind, waiting on slow queries, and runs it at once
+            latency = run_statement(client, warehouse_id, query.get("statement")) / time_scale
+            with lock:
+                latencies.append(latency)
+
+    with ThreadPoolExecutor(max_workers=students) as executor:
+        list(executor.map(student, range(students)))
+    return latencies
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def benchmark(client: SimpleRestClient, warehouse_id: str, recording: list[dict], args: argparse.Namespace) -> dict:
+    warehouse = client.call("GET", f"/api/2.0/sql/warehouses/{warehouse_id}")
+    calibration = [run_statement(client, warehouse_id, q.get("statement")) / args.time_scale for q in recording[:args.calibration_queries]]
+
+    start = time.time()
+    latencies = replay(client, warehouse_id, recording, args.students, args.ramp_seconds, args.time_scale, args.seed)
+    seconds = (time.time() - start) / args.time_scale
+
+    # The rate between the first and last query of the recording
+    minutes = (recording[-1].get("offset_seconds") - recording[0].get("offset_seconds")) / 60
+    load = calibrate(course_load(args.course),
+                     cluster_size=warehouse.get("cluster_size"),
+                     measured_query_seconds=statistics.mean(calibration),
+                     queries_per_student_minute=(len(recording) - 1) / minutes if minutes else None)
+    return {
+        "course": args.course,
+        "students": args.students,
+        "warehouse": {k: warehouse.get(k) for k in ["cluster_size", "min_num_clusters", "max_num_clusters"]},
+        "queries": len(latencies),
+        "seconds": round(seconds, 1),
+        "latency_p50": round(percentile(latencies, 50), 3),
+        "latency_p95": round(percentile(latencies, 95), 3),
+        "latency_max": round(max(latencies), 3),
+        "calibrated_load": load.__dict__,
+        "recommended_sizing": size_warehouse(args.students, load=load, target_query_seconds=args.target_seconds).to_spec(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--course", default="data-analysis-with-databricks-sql")
+    parser.add_argument("--students", type=int, default=250)
+    parser.add_argument("--recording", help="JSON-lines file of one student's queries; defaults to the course's modelled query rate")
+    parser.add_argument("--minutes", type=float, default=10, help="Length of the modelled recording")
+    parser.add_argument("--ramp-seconds", type=float, default=60)
+    parser.add_argument("--calibration-queries", type=int, default=5)
+    parser.add_argument("--target-seconds", type=float, default=10.0, help="Query latency the recommended sizing is held to")
+    parser.add_argument("--url", help="Workspace to benchmark; a local stand-in when not specified")
+    parser.add_argument("--token")
+    parser.add_argument("--warehouse-id")
+    parser.add_argument("--time-scale", type=float, default=None, help="Defaults to 1 against a workspace and 0.1 against the stand-in")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the result as JSON to this file")
+    args = parser.parse_args()
+
+    load = course_load(args.course)
+    recording = load_recording(args.recording) if args.recording else modelled_recording(load.queries_per_student_minute, args.minutes)
+
+    if args.url:
+        args.time_scale = args.time_scale or 1.0
+        client = SimpleRestClient(url=args.url, token=args.token, pool_maxsize=args.students)
+        result = benchmark(client, args.warehouse_id, recording, args)
+    else:
+        args.time_scale = args.time_scale or 0.1
+        with MockDatabricksServer(statement_seconds=load.query_seconds * args.time_scale) as server:
+            client = SimpleRestClient(url=server.url, token="mock", pool_maxsize=args.students)
+            sizing = size_warehouse(args.students, args.course, target_query_seconds=args.target_seconds)
+            warehouse_id = client.call("POST", "/api/2.0/sql/warehouses", {"name": "DBAcademy Warehouse", **sizing.to_spec()}).get("id")
+            result = benchmark(client, warehouse_id, recording, args)
+
+    print(json.dumps(result, indent=4))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import atexit, hashlib, threading, time
+from urllib.parse import urlparse
+from simplified_rest_client import SimpleRestClient
+from tracing import Tracer
+
+
+class ClientRegistry:
+    """
+    Hands out one shared SimpleRestClient per (base URL, auth identity), so that every script and thread talking to
+    the same account or workspace as the same identity reuses one warm connection pool and shares its backoff after
+    rate limiting, rather than each building a client with a cold pool of its own.
+
+    The registry owns the clients it hands out: callers must not close them. close() closes every client at once,
+    while drain() first waits for the calls in progress to complete. Either way the registry is left empty, and later
+    calls to get() create new clients. The module-level `clients` is drained at exit.
+    """
+
+    def __init__(self, pool_maxsize: int = 32):
+        self.pool_maxsize = pool_maxsize
+        self._lock = threading.Lock()
+        self._clients: dict[tuple[str, str], SimpleRestClient] = dict()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def get(self, *, url: str, username: str = None, password: str = None, token: str = None, tracer: Tracer = None) -> SimpleRestClient:
+        """
+        The client registered for `url` and the identity, created on first use. Its calls are recorded by `tracer`,
+        e.g. that of a setup stage, or by the shared tracer when none was ever specified; as the client is shared,
+        the tracer specified last is the one used.
+        """
+        key = self.key(url, username=username, password=password, token=token)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = SimpleRestClient(url=url, username=username, password=password, token=token, tracer=tracer, pool_maxsize=self.pool_maxsize)
+                self._clients[key] = client
+            elif tracer is not None:
+                client.tracer = tracer
+            return client
+
+    @staticmethod
+    def key(url: str, *, username: str = None, password: str = None, token: str = None) -> tuple[str, str]:
+        """
+        The (base URL, auth identity) a client is registered under. Secrets are hashed rather than kept in the key.
+
+        >>> ClientRegistry.key("https://Example.cloud.databricks.com/", token="dapi123")
+        ('https://example.cloud.databricks.com', 'token:8bfb8bde991e45ad')
+        """
+        if username and password:
+            identity = f"basic:{username}:{hashlib.sha256(password.encode()).hexdigest()[:16]}"
+        elif token:
+            identity = f"token:{hashlib.sha256(token.encode()).hexdigest()[:16]}"
+        else:
+            raise ValueError("Must specify either username/password or token")
+        parsed = urlparse(url.rstrip("/"))
+        return parsed._replace(scheme=parsed.scheme.lower(), netloc=parsed.netloc.lower()).geturl(), identity
+
+    def close(self) -> None:
+        """Closes every client immediately, including any with calls in progress."""
+        for client in self._remove_all():
+            client.close()
+
+    def drain(self, timeout_seconds: float = 60) -> bool:
+        """
+        Closes every client once its calls in progress have completed, waiting at most `timeout_seconds` in total;
+        returns False if some client was still busy when it was closed.
+        """
+        deadline = time.time() + timeout_seconds
+        drained = True
+        for client in self._remove_all():
+            drained = client.drain(max(0.0, deadline - time.time())) and drained
+            client.close()
+        return drained
+
+    def _remove_all(self) -> list[SimpleRestClient]:
+        with self._lock:
+            removed = list(self._clients.values())
+            self._clients.clear()
+        return removed
+
+
+# Shared by every script in this process.
+clients = ClientRegistry()
+atexit.register(clients.drain, 10)
@@ -1,11 +1,20 @@
-from simplified_rest_client import SimpleRestClient
+import json
+from typing import TextIO
+from simplified_rest_client import SimpleRestClient, JsonStream
+from client_registry import clients
 
+# The list endpoints streamed by write_workspace_config, and the array in each response that holds the items.
+STREAMED_SECTIONS = {
+    "clusters": ("/api/2.0/clusters/list", "clusters"),
+    "users": ("/api/2.0/preview/scim/v2/Users", "Resources"),
+    "groups": ("/api/2.0/preview/scim/v2/Groups", "Resources"),
+    "jobs": ("/api/2.1/jobs/list", "jobs"),
+    "job_runs": ("/api/2.1/jobs/runs/list", "runs"),
+}
 
-def get_workspace_config(workspace: SimpleRestClient):
-    clusters = workspace.call("GET", "/api/2.0/clusters/list")
+
+def get_workspace_settings(workspace: SimpleRestClient) -> dict:
     warehouses = workspace.call("GET", "/api/2.0/sql/warehouses")
-    users = workspace.call("GET", "/api/2.0/preview/scim/v2/Users")
-    groups = workspace.call("GET", "/api/2.0/preview/scim/v2/Groups")
     metastore_assignment = workspace.call("GET", "/api/2.1/unity-catalog/current-metastore-assignment")
     if metastore_assignment is not None:
         metastore_id = metastore_assignment["metastore_id"]
@@ -17,29 +26,62 @@ def get_workspace_config(workspace: SimpleRestClient):
     sql_settings = workspace.call("GET", "/api/2.0/sql/config/endpoints")  # Get the current endpoint configuration
     serverless_enabled = sql_settings.get("enable_serverless_compute", False)
     workspace_settings = workspace.call("GET", "/api/2.0/workspace-conf")
+    return {
+        "warerhouses": warehouses,
+        "metastore": metastore,
+        "metastore_permissions": metastore_perms,
+        "serverless_enabled": serverless_enabled,
+        "workspace_settings": workspace_settings,
+    }
+
+
+def get_workspace_config(workspace: SimpleRestClient):
+    clusters = workspace.call("GET", "/api/2.0/clusters/list")
+    users = workspace.call("GET", "/api/2.0/preview/scim/v2/Users")
+    groups = workspace.call("GET", "/api/2.0/preview/scim/v2/Groups")
     jobs = workspace.call("GET", "/api/2.1/jobs/list")
     job_runs = workspace.call("GET", "/api/2.1/jobs/runs/list")
     return {
         "workspace_url": workspace.url,
         "clusters": clusters,
-        "warerhouses": warehouses,
         "users": users,
         "groups": groups,
-        "metastore": metastore,
-        "metastore_permissions": metastore_perms,
-        "serverless_enabled": serverless_enabled,
-        "workspace_settings": workspace_settings,
         "jobs": jobs,
         "job_runs": job_runs,
+        **get_workspace_settings(workspace),
     }
 
 
+def write_workspace_config(workspace: SimpleRestClient, out: TextIO, fields: dict[str, list[str]] = None) -> None:
+    """
+    Writes the workspace's configuration to `out` as a JSON document without holding the large lists in memory: the
+    items of each STREAMED_SECTIONS endpoint are written one per line as they are parsed from the response, so each
+    of those sections is a list of items rather than the raw response returned by get_workspace_config.
+
+    `fields` optionally maps a section to the fields kept for each item, e.g. {"users": ["id", "userName"]}.
+    """
+    fields = fields or dict()
+    out.write("{\n")
+    out.write(f"""    "workspace_url": {json.dumps(workspace.url)}""")
+
+    for section, (endpoint_path, stream_path) in STREAMED_SECTIONS.items():
+        out.write(f""",\n    {json.dumps(section)}: [""")
+        items = workspace.call("GET", endpoint_path, _result_type=JsonStream, _stream_path=stream_path, _fields=fields.get(section))
+        for i, item in enumerate(items):
+            out.write(("," if i else "") + "\n        " + json.dumps(item))
+        out.write("\n    ]")
+
+    for key, value in get_workspace_settings(workspace).items():
+        out.write(f""",\n    {json.dumps(key)}: {json.dumps(value)}""")
+    out.write("\n}\n")
+
+
 def print_workspace_config(workspace: SimpleRestClient):
-    import json
-    config = get_workspace_config(workspace)
-    print(json.dumps(config, indent=4))
+    import sys
+    write_workspace_config(workspace, sys.stdout)
 
 
-workspace = SimpleRestClient(url="https://hostname.cloud.databricks.com",
-                             token="REDACTED")
-print_workspace_config(workspace)
+if __name__ == "__main__":
+    workspace = clients.get(url="https://hostname.cloud.databricks.com",
+                            token="REDACTED")
+    print_workspace_config(workspace)
@@ -1,11 +1,9 @@
-import json
-import re
-import requests
 import time
-import typing
-from typing import Literal, Any
 
-from simplified_rest_client import SimpleRestClient
+from client_registry import clients
+from job_spec_loader import JobSpecLoader, render_job_spec
+from job_upsert import upsert_and_run, wait_for_run
+from tracing import tracer
 
 
 lab_config = {
@@ -19,60 +17,19 @@ lab_config = {
     "runtimeVersion": "11.3.x-cpu-ml-scala2.12",
 }
 
-Cloud = Literal["aws", "azure", "gcp"]
-known_clouds = typing.get_args(Cloud)
-
-
-def strip_cloud_specific_keys(cloud: Cloud, data: Any):
-    """
-    Recursively search the parsed json tree, locating keys like "aws:key-name", removing the cloud prefix
-    and keeping the key only if the prefix matches the specified cloud.
-
-    >>> strip_cloud_specific_keys('aws', {
-    ...     'key1': 'abc',
-    ...     'aws:key2': "It's AWS",
-    ...     'azure:key2': "It's Azure"
-    ... })
-    {'key1': 'abc', 'key2': "It's AWS"}
-    """
-    if isinstance(data, list):
-        for item in data:
-            strip_cloud_specific_keys(cloud, item)
-    elif isinstance(data, dict):
-        for key, value in list(data.items()):
-            for cloud_key in known_clouds:
-                prefix = cloud_key + ":"
-                if key.startswith(prefix):
-                    if cloud_key == cloud:
-                        new_key = key[len(prefix):]  # Remove the "aws:" prefix
-                        data[new_key] = value
-                    del data[key]
-            strip_cloud_specific_keys(cloud, value)
-    return data
-
 
 def run_workspace_setup(config: dict[str, str]):
     workspace_url = config["WORKSPACE-URL"]
     workspace_token = config["WORKSPACE-TOKEN"]
     job_spec_url = config["jobURL"]
-    workspaces_api = SimpleRestClient(url=workspace_url, token=workspace_token)
+    workspaces_api = clients.get(url=workspace_url, token=workspace_token)
 
     ###############################################################################################
     # Download the job specification.
     ###############################################################################################
-    print(f"""Downloading job specification from {job_spec_url}.""")
-    response = requests.get(job_spec_url)
-    response.raise_for_status()  # Raise an exception only if we didn't get a successful response.
-    job_spec_text = response.text
-    # Replace all {{variables}} using the config.
-    for key, value in config.items():
-        job_spec_text = job_spec_text.replace("{{" + key + "}}", value)
-    # Verify all {{tags}} have been replaced with actual values
-    if match := re.search(r"{{[a-zA-Z-]+}}", job_spec_text):
-        raise ValueError("Unbound variable: " + match[0])
-    # Parse the JSON
-    job_spec = json.loads(job_spec_text)
-    # Remove cloud-specific attributes for other clouds
+    # Served from the local cache when fresh; set "jobSpecPath" to pin a local copy and skip GitHub entirely.
+    job_spec_text = JobSpecLoader(offline_path=config.get("jobSpecPath")).load(job_spec_url)
+    # The workspace's cloud, the cloud-specific attributes of other clouds being removed
     if ".cloud.databricks.com" in workspace_url:
         workspace_cloud = "aws"
     elif ".gcp.databricks.com" in workspace_url:
@@ -81,33 +38,19 @@ def run_workspace_setup(config: dict[str, str]):
         workspace_cloud = "azure"
     else:
         raise Exception(f"Unsupported cloud, found {workspace_url}")
-    strip_cloud_specific_keys(workspace_cloud, job_spec)
+    # Replace all {{variables}} using the config, then parse the JSON and remove the other clouds' attributes
+    job_spec = render_job_spec(job_spec_text, config, workspace_cloud)
     # Retrieve the job name
     job_name = job_spec["name"]
 
     ###############################################################################################
-    # Delete the preexisting "DBAcademy Workspace-Setup" job if it exists
-    # In theory there should never be an existing job, since you're running this only once per
-    # workspace.  But during script development, you might be running it multiple times, in which case
-    # we want to ensure the old one is deleted.  This ensures the new job gets recreated with the
-    # settings parameters but destroys the history needed when diagnosing problems.
-    ###############################################################################################
-    print(f"""Looking for the job "{job_name}" in {workspace_url}.""")
-    jobs = workspaces_api.call("GET", "/api/2.1/jobs/list").get("jobs", list())
-    # Search the list of jobs for the one matching the job_name and grab its job_id
-    job_id = next((j.get("job_id") for j in jobs if j.get("settings").get("name") == job_name), None)
-    if job_id is not None:
-        # TODO: We should be checking for active runs before deleting, since deleting an active run could break stuff.
-        workspaces_api.call("POST", "/api/2.1/jobs/delete", {"job_id": job_id})
-
-    ###############################################################################################
-    # Create and run the "DBAcademy Workspace-Setup" job
+    # Create or update, then run the "DBAcademy Workspace-Setup" job
+    # The job is only reset when the hash of the rendered spec differs from the one recorded on the
+    # existing job, which preserves the job's history needed when diagnosing problems. An active run
+    # of an unchanged job is attached to rather than started again; active runs are never deleted.
     ###############################################################################################
-    print(f"""Creating the job "{job_name}" in {workspace_url}.""")
-    job = workspaces_api.call("POST", "/api/2.1/jobs/create", job_spec)             # Create the job
-    job_id = job.get("job_id")                                                      # Get the job id from the job
-    run = workspaces_api.call("POST", "/api/2.1/jobs/run-now", {"job_id": job_id})  # Start the job
-    run_id = run.get("run_id")
+    print(f"""Creating or updating the job "{job_name}" in {workspace_url}.""")
+    run_id = upsert_and_run(workspaces_api, job_spec)
 
     ###############################################################################################
     # Wait for the "DBAcademy Workspace-Setup" job to finish execution: ~30 minutes
@@ -115,16 +58,10 @@ def run_workspace_setup(config: dict[str, str]):
     print(f"""Waiting for the job "{job_name}" to complete in {workspace_url}.""", end="...")
     start = time.time()
 
-    while True:
-        response = workspaces_api.call("GET", f"/api/2.1/jobs/runs/get?run_id={run_id}")
-        life_cycle_state = response.get("state").get("life_cycle_state")
-        if life_cycle_state not in ["PENDING", "RUNNING", "TERMINATING"]:
-            job_state = response.get("state", {})
-            job_result = job_state.get("result_state")
-            job_message = job_state.get("state_message", "Unknown")
-            break
-        time.sleep(5)  # Slow it down a bit so that we don't hammer the REST endpoints.
-        print(".", end="")
+    with tracer.span("wait-for-job", workspace_url=workspace_url, job_name=job_name, run_id=run_id):
+        job_state = wait_for_run(workspaces_api, run_id)
+    job_result = job_state.get("result_state")
+    job_message = job_state.get("state_message", "Unknown")
 
     print(f"{int(time.time() - start)} seconds")
 
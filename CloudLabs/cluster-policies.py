@@ -1,4 +1,10 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, Iterator
 from simplified_rest_client import SimpleRestClient
+from client_registry import clients
+from cluster_policy_cache import policy_cache
+from instance_pools import POOL_DEFAULT_NAME, find_instance_pool, get_warm_target, prewarmed_pool, set_min_idle_instances, wait_for_idle_instances
 
 cluster_config = {
     "workspaceUrl": "https://redacted.cloud.databricks.com/",
@@ -17,27 +23,9 @@ cluster_config = {
 }
 
 
-def deploy_cluster(config: dict[str, str]):
-    workspace_url = config["WORKSPACE-URL"]
-    workspace_token = config["WORKSPACE-TOKEN"]
-    workspaces_api = SimpleRestClient(url=workspace_url, token=workspace_token)
-
-    ###############################################################################################
-    # Lookup the cluster policy, if specified
-    ###############################################################################################
-    cluster_policy_name = config.get("clusterPolicy", default=None)
-    cluster_policy_id = None
-    if config.get("cluster_policy") is not None:
-        policies = workspaces_api.call("GET", "/2.0/policies/clusters/list").get("policies", default=[])
-        for policy in policies:
-            if policy["name"] == cluster_policy_name:
-                cluster_policy_id = policy["policy_id"]
-                break
-        if cluster_policy_id is None:
-            raise Exception("Unable to find cluster_policy with name: " + cluster_policy_name)
-
+def build_cluster_spec(config: dict[str, str], cluster_policy_id: str = None, instance_pool_id: str = None) -> dict:
     ###############################################################################################
-    # Create the user cluster
+    # Build the spec of the user cluster, applying the cluster policy and instance pool if specified
     #
     # Note, you likely set other cluster values too.  You should continue to do so.
     # The point of this example is purely to show you how to look up and apply the cluster policy.
@@ -63,16 +51,139 @@ def deploy_cluster(config: dict[str, str]):
         cluster_spec["policy_id"] = cluster_policy_id
 
     # IMPORTANT NOTE: Many parameters once required are now optional because the cluster_policy might also set them.
-    if config.get("autoTerminationTime", default=None):
+    if config.get("autoTerminationTime"):
         cluster_spec["autotermination_minutes"] = config["autoTerminationTime"]
-    if config.get("runtimeVersion", default=None) is not None:
+    if config.get("runtimeVersion") is not None:
         cluster_spec["spark_version"] = config["runtimeVersion"]
-    if config.get("driverSize", default=None):
-        cluster_spec["driver_node_type_id"] = config["driverSize"]
-    if config.get("num_workers", default=None):
+    if instance_pool_id is not None:
+        # Node types come from the pool and cannot be specified alongside it.
+        cluster_spec["instance_pool_id"] = instance_pool_id
+        cluster_spec["driver_instance_pool_id"] = instance_pool_id
+    else:
+        if config.get("workerSize"):
+            cluster_spec["node_type_id"] = config["workerSize"]
+        if config.get("driverSize"):
+            cluster_spec["driver_node_type_id"] = config["driverSize"]
+    if config.get("num_workers"):
         cluster_spec["num_workers"] = config["num_workers"]
 
-    workspaces_api.call("POST", "2.0/clusters/create", cluster_spec)
+    return cluster_spec
+
+
+def deploy_cluster(config: dict[str, str], workspaces_api: SimpleRestClient = None, instance_pool_id: str = None) -> str:
+    if workspaces_api is None:
+        workspaces_api = clients.get(url=config["workspaceUrl"], token=config["workspaceToken"])
+
+    ###############################################################################################
+    # Lookup the cluster policy, if specified
+    # Policy ids are cached per workspace, so deploying many clusters costs a single policy list.
+    ###############################################################################################
+    cluster_policy_name = config.get("clusterPolicy")
+    cluster_policy_id = None
+    if cluster_policy_name is not None:
+        cluster_policy_id = policy_cache.get_policy_id(workspaces_api, cluster_policy_name)
+
+    cluster_spec = build_cluster_spec(config, cluster_policy_id, instance_pool_id)
+    cluster = workspaces_api.call("POST", "/api/2.0/clusters/create", cluster_spec)
+    return cluster.get("cluster_id")
+
+
+def deploy_clusters(configs: Iterable[dict[str, str]], max_workers: int = 10, instance_pool_id: str = None) -> Iterator[tuple[dict[str, str], str]]:
+    """
+    Creates one cluster per config concurrently, yielding each (config, cluster_id) as soon as its create is accepted.
+    Configs for the same workspace share the registry's client and therefore its connection pool; `max_workers` should
+    not exceed the pool size of the registry's clients (32 by default). An exception raised by a create is re-raised when its result
+    is reached; the remaining creates continue to completion.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = dict()
+        for config in configs:
+            workspaces_api = clients.get(url=config["workspaceUrl"], token=config["workspaceToken"])
+            futures[executor.submit(deploy_cluster, config, workspaces_api, instance_pool_id)] = config
+
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def deploy_class_clusters(configs: Iterable[dict[str, str]], pool_name: str = POOL_DEFAULT_NAME, *,
+                          max_workers: int = 10,
+                          wave_interval_seconds: int = 10,
+                          wave_timeout_seconds: int = 60,
+                          ready_timeout_seconds: int = 20 * 60) -> Iterator[tuple[dict[str, str], str]]:
+    """
+    Class-start mode for deploying every student's cluster in one workspace.
+
+    The class pool's idle instances are raised to the number of students (bounded by the pool's max_capacity), and
+    clusters are then created in waves sized to the idle instances the pool actually has, so that clusters start on
+    warm VMs rather than queueing behind cold ones. After each wave the idle instances are lowered to the clusters
+    still to create, so that the pool does not replace the instances just claimed and a class of N never runs about
+    2N VMs; after the last wave the pool is back to its original idle instances. Yields each (config, cluster_id) as
+    it is accepted.
+    """
+    configs = list(configs)
+    if len(configs) == 0:
+        return
+
+    workspaces_api = clients.get(url=configs[0]["workspaceUrl"], token=configs[0]["workspaceToken"])
+    pool = find_instance_pool(workspaces_api, pool_name)
+    if pool is None:
+        raise Exception("Unable to find instance pool with name: " + pool_name)
+    instance_pool_id = pool.get("instance_pool_id")
+    original_min_idle_instances = pool.get("min_idle_instances", 0)
+
+    with prewarmed_pool(workspaces_api, pool, get_warm_target(pool, len(configs))):
+        cluster_ids = list()
+        pending = list(configs)
+        while pending:
+            # Release as many clusters as the pool has idle instances for, or a single cluster if the pool is still cold.
+            idle_count = wait_for_idle_instances(workspaces_api, instance_pool_id, 1, timeout_seconds=wave_timeout_seconds)
+            wave, pending = pending[:max(idle_count, 1)], pending[max(idle_count, 1):]
+            print(f"Creating {len(wave)} clusters from {idle_count} idle instances, {len(pending)} remaining.")
+
+            for config, cluster_id in deploy_clusters(wave, max_workers, instance_pool_id):
+                cluster_ids.append(cluster_id)
+                yield config, cluster_id
+
+            # Keep idle only the instances that the clusters still to create need
+            target = max(original_min_idle_instances, get_warm_target(pool, len(pending)))
+            if target < pool.get("min_idle_instances"):
+                set_min_idle_instances(workspaces_api, pool, target)
+
+            if pending:
+                # Give the pool time to hand out the instances just claimed before counting idle instances again.
+                time.sleep(wave_interval_seconds)
+
+        print(f"Waiting for {len(cluster_ids)} clusters to start", end="...")
+        start = time.time()
+        not_running = wait_for_clusters(workspaces_api, cluster_ids, ready_timeout_seconds)
+        print(f"{int(time.time() - start)} seconds")
+        if not_running:
+            print(f"""WARNING: {len(not_running)} clusters were not running after {ready_timeout_seconds} seconds: {", ".join(not_running)}""")
+
+
+def wait_for_clusters(workspaces_api: SimpleRestClient, cluster_ids: list[str], timeout_seconds: int, poll_seconds: int = 10) -> list[str]:
+    """
+    Waits for every cluster to be RUNNING, polling a single clusters/list rather than each cluster, and returns the
+    IDs of those still not running once `timeout_seconds` elapse. Raises should any cluster fail to start.
+    """
+    start = time.time()
+    remaining = set(cluster_ids)
+    while remaining:
+        response = workspaces_api.call("GET", "/api/2.0/clusters/list")
+        clusters = [c for c in response.get("clusters", list()) if c.get("cluster_id") in remaining]
+
+        failed = [c for c in clusters if c.get("state") in ["ERROR", "TERMINATING", "TERMINATED"]]
+        if failed:
+            details = ", ".join(f"""{c.get("cluster_id")} ({c.get("state")}: {c.get("state_message")})""" for c in failed)
+            raise Exception(f"Unable to start {len(failed)} clusters: {details}")
+
+        remaining -= {c.get("cluster_id") for c in clusters if c.get("state") == "RUNNING"}
+        if not remaining or time.time() - start >= timeout_seconds:
+            break
+        time.sleep(poll_seconds)  # Slow it down a bit so that we don't hammer the REST endpoints.
+        print(".", end="")
+
+    return sorted(remaining)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,56 @@
+import threading, time
+from simplified_rest_client import SimpleRestClient
+
+
+class ClusterPolicyCache:
+    """
+    Per-workspace cache of cluster policy names to policy ids.
+
+    Entries expire after `ttl_seconds`. A lookup for a name that is not in the cache refreshes that workspace's entry
+    once before giving up, so a policy created after the cache was loaded is still found. Lookups for the same
+    workspace are serialized so that many threads creating clusters at the same time trigger a single policy list.
+    """
+
+    def __init__(self, ttl_seconds: int = 10 * 60):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._workspace_locks: dict[str, threading.Lock] = dict()
+        self._entries: dict[str, tuple[float, dict[str, str]]] = dict()
+
+    def get_policy_id(self, client: SimpleRestClient, policy_name: str) -> str:
+        with self._workspace_lock(client.url):
+            policies = self._load(client, refresh=False)
+            if policy_name not in policies:
+                policies = self._load(client, refresh=True)  # Invalidate on miss
+
+        policy_id = policies.get(policy_name)
+        if policy_id is None:
+            raise Exception("Unable to find cluster_policy with name: " + policy_name)
+        return policy_id
+
+    def invalidate(self, workspace_url: str = None) -> None:
+        """Drops the cached policies for `workspace_url`, or for every workspace if not specified."""
+        with self._lock:
+            if workspace_url is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(workspace_url, None)
+
+    def _workspace_lock(self, workspace_url: str) -> threading.Lock:
+        with self._lock:
+            return self._workspace_locks.setdefault(workspace_url, threading.Lock())
+
+    def _load(self, client: SimpleRestClient, refresh: bool) -> dict[str, str]:
+        entry = self._entries.get(client.url)
+        if entry is not None and not refresh and time.time() - entry[0] < self.ttl_seconds:
+            return entry[1]
+
+        response = client.call("GET", "/api/2.0/policies/clusters/list")
+        policies = {p.get("name"): p.get("policy_id") for p in response.get("policies", list())}
+        with self._lock:
+            self._entries[client.url] = (time.time(), policies)
+        return policies
+
+
+# Shared by every deploy in this process
+policy_cache = ClusterPolicyCache()
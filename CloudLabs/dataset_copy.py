@@ -0,0 +1,364 @@
+import base64, dataclasses, json, math, os, re, shutil, socket, time, urllib.error, urllib.request, uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional
+from urllib.parse import urlparse
+
+# The layout of WorkspaceHelper.install_datasets(): each dataset is a folder of versions in the repository, of which
+# the latest two are installed, as {DATASETS_ROOT}{dataset}/{version}/
+DATASETS_REPOSITORY = "wasbs://courseware@dbacademy.blob.core.windows.net/"
+DATASETS_ROOT = "dbfs:/mnt/dbacademy-datasets/"
+LATEST_VERSIONS = 2
+
+# Where the root supports hard links, files are stored once per content, under their MD5, and each dataset version
+# records its files' MD5s in a manifest, both in a store beside the root rather than among its datasets; see store_path()
+BLOBS_FOLDER = "blobs/"
+MANIFESTS_FOLDER = "manifests/"
+
+# Requests to the repository time out rather than hang an executor on a stalled connection, and are retried
+REQUEST_TIMEOUT = 60  # seconds, between bytes received
+REQUEST_RETRIES = 5   # attempts
+
+
+@dataclasses.dataclass(frozen=True)
+class CopyTask:
+    source: str
+    target: str
+    size: int
+
+
+def https_url(url: str) -> str:
+    """
+    The public HTTPS URL of a file in Azure Blob Storage, which executors can read without the Hadoop file systems;
+    other URLs are returned as they are.
+
+    >>> https_url("wasbs://courseware@dbacademy.blob.core.windows.net/example-course/v01/file.csv")
+    'https://dbacademy.blob.core.windows.net/courseware/example-course/v01/file.csv'
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ["wasb", "wasbs"]:
+        return url
+    container, account = parsed.netloc.split("@", 1)
+    return f"https://{account}/{container}{parsed.path}"
+
+
+def fuse_path(path: str) -> str:
+    """
+    The path of a DBFS file on the local file system of the driver and executors.
+
+    >>> fuse_path("dbfs:/mnt/dbacademy-datasets/example-course/v01/file.csv")
+    '/dbfs/mnt/dbacademy-datasets/example-course/v01/file.csv'
+    """
+    return "/dbfs/" + path[len("dbfs:/"):] if path.startswith("dbfs:/") else path
+
+
+def latest_versions(versions: Iterable[str], count: int = LATEST_VERSIONS) -> list[str]:
+    """
+    The latest `count` of the versions, comparing their numbers rather than their text.
+
+    >>> latest_versions(["v01", "v10", "v9", "v02"])
+    ['v10', 'v9']
+    """
+    def key(version: str) -> list[int]:
+        return [int(n) for n in re.findall(r"\d+", version)]
+
+    return sorted(versions, key=key, reverse=True)[:count]
+
+
+def store_path(root: str) -> str:
+    """
+    The folder beside the root where its blobs and manifests are kept.
+
+    >>> store_path("/local_disk0/dbacademy-datasets/")
+    '/local_disk0/dbacademy-datasets-store/'
+    """
+    return root.rstrip("/") + "-store/"
+
+
+def list_copy_tasks(ls: Callable[[str], list], datasets: Optional[list[str]] = None, *,
+                    repository: str = DATASETS_REPOSITORY,
+                    root: str = DATASETS_ROOT,
+                    max_workers: int = 16) -> list[CopyTask]:
+    """
+    Lists a CopyTask for every file of the latest versions of the datasets, or of every dataset in the repository if
+    not specified, with `ls`, e.g. dbutils.fs.ls. Folders are listed concurrently, level by level.
+    """
+    datasets = datasets or [f.name.rstrip("/") for f in ls(repository) if f.name.endswith("/")]
+    folders = [f"""{repository}{dataset}/{version.rstrip("/")}/"""
+               for dataset in datasets
+               for version in latest_versions(f.name for f in ls(f"{repository}{dataset}/") if f.name.endswith("/"))]
+
+    tasks = list()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while folders:
+            listings = list(executor.map(ls, folders))
+            folders = list()
+            for listing in listings:
+                for f in listing:
+                    if f.name.endswith("/"):
+                        folders.append(f.path)
+                    else:
+                        tasks.append(CopyTask(f.path, root + f.path[len(repository):], f.size))
+    return tasks
+
+
+def partition_tasks(tasks: list[CopyTask], num_partitions: int) -> list[list[CopyTask]]:
+    """
+    Splits the tasks into partitions of about the same number of bytes, largest file first, so that no executor is
+    left copying a few large files long after the others are done.
+
+    >>> [[t.size for t in p] for p in partition_tasks([CopyTask("a", "a", s) for s in [1, 9, 4, 5, 2]], 2)]
+    [[9, 2], [5, 4, 1]]
+    """
+    partitions = [list() for _ in range(min(num_partitions, len(tasks)))]
+    sizes = [0] * len(partitions)
+    for task in sorted(tasks, key=lambda t: t.size, reverse=True):
+        i = sizes.index(min(sizes))
+        partitions[i].append(task)
+        sizes[i] += task.size
+    return partitions
+
+
+def with_retries(request: Callable[[], object], retries: int = REQUEST_RETRIES):
+    """
+    Calls `request`, retrying a timeout, a failed connection, a 429 or a 5xx response with the same backoff as
+    SimplifiedRestClient.call(); other errors, e.g. a 404, are raised at once.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return request()
+        except urllib.error.HTTPError as e:
+            if attempt == retries or (e.code != 429 and e.code < 500):
+                raise e
+        except (urllib.error.URLError, socket.timeout, ConnectionError) as e:
+            if attempt == retries:
+                raise e
+        # Attempt 1=1s, 2=2s, 3=5s, 4=8s, etc...
+        time.sleep(math.ceil((attempt + 1) ** 2 / 2))
+
+
+def copy_files(tasks: Iterable[CopyTask], threads: int = 8) -> Iterator[dict]:
+    """
+    Copies the tasks' files, `threads` at a time, skipping those already installed with the same size; yields a
+    single summary, as the function of mapPartitions(). Files are written to a temporary name and renamed once
+    complete, so an interrupted install never leaves a truncated file that a rerun would skip. A download that times
+    out or fails to connect is restarted; see with_retries().
+    """
+    start = time.time()
+
+    def copy(task: CopyTask) -> tuple[int, int]:
+        target = fuse_path(task.target)
+        if os.path.exists(target) and os.path.getsize(target) == task.size:
+            return 0, 0
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+
+        def download() -> None:
+            with urllib.request.urlopen(https_url(task.source), timeout=REQUEST_TIMEOUT) as response, open(target + ".part", "wb") as f:
+                shutil.copyfileobj(response, f, 1024 * 1024)
+
+        with_retries(download)
+        os.replace(target + ".part", target)
+        return 1, task.size
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(copy, tasks))
+
+    yield {"files": len(results), "copied": sum(r[0] for r in results), "bytes": sum(r[1] for r in results), "seconds": time.time() - start}
+
+
+def content_md5(url: str) -> Optional[str]:
+    """
+    The MD5 of a file as recorded by Azure Blob Storage in its Content-MD5 property, read with a HEAD request and so
+    without downloading the file; None if the blob has none, or for other URLs.
+    """
+    if urlparse(url).scheme not in ["wasb", "wasbs"]:
+        return None
+    def head() -> Optional[str]:
+        with urllib.request.urlopen(urllib.request.Request(https_url(url), method="HEAD"), timeout=REQUEST_TIMEOUT) as response:
+            return response.headers.get("Content-MD5")
+
+    md5 = with_retries(head)
+    return base64.b64decode(md5).hex() if md5 else None
+
+
+def hash_tasks(tasks: list[CopyTask], hash_for: Callable[[str], Optional[str]] = content_md5, max_workers: int = 32) -> list[Optional[str]]:
+    """The hash of each task's source, None where it cannot be had, in which case the file is not deduplicated."""
+    def safe_hash(task: CopyTask) -> Optional[str]:
+        try:
+            return hash_for(task.source)
+        except Exception as e:
+            print(f"WARNING: Unable to hash {task.source} ({e}).")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(safe_hash, tasks))
+
+
+def plan_dedup(tasks: list[CopyTask], hashes: list[Optional[str]], store: str, links: bool) -> tuple[list[CopyTask], list[tuple[str, str, int]]]:
+    """
+    The files to download, one per distinct content, and the (source, target, size) of each file to then make from a
+    file already downloaded. With `links`, every content is downloaded into the store's blobs and each file is a hard
+    link to its blob; otherwise the first file of each content is downloaded and its duplicates are copied from it.
+
+    >>> tasks = [CopyTask("s/v1/a", "r/v1/a", 5), CopyTask("s/v2/a", "r/v2/a", 5), CopyTask("s/v2/b", "r/v2/b", 3)]
+    >>> plan_dedup(tasks, ["ab12", "ab12", None], "r-store/", links=False)
+    ([CopyTask(source='s/v1/a', target='r/v1/a', size=5), CopyTask(source='s/v2/b', target='r/v2/b', size=3)], [('r/v1/a', 'r/v2/a', 5)])
+    >>> downloads, copies = plan_dedup(tasks, ["ab12", "ab12", None], "r-store/", links=True)
+    >>> [t.target for t in downloads], copies
+    (['r-store/blobs/ab/ab12', 'r/v2/b'], [('r-store/blobs/ab/ab12', 'r/v1/a', 5), ('r-store/blobs/ab/ab12', 'r/v2/a', 5)])
+    """
+    downloads, copies = list(), list()
+    primaries: dict[str, str] = dict()
+    for task, content_hash in zip(tasks, hashes):
+        if content_hash is None:
+            downloads.append(task)
+        elif content_hash in primaries:
+            copies.append((primaries[content_hash], task.target, task.size))
+        elif links:
+            primaries[content_hash] = f"{store}{BLOBS_FOLDER}{content_hash[:2]}/{content_hash}"
+            downloads.append(CopyTask(task.source, primaries[content_hash], task.size))
+            copies.append((primaries[content_hash], task.target, task.size))
+        else:
+            primaries[content_hash] = task.target
+            downloads.append(task)
+    return downloads, copies
+
+
+def supports_hard_links(store: str) -> bool:
+    """
+    Whether files in the store can be hard linked. DBFS and volumes, whose FUSE mounts cannot, are not probed, so that
+    nothing is written beside their roots; elsewhere, a store created only for the probe is removed if it fails.
+
+    >>> supports_hard_links("dbfs:/mnt/dbacademy-datasets-store/"), supports_hard_links("/Volumes/dbacademy/datasets/shared-store/")
+    (False, False)
+    """
+    folder = fuse_path(store)
+    if folder.startswith(("/dbfs/", "/Volumes/")):
+        return False
+
+    created = not os.path.exists(folder)
+    probe = os.path.join(folder, f".probe-{uuid.uuid4().hex}")
+    try:
+        os.makedirs(folder, exist_ok=True)
+        open(probe, "w").close()
+        os.link(probe, probe + "-link")
+        os.remove(probe + "-link")
+        return True
+    except OSError:
+        return False
+    finally:
+        if os.path.exists(probe):
+            os.remove(probe)
+        if created and os.path.isdir(folder) and not os.listdir(folder):
+            os.rmdir(folder)
+
+
+def materialise(copies: list[tuple[str, str, int]], links: bool, threads: int = 8) -> int:
+    """Makes each target from its local source, as a hard link or a copy, returning the number of files made."""
+    def make(copy: tuple[str, str, int]) -> int:
+        source, target, size = fuse_path(copy[0]), fuse_path(copy[1]), copy[2]
+        if os.path.exists(target) and os.path.getsize(target) == size and (not links or os.path.samefile(source, target)):
+            return 0
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if links:
+            if os.path.exists(target + ".part"):
+                os.remove(target + ".part")
+            os.link(source, target + ".part")
+        else:
+            shutil.copyfile(source, target + ".part")
+        os.replace(target + ".part", target)
+        return 1
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return sum(executor.map(make, copies))
+
+
+def write_manifests(tasks: list[CopyTask], hashes: list[Optional[str]], root: str, store: str) -> None:
+    """
+    Writes the manifest of each dataset version to the store, as {store}manifests/{dataset}/{version}.json, mapping
+    the path of each of its files to its hash, i.e. to its blob.
+    """
+    manifests: dict[str, dict[str, Optional[str]]] = dict()
+    for task, content_hash in zip(tasks, hashes):
+        dataset, version, path = task.target[len(root):].split("/", 2)
+        manifests.setdefault(f"{store}{MANIFESTS_FOLDER}{dataset}/{version}.json", dict())[path] = content_hash
+
+    for file_name, manifest in manifests.items():
+        file_name = fuse_path(file_name)
+        partial_name = f"{file_name}.{uuid.uuid4().hex}.part"
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        with open(partial_name, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=4, sort_keys=True)
+        os.replace(partial_name, file_name)
+
+
+def install_tasks(tasks: list[CopyTask], root: str, *,
+                  store: str = None,
+                  spark=None,
+                  num_partitions: int = None,
+                  threads: int = 8,
+                  hash_for: Callable[[str], Optional[str]] = content_md5) -> dict:
+    """
+    Installs the files of the tasks, downloading each distinct content once: files are deduplicated by the hash of
+    their source, within and across dataset versions, and then made from the one downloaded. Only where the storage
+    supports hard links, i.e. a local disk, not DBFS or a volume, does storage too scale with the distinct contents:
+    each file is then a link to a blob in `store`, by default beside the root (see store_path()), which also holds
+    the manifests. Elsewhere, duplicates are local copies and nothing is written outside the dataset folders. The
+    downloads are spread over the cluster's executors with `spark`, and made from the driver otherwise; see
+    install_datasets().
+    """
+    start = time.time()
+    store = store or store_path(root)
+    hashes = hash_tasks(tasks, hash_for)
+    links = supports_hard_links(store)
+    downloads, copies = plan_dedup(tasks, hashes, store, links)
+    print(f"Copying {len(downloads)} distinct of {len(tasks)} files, {sum(t.size for t in downloads) / 1024 ** 2:,.0f} of {sum(t.size for t in tasks) / 1024 ** 2:,.0f} MB.")
+
+    if spark is None:
+        partitions = [downloads]
+        summaries = [next(copy_files(downloads, threads))]
+    else:
+        sc = spark.sparkContext
+        sc.addPyFile(os.path.abspath(__file__))  # copy_files() runs on the executors, which do not have the repository
+        partitions = partition_tasks(downloads, num_partitions or 2 * sc.defaultParallelism)
+        summaries = sc.parallelize(partitions, len(partitions) or 1) \
+                      .mapPartitions(lambda p: copy_files((t for partition in p for t in partition), threads)) \
+                      .collect()
+
+    made = materialise(copies, links, threads)
+    if links:
+        write_manifests(tasks, hashes, root, store)
+
+    seconds = time.time() - start
+    result = {
+        "files": len(tasks),
+        "distinct_files": len(downloads),
+        "copied": sum(s.get("copied") for s in summaries),
+        "bytes": sum(s.get("bytes") for s in summaries),
+        ("linked" if links else "deduplicated"): made,
+        "partitions": len(partitions),
+        "seconds": round(seconds, 1),
+    }
+    result["mb_per_second"] = round(result.get("bytes") / 1024 ** 2 / max(seconds, 0.001), 1)
+    print(f"""Copied {result.get("copied")} of {result.get("files")} files, {result.get("bytes") / 1024 ** 2:,.0f} MB, in {seconds:.0f} seconds ({result.get("mb_per_second")} MB/s), and {"linked" if links else "copied locally"} {made}.""")
+    return result
+
+
+def install_datasets(spark, ls: Callable[[str], list], datasets: Optional[list[str]] = None, *,
+                     num_partitions: int = None,
+                     threads: int = 8,
+                     repository: str = DATASETS_REPOSITORY,
+                     root: str = DATASETS_ROOT) -> dict:
+    """
+    Installs the datasets as WorkspaceHelper.install_datasets() does, but with the copy spread over the cluster's
+    executors, or made from the driver when `spark` is None, and deduplicated (see install_tasks()): the driver lists the files, whose distinct contents are split
+    into `num_partitions` partitions of about the same size (by default, two per executor core) and copied with
+    mapPartitions(), each executor task copying `threads` files at a time. Files already installed are skipped, so a
+    rerun only copies what is missing. Returns the aggregate number of files and bytes copied and the throughput.
+    """
+    tasks = list_copy_tasks(ls, datasets, repository=repository, root=root)
+    return install_tasks(tasks, root, spark=spark, num_partitions=num_partitions, threads=threads)
+
+
+def cluster_workers(spark) -> int:
+    """The number of workers of the Databricks cluster, zero for a single node cluster."""
+    return int(spark.conf.get("spark.databricks.clusterUsageTags.clusterWorkers", "0"))
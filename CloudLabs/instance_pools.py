@@ -0,0 +1,76 @@
+import time
+from contextlib import contextmanager
+from typing import Optional, Iterator
+from simplified_rest_client import SimpleRestClient
+
+POOL_DEFAULT_NAME = "DBAcademy"  # Matches ClustersHelper.POOL_DEFAULT_NAME, as created by the Workspace-Setup job
+
+
+def find_instance_pool(client: SimpleRestClient, pool_name: str = POOL_DEFAULT_NAME) -> Optional[dict]:
+    response = client.call("GET", "/api/2.0/instance-pools/list")
+    return next((p for p in response.get("instance_pools", list()) if p.get("instance_pool_name") == pool_name), None)
+
+
+def get_instance_pool(client: SimpleRestClient, instance_pool_id: str) -> dict:
+    return client.call("GET", "/api/2.0/instance-pools/get", instance_pool_id=instance_pool_id)
+
+
+def get_idle_count(client: SimpleRestClient, instance_pool_id: str) -> int:
+    return get_instance_pool(client, instance_pool_id).get("stats", dict()).get("idle_count", 0)
+
+
+def set_min_idle_instances(client: SimpleRestClient, pool: dict, min_idle_instances: int) -> None:
+    """
+    Edits the pool's min_idle_instances, and records it in `pool`; the edit endpoint requires the pool's name and
+    node type to be restated.
+    """
+    pool_spec = {
+        "instance_pool_id": pool.get("instance_pool_id"),
+        "instance_pool_name": pool.get("instance_pool_name"),
+        "node_type_id": pool.get("node_type_id"),
+        "min_idle_instances": min_idle_instances,
+    }
+    for key in ["max_capacity", "idle_instance_autotermination_minutes", "custom_tags"]:
+        if pool.get(key) is not None:
+            pool_spec[key] = pool.get(key)
+
+    client.call("POST", "/api/2.0/instance-pools/edit", pool_spec)
+    pool["min_idle_instances"] = min_idle_instances
+
+
+def get_warm_target(pool: dict, instance_count: int) -> int:
+    """The number of idle instances to ask for, bounded by the pool's max_capacity when it has one."""
+    max_capacity = pool.get("max_capacity")
+    return instance_count if max_capacity is None else min(instance_count, max_capacity)
+
+
+@contextmanager
+def prewarmed_pool(client: SimpleRestClient, pool: dict, idle_instances: int) -> Iterator[dict]:
+    """
+    Temporarily raises the pool's min_idle_instances to `idle_instances`, restoring the pool's original value
+    (normally zero) on exit, even if provisioning fails part way through. The caller may lower it in the meantime
+    with set_min_idle_instances(), e.g. as the instances are claimed, and it is only restored if it then differs.
+    """
+    original_min_idle_instances = pool.get("min_idle_instances", 0)
+    print(f"""Pre-warming the pool "{pool.get("instance_pool_name")}" to {idle_instances} idle instances.""")
+    set_min_idle_instances(client, pool, idle_instances)
+    try:
+        yield pool
+    finally:
+        if pool.get("min_idle_instances") != original_min_idle_instances:
+            print(f"""Restoring the pool "{pool.get("instance_pool_name")}" to {original_min_idle_instances} idle instances.""")
+            set_min_idle_instances(client, pool, original_min_idle_instances)
+
+
+def wait_for_idle_instances(client: SimpleRestClient, instance_pool_id: str, minimum: int, *,
+                            timeout_seconds: int = 60, poll_seconds: int = 5) -> int:
+    """
+    Waits until the pool reports at least `minimum` idle instances or `timeout_seconds` elapse, returning the
+    last idle count observed so that callers can size their next wave to what the pool actually has.
+    """
+    start = time.time()
+    while True:
+        idle_count = get_idle_count(client, instance_pool_id)
+        if idle_count >= minimum or time.time() - start > timeout_seconds:
+            return idle_count
+        time.sleep(poll_seconds)  # Slow it down a bit so that we don't hammer the REST endpoints.
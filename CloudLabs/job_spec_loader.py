@@ -0,0 +1,195 @@
+import hashlib, json, os, re, tempfile, time, typing, uuid
+from typing import Literal, Any
+import requests
+
+Cloud = Literal["aws", "azure", "gcp"]
+known_clouds = typing.get_args(Cloud)
+
+
+def strip_cloud_specific_keys(cloud: Cloud, data: Any):
+    """
+    Recursively search the parsed json tree, locating keys like "aws:key-name", removing the cloud prefix
+    and keeping the key only if the prefix matches the specified cloud.
+
+    >>> strip_cloud_specific_keys('aws', {
+    ...     'key1': 'abc',
+    ...     'aws:key2': "It's AWS",
+    ...     'azure:key2': "It's Azure"
+    ... })
+    {'key1': 'abc', 'key2': "It's AWS"}
+    """
+    if isinstance(data, list):
+        for item in data:
+            strip_cloud_specific_keys(cloud, item)
+    elif isinstance(data, dict):
+        for key, value in list(data.items()):
+            for cloud_key in known_clouds:
+                prefix = cloud_key + ":"
+                if key.startswith(prefix):
+                    if cloud_key == cloud:
+                        new_key = key[len(prefix):]  # Remove the "aws:" prefix
+                        data[new_key] = value
+                    del data[key]
+            strip_cloud_specific_keys(cloud, value)
+    return data
+
+
+def render_job_spec(job_spec_text: str, variables: dict[str, str], cloud: Cloud) -> dict:
+    """
+    Parses the job specification once each {{variable}} is replaced with its value, keeping only the keys of `cloud`.
+
+    >>> render_job_spec('{"name": "{{event_id}}", "aws:node_type_id": "i3.xlarge", "gcp:node_type_id": "n2-standard-4"}',
+    ...                 {"event_id": 'Classroom "#1"'}, "aws")
+    {'name': 'Classroom "#1"', 'node_type_id': 'i3.xlarge'}
+    """
+    for key, value in variables.items():
+        job_spec_text = job_spec_text.replace("{{" + key + "}}", json.dumps(value)[1:-1])  # Escaped, as within a JSON string
+    # Verify all {{tags}} have been replaced with actual values
+    if match := re.search(r"{{[a-zA-Z_-]+}}", job_spec_text):
+        raise ValueError("Unbound variable: " + match[0])
+    return strip_cloud_specific_keys(cloud, json.loads(job_spec_text))
+
+
+class JobSpecLoader:
+    """
+    Loads the job specification published on GitHub, keeping a copy in a local on-disk cache.
+
+    A cached copy younger than `max_age_seconds` is returned without touching the network, which is what allows a
+    fleet of labs launched at the same time to download the spec once: the first process to take the cache lock
+    fetches it and every other process reads the refreshed copy once the lock is released. Older copies are
+    revalidated with `If-None-Match` so that an unchanged spec costs a 304 and no body. Should GitHub be slow or
+    unreachable, the (possibly stale) cached copy is used instead of blocking lab startup.
+
+    When `offline_path` is specified, the spec is read from that pinned local file and the network is never used.
+    """
+
+    ENV_CACHE_DIR = "WORKSPACE_SETUP_CACHE_DIR"
+    ENV_OFFLINE_PATH = "WORKSPACE_SETUP_JOB_SPEC_PATH"
+
+    def __init__(self, *,
+                 cache_dir: str = None,
+                 offline_path: str = None,
+                 max_age_seconds: int = 5 * 60,
+                 connect_timeout: int = 5,
+                 read_timeout: int = 30,
+                 lock_timeout_seconds: int = 60):
+
+        self.cache_dir = cache_dir or os.environ.get(self.ENV_CACHE_DIR) or os.path.join(tempfile.gettempdir(), "workspace-setup-cache")
+        self.offline_path = offline_path or os.environ.get(self.ENV_OFFLINE_PATH)
+        self.max_age_seconds = max_age_seconds
+        self.connect_timeout = connect_timeout  # seconds
+        self.read_timeout = read_timeout        # seconds
+        self.lock_timeout_seconds = lock_timeout_seconds
+
+        self.session = requests.Session()
+
+    def load(self, url: str) -> str:
+        """Returns the text of the job specification found at `url`, from the pinned file, the cache or the network."""
+        if self.offline_path:
+            print(f"""Reading the pinned job specification from {self.offline_path}.""")
+            with open(self.offline_path, "r", encoding="utf-8") as f:
+                return f.read()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+        body_path = os.path.join(self.cache_dir, f"{key}.json")
+        meta_path = os.path.join(self.cache_dir, f"{key}.meta.json")
+        lock_path = os.path.join(self.cache_dir, f"{key}.lock")
+
+        if self._is_fresh(body_path, meta_path):
+            return self._read(body_path)
+
+        locked = self._acquire_lock(lock_path)
+        try:
+            # Another process may have refreshed the cache while we were waiting on the lock.
+            if self._is_fresh(body_path, meta_path):
+                return self._read(body_path)
+            return self._fetch(url, body_path, meta_path)
+        finally:
+            if locked:
+                self._release_lock(lock_path)
+
+    def _fetch(self, url: str, body_path: str, meta_path: str) -> str:
+        meta = self._read_meta(meta_path)
+        has_cache = os.path.exists(body_path)
+
+        headers = dict()
+        if has_cache and meta.get("etag"):
+            headers["If-None-Match"] = meta.get("etag")
+
+        print(f"""Downloading job specification from {url}.""")
+        try:
+            response = self.session.get(url, headers=headers, timeout=(self.connect_timeout, self.read_timeout))
+            if response.status_code == 304 and has_cache:
+                meta["fetched_at"] = time.time()
+                self._write(meta_path, json.dumps(meta))
+                return self._read(body_path)
+
+            response.raise_for_status()  # Raise an exception only if we didn't get a successful response.
+
+        except requests.exceptions.RequestException as e:
+            if not has_cache:
+                raise e
+            print(f"""WARNING: Unable to download the job specification ({e}), using the cached copy {body_path}.""")
+            return self._read(body_path)
+
+        self._write(body_path, response.text)
+        self._write(meta_path, json.dumps({
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "fetched_at": time.time(),
+        }))
+        return response.text
+
+    def _is_fresh(self, body_path: str, meta_path: str) -> bool:
+        if not os.path.exists(body_path):
+            return False
+        fetched_at = self._read_meta(meta_path).get("fetched_at", 0)
+        return time.time() - fetched_at < self.max_age_seconds
+
+    def _acquire_lock(self, lock_path: str) -> bool:
+        """Waits up to `lock_timeout_seconds` for the cross-process lock, returning False if it could not be taken."""
+        start = time.time()
+        while True:
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > self.lock_timeout_seconds:
+                        os.remove(lock_path)  # Left behind by a process that died while holding it.
+                        continue
+                except FileNotFoundError:
+                    continue
+            if time.time() - start > self.lock_timeout_seconds:
+                return False
+            time.sleep(0.1)
+
+    @staticmethod
+    def _release_lock(lock_path: str) -> None:
+        try:
+            os.remove(lock_path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _read_meta(meta_path: str) -> dict:
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return dict()
+
+    @staticmethod
+    def _read(path: str) -> str:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    @staticmethod
+    def _write(path: str, text: str) -> None:
+        # Write then rename so that concurrent readers never observe a partially written file. The pid alone is not
+        # unique on shared storage, where processes of different clusters may have the same one.
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp_path, path)
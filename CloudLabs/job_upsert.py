@@ -0,0 +1,85 @@
+import copy, hashlib, json, time
+from typing import Optional
+from simplified_rest_client import SimpleRestClient
+
+SPEC_HASH_TAG = "dbacademy.spec_hash"
+ACTIVE_LIFE_CYCLE_STATES = ["PENDING", "RUNNING", "TERMINATING"]
+
+
+def hash_job_spec(job_spec: dict) -> str:
+    """
+    Stable hash of the rendered job spec; keys are sorted so that the hash does not depend on the order of the JSON.
+    The spec-hash tag itself is excluded so that a spec read back from the workspace hashes the same as the original.
+    """
+    job_spec = copy.deepcopy(job_spec)
+    job_spec.get("tags", dict()).pop(SPEC_HASH_TAG, None)
+    text = json.dumps(job_spec, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def find_job(client: SimpleRestClient, job_name: str) -> Optional[dict]:
+    """Returns the job named `job_name`, using the server-side name filter rather than paging through every job."""
+    response = client.call("GET", "/api/2.1/jobs/list", name=job_name)
+    jobs = response.get("jobs", list())
+    return next((j for j in jobs if j.get("settings").get("name") == job_name), None)
+
+
+def upsert_job(client: SimpleRestClient, job_spec: dict) -> tuple[int, bool]:
+    """
+    Creates the job if it does not exist, otherwise resets its settings only when the spec's hash differs from the one
+    recorded on the job. Unlike deleting and recreating the job, the job id and its run history are preserved.
+    Returns the job id and whether the job was created or changed.
+    """
+    spec_hash = hash_job_spec(job_spec)
+    settings = copy.deepcopy(job_spec)
+    settings.setdefault("tags", dict())[SPEC_HASH_TAG] = spec_hash
+
+    job = find_job(client, job_spec.get("name"))
+
+    if job is None:
+        job = client.call("POST", "/api/2.1/jobs/create", settings)
+        return job.get("job_id"), True
+
+    job_id = job.get("job_id")
+    if job.get("settings").get("tags", dict()).get(SPEC_HASH_TAG) == spec_hash:
+        return job_id, False
+
+    client.call("POST", "/api/2.1/jobs/reset", {"job_id": job_id, "new_settings": settings})
+    return job_id, True
+
+
+def get_active_run_id(client: SimpleRestClient, job_id: int) -> Optional[int]:
+    response = client.call("GET", "/api/2.1/jobs/runs/list", job_id=job_id, active_only=True)
+    return next((r.get("run_id") for r in response.get("runs", list())), None)
+
+
+def wait_for_run(client: SimpleRestClient, run_id: int, poll_seconds: int = 5) -> dict:
+    """Blocks until the run leaves the active life-cycle states, returning the run's final state."""
+    while True:
+        response = client.call("GET", "/api/2.1/jobs/runs/get", run_id=run_id)
+        job_state = response.get("state", dict())
+        if job_state.get("life_cycle_state") not in ACTIVE_LIFE_CYCLE_STATES:
+            return job_state
+        time.sleep(poll_seconds)  # Slow it down a bit so that we don't hammer the REST endpoints.
+        print(".", end="")
+
+
+def upsert_and_run(client: SimpleRestClient, job_spec: dict) -> int:
+    """
+    Upserts the job and returns the id of the run to wait on. If the job is unchanged and already running, the active
+    run is attached to instead of starting another. If the job changed while a run was active, that run is allowed to
+    finish before the new settings are run; active runs are never canceled or deleted.
+    """
+    job_id, changed = upsert_job(client, job_spec)
+
+    active_run_id = get_active_run_id(client, job_id)
+    if active_run_id is not None:
+        if not changed:
+            print(f"""Attaching to the active run {active_run_id} of the job {job_id}.""")
+            return active_run_id
+        print(f"""Waiting for the active run {active_run_id} of the job {job_id} to complete before running the updated job.""", end="...")
+        wait_for_run(client, active_run_id)
+        print()
+
+    run = client.call("POST", "/api/2.1/jobs/run-now", {"job_id": job_id})  # Start the job
+    return run.get("run_id")
@@ -0,0 +1,147 @@
+import codecs, json
+from typing import Any, Iterable, Iterator, Optional
+
+
+def project(item: Any, fields: Optional[Iterable[str]]) -> Any:
+    """
+    Keeps only the requested fields of `item`; dotted fields select into nested objects and into every member of
+    nested lists, the same way SCIM's "attributes" parameter does.
+
+    >>> project({"id": "1", "userName": "a", "roles": [], "members": [{"value": "2", "display": "b"}]}, ["id", "members.value"])
+    {'id': '1', 'members': [{'value': '2'}]}
+    """
+    if fields is None or not isinstance(item, dict):
+        return item
+
+    nested: dict[str, list[str]] = dict()
+    for field in fields:
+        name, _, rest = field.partition(".")
+        nested.setdefault(name, list())
+        if rest:
+            nested[name].append(rest)
+
+    result = dict()
+    for name, rest in nested.items():
+        if name not in item:
+            continue
+        value = item[name]
+        if rest and isinstance(value, list):
+            result[name] = [project(v, rest) for v in value]
+        elif rest:
+            result[name] = project(value, rest)
+        else:
+            result[name] = value
+    return result
+
+
+# The characters that may follow a complete number or literal
+_DELIMITERS = ",]} \t\r\n"
+
+
+class _Reader:
+    """A text buffer over a stream of byte chunks that only grows when the parser needs more input."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Appends the next chunk, discarding what has already been consumed; returns False at the end of the stream."""
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.buffer = self.buffer[self.pos:] + self.decoder.decode(b"", final=True)
+            self.pos = 0
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(chunk)
+        self.pos = 0
+        return True
+
+    def peek(self) -> Optional[str]:
+        """Skips whitespace and returns the next character without consuming it, or None at the end of the stream."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof or not self.fill():
+                return None
+
+    def expect(self, c: str) -> None:
+        found = self.peek()
+        if found != c:
+            raise ValueError(f"Expected {c!r} at offset {self.pos}, found {found!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """
+        Decodes the next complete JSON value. A number, or a literal such as true, is only accepted once a delimiter
+        follows it (or the stream has ended), so that one split across chunks, e.g. "3." + "5" or "1e" + "3", is not
+        decoded early; strings, objects and arrays are complete once closed.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.pos)
+                closed = self.buffer[self.pos] in "\"{[" or (end < len(self.buffer) and self.buffer[end] in _DELIMITERS)
+                if closed or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def iter_array_items(chunks: Iterable[bytes], array_path: str, fields: Optional[Iterable[str]] = None, members: Optional[dict] = None) -> Iterator[Any]:
+    """
+    Incrementally parses a JSON object arriving as `chunks`, yielding each member of the top-level array named by
+    `array_path` (e.g. "Resources" or "Resources[*]") as soon as it is complete, optionally reduced to `fields`.
+
+    Only the member being parsed is held in memory rather than the whole body and its fully built object graph.
+    Other top-level members are skipped, or stored in `members` when specified, and parsing stops once the array
+    closes, so only those that precede it are read.
+
+    >>> list(iter_array_items([b'{"totalResults": 2, "Resour', b'ces": [{"id": "1", "x": "]"}, {"id": "2"}]}'], "Resources[*]", ["id"]))
+    [{'id': '1'}, {'id': '2'}]
+    >>> members = dict()
+    >>> list(iter_array_items([b'{"totalResults": 3, "Resources": [{"id": "1"}], "startIndex": 1}'], "Resources", members=members)), members
+    ([{'id': '1'}], {'totalResults': 3})
+    >>> list(iter_array_items([b'{"Resources": [3.', b'5]}'], "Resources")), list(iter_array_items([b'{"Resources": [1e', b'3, tr', b'ue]}'], "Resources"))
+    ([3.5], [1000.0, True])
+    """
+    array_key = array_path[:-3] if array_path.endswith("[*]") else array_path
+    reader = _Reader(chunks)
+
+    reader.expect("{")
+    while True:
+        c = reader.peek()
+        if c is None or c == "}":
+            return
+        if c == ",":
+            reader.pos += 1
+            continue
+
+        key = reader.value()
+        reader.expect(":")
+        if key != array_key:
+            value = reader.value()  # The other members of the object, e.g. "totalResults" or "has_more"
+            if members is not None:
+                members[key] = value
+            continue
+
+        if reader.peek() != "[":
+            return  # The member is null or not an array; there is nothing to yield.
+        reader.pos += 1
+        while True:
+            c = reader.peek()
+            if c is None or c == "]":
+                return
+            if c == ",":
+                reader.pos += 1
+                continue
+            yield project(reader.value(), fields)
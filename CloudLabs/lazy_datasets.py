@@ -0,0 +1,192 @@
+import glob, json, os, re, secrets, time, uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from dataset_copy import DATASETS_REPOSITORY, DATASETS_ROOT, fuse_path, install_tasks, latest_versions, list_copy_tasks
+
+
+class DatasetRegistry:
+    """
+    Lazy dataset installation: setup registers where every dataset of the repository is, but installs only those of
+    the scheduled courses, while any other dataset is installed the first time it is used, through dataset_path().
+    Each use is recorded, so that prefetch() can install the datasets that recent classes used most ahead of time.
+
+    The registry, the usage logs and a marker per installed dataset are kept in the datasets root, so that every
+    cluster of the workspace shares them; a lock per dataset ensures that concurrent first uses install it once. Each
+    registry records its uses in a usage log of its own, e.g. "_usage/1234-5f0e.jsonl", as appends to a common file
+    from several clusters through DBFS FUSE would corrupt it.
+
+    A new workspace has no history of its own, so popularity is read from the fleet: with `usage_folder`, a folder
+    that every workspace can read and write, e.g. a DBFS mount or a volume, each workspace publishes its usage log
+    there as a file of its own with share_usage(), rather than appending to a common file, which concurrent writers
+    on other clusters would corrupt, and popular() counts the uses in all of them.
+    """
+
+    REGISTRY_FILE = "_registry.json"
+    USAGE_FOLDER = "_usage"
+    INSTALLED_FILE = "_INSTALLED"
+
+    def __init__(self, ls: Callable[[str], list], *,
+                 repository: str = DATASETS_REPOSITORY,
+                 root: str = DATASETS_ROOT,
+                 usage_folder: str = None,
+                 lock_timeout_seconds: int = 30 * 60):
+        self.ls = ls  # e.g. dbutils.fs.ls
+        self.repository = repository
+        self.root = root
+        self.usage_folder = usage_folder
+        self.lock_timeout_seconds = lock_timeout_seconds  # An install taking longer is presumed to have died
+        self.usage_file = f"{os.getpid()}-{secrets.token_hex(4)}.jsonl"  # The pid alone may clash across clusters
+
+    def register(self, max_workers: int = 16) -> dict[str, list[str]]:
+        """Records the latest versions of every dataset in the repository, returning them by dataset."""
+        datasets = [f.name.rstrip("/") for f in self.ls(self.repository) if f.name.endswith("/")]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            listings = executor.map(lambda d: self.ls(f"{self.repository}{d}/"), datasets)
+            registry = {d: latest_versions(f.name.rstrip("/") for f in listing if f.name.endswith("/")) for d, listing in zip(datasets, listings)}
+
+        os.makedirs(fuse_path(self.root), exist_ok=True)
+        self._write(self.REGISTRY_FILE, json.dumps(registry, indent=4))
+        print(f"Registered {len(registry)} datasets.")
+        return registry
+
+    def registered(self) -> dict[str, list[str]]:
+        try:
+            with open(self._path(self.REGISTRY_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return dict()
+
+    def is_installed(self, dataset: str) -> bool:
+        return os.path.exists(self._path(dataset, self.INSTALLED_FILE))
+
+    def dataset_path(self, dataset: str, *, used_by: str = None) -> str:
+        """The path of the installed dataset, installing it first if this is its first use; records the use."""
+        self.record_use(dataset, used_by)
+        if not self.is_installed(dataset):
+            self.install(dataset)
+        return f"{self.root}{dataset}/"
+
+    def install(self, dataset: str) -> None:
+        """Installs the dataset from the driver unless it is installed, waiting on any install already under way."""
+        if dataset not in self.registered():
+            raise ValueError(f"""The dataset "{dataset}" is not registered.""")
+
+        lock_path = self._path(f"{dataset}.lock")
+        self._acquire_lock(lock_path)
+        try:
+            if self.is_installed(dataset):  # By whoever held the lock before
+                return
+            tasks = list_copy_tasks(self.ls, [dataset], repository=self.repository, root=self.root)
+            self.mark_installed(dataset, **install_tasks(tasks, self.root))
+            print(f"""Installed the dataset "{dataset}".""")
+        finally:
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+
+    def mark_installed(self, dataset: str, **details) -> None:
+        """Records that the dataset is installed, e.g. by dataset_copy.install_datasets()."""
+        self._write(os.path.join(dataset, self.INSTALLED_FILE), json.dumps({"installed_at": time.time(), **details}))
+
+    def record_use(self, dataset: str, used_by: str = None) -> None:
+        os.makedirs(self._path(self.USAGE_FOLDER), exist_ok=True)
+        with open(self._path(self.USAGE_FOLDER, self.usage_file), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"dataset": dataset, "used_by": used_by, "at": time.time()}) + "\n")
+
+    def share_usage(self, workspace_name: str) -> Optional[str]:
+        """
+        Publishes the usage logs of this workspace's clusters to the usage folder, if any, as one file replacing its
+        last, returning its path.
+        """
+        if self.usage_folder is None:
+            return None
+        logs = self._usage_logs()
+        if not logs:
+            return None
+        text = ""
+        for log in logs:
+            with open(log, "r", encoding="utf-8") as f:
+                text += f.read()
+
+        folder = fuse_path(self.usage_folder)
+        path = os.path.join(folder, re.sub(r"[^\w.-]", "_", workspace_name) + ".jsonl")
+        os.makedirs(folder, exist_ok=True)
+        self._replace(path, text)
+        return path
+
+    def popular(self, *, days: float = 30, top: int = 3) -> list[str]:
+        """
+        The `top` datasets used by the most classes, i.e. distinct users, in the last `days` days, across the fleet
+        when there is a usage folder, and in this workspace otherwise.
+        """
+        since = time.time() - days * 24 * 60 * 60
+        logs = self._usage_logs()
+        if self.usage_folder is not None:
+            logs += sorted(glob.glob(os.path.join(glob.escape(fuse_path(self.usage_folder)), "*.jsonl")))
+
+        uses = set()
+        for log in logs:
+            try:
+                with open(log, "r", encoding="utf-8") as f:
+                    for line in f:
+                        entry = json.loads(line)
+                        if entry.get("at", 0) >= since:
+                            uses.add((entry.get("dataset"), entry.get("used_by")))
+            except FileNotFoundError:
+                continue
+        return [d for d, _ in Counter(d for d, _ in uses).most_common(top)]
+
+    def prefetch(self, *, days: float = 30, top: int = 3) -> list[str]:
+        """Installs the most popular datasets that are not installed yet, returning those installed."""
+        registered = self.registered()
+        datasets = [d for d in self.popular(days=days, top=top) if d in registered and not self.is_installed(d)]
+        for dataset in datasets:
+            self.install(dataset)
+        return datasets
+
+    def _usage_logs(self) -> list[str]:
+        return sorted(glob.glob(os.path.join(glob.escape(self._path(self.USAGE_FOLDER)), "*.jsonl")))
+
+    def _path(self, *names: str) -> str:
+        return os.path.join(fuse_path(self.root), *names)
+
+    def _write(self, name: str, text: str) -> None:
+        self._replace(self._path(name), text)
+
+    @staticmethod
+    def _replace(path: str, text: str) -> None:
+        # Replaced whole, so readers never see a partial write; the partial name is unique across clusters
+        partial_name = f"{path}.{uuid.uuid4().hex}.part"
+        with open(partial_name, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(partial_name, path)
+
+    def _acquire_lock(self, lock_path: str) -> None:
+        start = time.time()
+        while True:
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > self.lock_timeout_seconds:
+                        os.remove(lock_path)  # Left behind by an install that died while holding it.
+                        continue
+                except FileNotFoundError:
+                    continue
+            if time.time() - start > self.lock_timeout_seconds:
+                raise Exception(f"Unable to acquire the lock {lock_path} within {self.lock_timeout_seconds} seconds.")
+            time.sleep(1)
+
+
+def scheduled_datasets(datasets: Optional[list[str]], courses: list[str], registered: dict[str, list[str]]) -> list[str]:
+    """
+    The datasets to install eagerly: those specified or, when none are, those of the scheduled courses, whose
+    datasets are named after them.
+
+    >>> scheduled_datasets(None, ["example-course", "no-dataset-course"], {"example-course": ["v01"], "ml-in-production": ["v02"]})
+    ['example-course']
+    """
+    return datasets or [c for c in courses if c in registered]
@@ -0,0 +1,75 @@
+import importlib.metadata, os, tempfile, uuid, zipfile
+from typing import Optional
+import requests
+
+DBACADEMY_RELEASE_URL = "https://github.com/databricks-academy/dbacademy/releases/download/{version}/dbacademy-{number}-py3-none-any.whl"
+PIP_OPTIONS = "--quiet --disable-pip-version-check"
+
+# Run in place of an install when the library is already in place; %pip still requires a command.
+SKIP_PIP_COMMAND = "list --quiet"
+
+
+class LibraryCache:
+    """
+    Workspace-local cache of library wheels, one folder per version, so that setup jobs install a library from DBFS
+    (or a Volume) rather than downloading it from GitHub on every run. A wheel is only downloaded on a cache miss and
+    is published whole, by renaming the completed download, so that concurrent setups never install a partial one.
+
+    The cache defaults to /dbfs/tmp/dbacademy/workspace-setup/libraries when DBFS is mounted and to a local folder
+    otherwise; set WORKSPACE_SETUP_LIBRARY_CACHE_DIR to e.g. a /Volumes path to relocate it.
+    """
+
+    ENV_LIBRARY_CACHE_DIR = "WORKSPACE_SETUP_LIBRARY_CACHE_DIR"
+    DBFS_PATH = "/dbfs/tmp/dbacademy/workspace-setup/libraries"
+
+    def __init__(self, path: str = None):
+        local_path = os.path.join(tempfile.gettempdir(), "workspace-setup-cache", "libraries")
+        self.path = path or os.environ.get(self.ENV_LIBRARY_CACHE_DIR) or (self.DBFS_PATH if os.path.isdir("/dbfs") else local_path)
+
+    def wheel(self, url: str, version: str) -> str:
+        """The path of the cached wheel downloaded from `url`, downloading it first on a cache miss."""
+        path = os.path.join(self.path, version, url.rsplit("/", 1)[-1])
+        if os.path.exists(path):
+            return path
+
+        print(f"Caching {url} in {os.path.dirname(path)}.")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial_path = f"{path}.{uuid.uuid4().hex}.part"  # The pid alone may clash across the clusters sharing DBFS
+        try:
+            with requests.get(url, stream=True, timeout=60) as response:
+                response.raise_for_status()
+                with open(partial_path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        f.write(chunk)
+            if not zipfile.is_zipfile(partial_path):
+                raise Exception(f"The file downloaded from {url} is not a wheel.")
+            os.replace(partial_path, path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+        return path
+
+
+def installed_version(distribution: str) -> Optional[str]:
+    try:
+        return importlib.metadata.version(distribution)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def dbacademy_pip_command(version: str, cache: LibraryCache = None) -> str:
+    """
+    The arguments of the %pip command that puts the dbacademy library `version`, e.g. "v4.0.7", in place: none when
+    that version is already installed, otherwise an install of the release's wheel from the library cache. Versions
+    other than releases, e.g. a branch name, are installed from GitHub, bypassing the cache.
+    """
+    number = version[1:] if version.startswith("v") else version
+    if installed_version("dbacademy") == number:
+        print(f"The dbacademy library {version} is already installed.")
+        return SKIP_PIP_COMMAND
+
+    if not version.startswith("v"):
+        return f"install {PIP_OPTIONS} git+https://github.com/databricks-academy/dbacademy@{version}"
+
+    wheel_path = (cache or LibraryCache()).wheel(DBACADEMY_RELEASE_URL.format(version=version, number=number), version)
+    return f"install {PIP_OPTIONS} {wheel_path}"
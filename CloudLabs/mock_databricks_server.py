@@ -0,0 +1,631 @@
+import gzip, itertools, json, random, re, threading, time, uuid
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Optional
+from urllib.parse import urlparse, parse_qs
+
+from json_stream import project
+from tracing import path_template
+
+DEFAULT_WORKSPACE = "default"
+NODE_TYPE_IDS = ["i3.xlarge", "i3.2xlarge", "m5d.large", "Standard_D3_v2", "Standard_DS3_v2", "n2-standard-4"]
+SPARK_VERSIONS = ["11.3.x-scala2.12", "11.3.x-cpu-ml-scala2.12", "12.2.x-scala2.12", "12.2.x-cpu-ml-scala2.12", "13.3.x-scala2.12"]
+GZIP_MIN_SIZE = 1024  # bytes; like the real endpoints, small bodies are sent uncompressed
+WAREHOUSE_SIZES = ["2X-Small", "X-Small", "Small", "Medium", "Large", "X-Large", "2X-Large", "3X-Large", "4X-Large"]
+STATEMENTS_PER_CLUSTER = 10
+
+
+class MockError(Exception):
+    def __init__(self, http_code: int, error_code: str, message: str):
+        super().__init__(message)
+        self.http_code = http_code
+        self.error_code = error_code
+        self.message = message
+
+
+class WorkspaceState:
+    """In-memory state of a single mock workspace."""
+
+    def __init__(self, workspace_id: int, ids: Callable[[], int]):
+        self.workspace_id = workspace_id
+        self.users: dict[str, dict] = dict()
+        self.groups: dict[str, dict] = dict()
+        self.sql_config: dict[str, Any] = {"enable_serverless_compute": False}
+        self.warehouses: dict[str, dict] = dict()
+        self.workspace_conf: dict[str, str] = dict()
+        self.jobs: dict[int, dict] = dict()
+        self.runs: dict[int, dict] = dict()
+        self.clusters: dict[str, dict] = dict()
+        self.policies: dict[str, dict] = dict()
+        self.instance_pools: dict[str, dict] = dict()
+
+        for name in ["users", "admins"]:
+            group_id = str(ids())
+            self.groups[group_id] = {"id": group_id, "displayName": name, "members": list(), "entitlements": list(),
+                                     "meta": {"resourceType": "Group", "lastModified": MockDatabricksServer._scim_now()}}
+        for name in ["Starter Warehouse"]:
+            warehouse_id = uuid.uuid4().hex[:16]
+            self.warehouses[warehouse_id] = {"id": warehouse_id, "name": name}
+
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 1024  # Benchmarks open hundreds of connections at once
+
+
+class MockDatabricksServer:
+    """
+    A local stand-in for the Databricks account and workspace REST endpoints used by the CloudLabs scripts, intended
+    for benchmarks and offline testing rather than for fidelity with every detail of the real APIs.
+
+    Account endpoints are served from the root of `url`, e.g. "{url}/api/2.0/accounts/{account_id}/workspaces", while
+    each workspace is served under its deployment name, e.g. "{url}/{deployment_name}/api/2.0/clusters/list". Paths
+    that are neither are served by a workspace named "default", so a single-workspace client can use `url` directly.
+
+    Latency and failures are configurable: every request sleeps `latency_seconds`, and fails with a 429 or with a 500
+    REQUEST_LIMIT_EXCEEDED with the given probabilities. Workspaces stay PROVISIONING for `provisioning_polls` reads and
+    job runs stay RUNNING for `run_polls` reads. SQL statements run for `statement_seconds` on a 2X-Small warehouse,
+    less on larger ones, and queue once every cluster of the warehouse, counting all of max_num_clusters, runs
+    STATEMENTS_PER_CLUSTER of them. SCIM listings return at most `scim_max_count` resources a page, whatever the count
+    requested, as the account SCIM API does. Every request is counted by method and path template in `requests`,
+    `connection_count` counts the TCP connections accepted, and `bytes_sent` counts response bodies as sent, i.e.
+    gzipped when the client accepts it and the body is large.
+    """
+
+    def __init__(self, *,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 latency_seconds: float = 0.0,
+                 rate_limit_probability: float = 0.0,
+                 request_limit_exceeded_probability: float = 0.0,
+                 provisioning_polls: int = 0,
+                 run_polls: int = 0,
+                 statement_seconds: float = 0.0,
+                 scim_max_count: int = None,
+                 seed: int = None):
+
+        self.latency_seconds = latency_seconds
+        self.rate_limit_probability = rate_limit_probability
+        self.request_limit_exceeded_probability = request_limit_exceeded_probability
+        self.provisioning_polls = provisioning_polls
+        self.run_polls = run_polls
+        self.statement_seconds = statement_seconds
+        self.scim_max_count = scim_max_count
+
+        self.requests: Counter = Counter()
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.connection_count = 0
+
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1000).__next__
+
+        self.account_workspaces: dict[int, dict] = dict()
+        self.account_users: dict[str, dict] = dict()
+        self.account_groups: dict[str, dict] = dict()
+        self.credentials = [{"credentials_id": "cred-1", "credentials_name": "default"}]
+        self.storage_configurations = [{"storage_configuration_id": "storage-1", "storage_configuration_name": "us-west-2"}]
+        self.metastores: dict[str, dict] = dict()
+        self.metastore_assignments: dict[int, dict] = dict()
+        self.metastore_permissions: dict[str, dict[str, set]] = dict()
+        self.storage_credentials: dict[str, dict] = dict()
+        # External locations, catalogs, schemas and volumes, and their grants, by (metastore id, securable type, full name)
+        self.securables: dict[tuple[str, str, str], dict] = dict()
+        self.securable_permissions: dict[tuple[str, str, str], dict[str, set]] = dict()
+        self.workspaces: dict[str, WorkspaceState] = {DEFAULT_WORKSPACE: WorkspaceState(0, self._ids)}
+
+        self._statement_slots: dict[tuple[str, int], threading.BoundedSemaphore] = dict()
+        self._routes = self._build_routes()
+        self._server = _Server((host, port), self._handler_class())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def workspace_url(self, deployment_name: str) -> str:
+        return f"{self.url}/{deployment_name}"
+
+    def start(self) -> "MockDatabricksServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockDatabricksServer":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    @property
+    def request_count(self) -> int:
+        return sum(self.requests.values())
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.requests.clear()
+            self.bytes_received = 0
+            self.bytes_sent = 0
+            self.connection_count = 0
+
+    ###############################################################################################
+    # Request dispatch
+    ###############################################################################################
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # Otherwise headers and body written separately stall on delayed ACKs
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connection_count += 1
+
+            def _dispatch(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                status, payload = server._handle(self.command, self.path, body)
+                data = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+                gzipped = len(data) >= GZIP_MIN_SIZE and "gzip" in self.headers.get("Accept-Encoding", "")
+                if gzipped:
+                    data = gzip.compress(data, compresslevel=6)
+                with server._lock:
+                    server.bytes_received += len(body)
+                    server.bytes_sent += len(data)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                if gzipped:
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+            def log_message(self, *args):
+                pass  # Keep benchmark output readable
+
+        return Handler
+
+    def _handle(self, method: str, raw_path: str, body: bytes) -> tuple[int, Any]:
+        parsed = urlparse(raw_path)
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        path = parsed.path
+
+        segments = path.strip("/").split("/", 1)
+        if segments[0] != "api" and len(segments) > 1:
+            workspace_name, path = segments[0], "/" + segments[1]
+        else:
+            workspace_name = DEFAULT_WORKSPACE
+
+        with self._lock:
+            self.requests[(method, path_template(path))] += 1
+            roll = self._random.random()
+
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        if roll < self.rate_limit_probability:
+            return 429, {"error_code": "TOO_MANY_REQUESTS", "message": "Too many requests."}
+        if roll < self.rate_limit_probability + self.request_limit_exceeded_probability:
+            return 500, {"error_code": "REQUEST_LIMIT_EXCEEDED", "message": "REQUEST_LIMIT_EXCEEDED: Your request was rejected due to API rate limit."}
+
+        try:
+            data = json.loads(body) if body else dict()
+        except ValueError:
+            return 400, {"error_code": "MALFORMED_REQUEST", "message": "Invalid JSON"}
+
+        for route_method, pattern, handler in self._routes:
+            if route_method == method and (match := pattern.fullmatch(path)):
+                try:
+                    with self._lock:
+                        workspace = self._get_workspace(workspace_name) if not path.startswith("/api/2.0/accounts/") else None
+                        if handler != self._execute_statement:
+                            return 200, handler(workspace, *match.groups(), query=query, data=data)
+                    # Statements run, and queue, outside the lock, like on a warehouse
+                    return 200, handler(workspace, *match.groups(), query=query, data=data)
+                except MockError as e:
+                    return e.http_code, {"error_code": e.error_code, "message": e.message}
+
+        return 404, {"error_code": "ENDPOINT_NOT_FOUND", "message": f"No API found for '{method} {path}'"}
+
+    def _get_workspace(self, workspace_name: str) -> WorkspaceState:
+        workspace = self.workspaces.get(workspace_name)
+        if workspace is None:
+            raise MockError(404, "RESOURCE_DOES_NOT_EXIST", f"The workspace {workspace_name} does not exist.")
+        return workspace
+
+    def _build_routes(self) -> list[tuple[str, re.Pattern, Callable]]:
+        acct = r"/api/2\.0/accounts/([^/]+)"
+        scim = r"/api/2\.0/preview/scim/v2"
+        uc = r"/api/2\.1/unity-catalog"
+        routes = [
+            # Account API
+            ("GET", acct + r"/workspaces", self._list_account_workspaces),
+            ("POST", acct + r"/workspaces", self._create_account_workspace),
+            ("GET", acct + r"/workspaces/(\d+)", self._get_account_workspace),
+            ("DELETE", acct + r"/workspaces/(\d+)", self._delete_account_workspace),
+            ("GET", acct + r"/credentials", lambda ws, account_id, **_: self.credentials),
+            ("GET", acct + r"/storage-configurations", lambda ws, account_id, **_: self.storage_configurations),
+            ("GET", acct + r"/scim/v2/Users", lambda ws, account_id, **kw: self._scim_list(self.account_users, **kw)),
+            ("POST", acct + r"/scim/v2/Users", lambda ws, account_id, **kw: self._scim_create_user(self.account_users, **kw)),
+            ("DELETE", acct + r"/scim/v2/Users/([^/]+)", lambda ws, account_id, user_id, **_: self._scim_delete(self.account_users, user_id)),
+            ("GET", acct + r"/scim/v2/Groups", lambda ws, account_id, **kw: self._scim_list(self.account_groups, **kw)),
+            ("POST", acct + r"/scim/v2/Groups", lambda ws, account_id, **kw: self._scim_create_group(self.account_groups, **kw)),
+            ("PATCH", acct + r"/scim/v2/Groups/([^/]+)", lambda ws, account_id, group_id, **kw: self._scim_patch_group(self.account_groups, group_id, **kw)),
+            ("DELETE", acct + r"/scim/v2/Groups/([^/]+)", lambda ws, account_id, group_id, **_: self._scim_delete(self.account_groups, group_id)),
+            # Workspace SCIM
+            ("GET", scim + r"/Users", lambda ws, **kw: self._scim_list(ws.users, **kw)),
+            ("POST", scim + r"/Users", lambda ws, **kw: self._scim_create_user(ws.users, workspace=ws, **kw)),
+            ("GET", scim + r"/Groups", lambda ws, **kw: self._scim_list(ws.groups, **kw)),
+            ("PATCH", scim + r"/Groups/([^/]+)", lambda ws, group_id, **kw: self._scim_patch_group(ws.groups, group_id, **kw)),
+            # Unity Catalog
+            ("GET", uc + r"/metastores", lambda ws, **_: {"metastores": list(self.metastores.values())}),
+            ("POST", uc + r"/metastores", self._create_metastore),
+            ("GET", uc + r"/metastores/([^/]+)", lambda ws, metastore_id, **_: self._get_metastore(metastore_id)),
+            ("PATCH", uc + r"/metastores/([^/]+)", self._update_metastore),
+            ("DELETE", uc + r"/metastores/([^/]+)", self._delete_metastore),
+            ("PUT", uc + r"/workspaces/(\d+)/metastore", self._assign_metastore),
+            ("DELETE", uc + r"/workspaces/(\d+)/metastore", lambda ws, workspace_id, **_: self._pop(self.metastore_assignments, int(workspace_id), "metastore assignment")),
+            ("GET", uc + r"/current-metastore-assignment", self._current_metastore_assignment),
+            ("GET", uc + r"/permissions/metastore/([^/]+)", self._get_metastore_permissions),
+            ("PATCH", uc + r"/permissions/metastore/([^/]+)", self._update_metastore_permissions),
+            ("GET", uc + r"/storage-credentials", lambda ws, **_: {"storage_credentials": list(self.storage_credentials.values())}),
+            ("GET", uc + r"/storage-credentials/([^/]+)", self._get_storage_credential),
+            ("POST", uc + r"/validate-storage-credentials", self._validate_storage_credential),
+            ("POST", uc + r"/storage-credentials", self._create_storage_credential),
+            ("POST", uc + r"/external-locations", lambda ws, data, **_: self._create_securable(ws, "external_location", data)),
+            ("GET", uc + r"/external-locations/([^/]+)", lambda ws, name, **_: self._get_securable(ws, "external_location", name)),
+            ("POST", uc + r"/catalogs", lambda ws, data, **_: self._create_securable(ws, "catalog", data)),
+            ("GET", uc + r"/catalogs/([^/]+)", lambda ws, name, **_: self._get_securable(ws, "catalog", name)),
+            ("POST", uc + r"/schemas", lambda ws, data, **_: self._create_securable(ws, "schema", data)),
+            ("GET", uc + r"/schemas/([^/]+)", lambda ws, full_name, **_: self._get_securable(ws, "schema", full_name)),
+            ("POST", uc + r"/volumes", lambda ws, data, **_: self._create_securable(ws, "volume", data)),
+            ("GET", uc + r"/volumes/([^/]+)", lambda ws, full_name, **_: self._get_securable(ws, "volume", full_name)),
+            ("GET", uc + r"/permissions/(external_location|catalog|schema|volume)/([^/]+)", self._get_securable_permissions),
+            ("PATCH", uc + r"/permissions/(external_location|catalog|schema|volume)/([^/]+)", self._update_securable_permissions),
+            # SQL
+            ("GET", r"/api/2\.0/sql/config/endpoints", lambda ws, **_: dict(ws.sql_config)),
+            ("PUT", r"/api/2\.0/sql/config/endpoints", lambda ws, data, **_: ws.sql_config.update(data) or dict()),
+            ("GET", r"/api/2\.0/sql/warehouses", lambda ws, **_: {"warehouses": list(ws.warehouses.values())}),
+            ("POST", r"/api/2\.0/sql/warehouses", self._create_warehouse),
+            ("GET", r"/api/2\.0/sql/warehouses/([^/]+)", lambda ws, warehouse_id, **_: self._get(ws.warehouses, warehouse_id, "warehouse")),
+            ("POST", r"/api/2\.0/sql/warehouses/([^/]+)/edit", lambda ws, warehouse_id, data, **_: self._get(ws.warehouses, warehouse_id, "warehouse").update(data) or dict()),
+            ("DELETE", r"/api/2\.0/sql/warehouses/([^/]+)", lambda ws, warehouse_id, **_: self._pop(ws.warehouses, warehouse_id, "warehouse")),
+            ("POST", r"/api/2\.0/sql/warehouses/([^/]+)/start", lambda ws, warehouse_id, **_: self._get(ws.warehouses, warehouse_id, "warehouse").update(state="RUNNING") or dict()),
+            ("POST", r"/api/2\.0/sql/warehouses/([^/]+)/stop", lambda ws, warehouse_id, **_: self._get(ws.warehouses, warehouse_id, "warehouse").update(state="STOPPED") or dict()),
+            ("POST", r"/api/2\.0/sql/statements", self._execute_statement),
+            # Workspace settings
+            ("GET", r"/api/2\.0/workspace-conf", lambda ws, **_: dict(ws.workspace_conf)),
+            ("PATCH", r"/api/2\.0/workspace-conf", lambda ws, data, **_: ws.workspace_conf.update(data) or dict()),
+            # Jobs
+            ("GET", r"/api/2\.1/jobs/list", self._list_jobs),
+            ("GET", r"/api/2\.1/jobs/get", lambda ws, query, **_: self._get(ws.jobs, int(query.get("job_id", 0)), "job")),
+            ("POST", r"/api/2\.1/jobs/create", self._create_job),
+            ("POST", r"/api/2\.1/jobs/reset", self._reset_job),
+            ("POST", r"/api/2\.1/jobs/delete", lambda ws, data, **_: self._pop(ws.jobs, data.get("job_id"), "job")),
+            ("POST", r"/api/2\.1/jobs/run-now", self._run_now),
+            ("GET", r"/api/2\.1/jobs/runs/get", self._get_run),
+            ("GET", r"/api/2\.1/jobs/runs/list", self._list_runs),
+            # Compute
+            ("GET", r"/api/2\.0/clusters/list", lambda ws, **_: {"clusters": list(ws.clusters.values())}),
+            ("POST", r"/api/2\.0/clusters/create", self._create_cluster),
+            ("GET", r"/api/2\.0/clusters/list-node-types", lambda ws, **_: {"node_types": [{"node_type_id": n} for n in NODE_TYPE_IDS]}),
+            ("GET", r"/api/2\.0/clusters/spark-versions", lambda ws, **_: {"versions": [{"key": v, "name": v} for v in SPARK_VERSIONS]}),
+            ("GET", r"/api/2\.0/policies/clusters/list", lambda ws, **_: {"policies": list(ws.policies.values())}),
+            ("POST", r"/api/2\.0/policies/clusters/edit", lambda ws, data, **_: self._get(ws.policies, data.get("policy_id"), "policy").update(data) or dict()),
+            ("GET", r"/api/2\.0/instance-pools/list", lambda ws, **_: {"instance_pools": list(ws.instance_pools.values())}),
+            ("GET", r"/api/2\.0/instance-pools/get", lambda ws, query, **_: self._get(ws.instance_pools, query.get("instance_pool_id"), "instance pool")),
+            ("POST", r"/api/2\.0/instance-pools/edit", self._edit_instance_pool),
+        ]
+        return [(method, re.compile(pattern), handler) for method, pattern, handler in routes]
+
+    ###############################################################################################
+    # Helpers
+    ###############################################################################################
+    @staticmethod
+    def _get(items: dict, key: Any, kind: str) -> dict:
+        if key not in items:
+            raise MockError(404, "RESOURCE_DOES_NOT_EXIST", f"The {kind} {key} does not exist.")
+        return items[key]
+
+    @staticmethod
+    def _pop(items: dict, key: Any, kind: str) -> dict:
+        MockDatabricksServer._get(items, key, kind)
+        del items[key]
+        return dict()
+
+    ###############################################################################################
+    # Account workspaces
+    ###############################################################################################
+    def _list_account_workspaces(self, ws, account_id, **_) -> list:
+        return list(self.account_workspaces.values())
+
+    def _create_account_workspace(self, ws, account_id, data, **_) -> dict:
+        workspace_id = self._ids()
+        workspace = {
+            "workspace_id": workspace_id,
+            "workspace_name": data.get("workspace_name"),
+            "deployment_name": data.get("deployment_name"),
+            "workspace_status": "PROVISIONING",
+            "_polls": 0,
+        }
+        self.account_workspaces[workspace_id] = workspace
+        self.workspaces[workspace.get("deployment_name")] = WorkspaceState(workspace_id, self._ids)
+        return {k: v for k, v in workspace.items() if not k.startswith("_")}
+
+    def _get_account_workspace(self, ws, account_id, workspace_id, **_) -> dict:
+        workspace = self._get(self.account_workspaces, int(workspace_id), "workspace")
+        workspace["_polls"] += 1
+        if workspace["_polls"] > self.provisioning_polls:
+            workspace["workspace_status"] = "RUNNING"
+        return {k: v for k, v in workspace.items() if not k.startswith("_")}
+
+    def _delete_account_workspace(self, ws, account_id, workspace_id, **_) -> dict:
+        workspace = self._get(self.account_workspaces, int(workspace_id), "workspace")
+        del self.account_workspaces[int(workspace_id)]
+        self.workspaces.pop(workspace.get("deployment_name"), None)
+        return dict()
+
+    ###############################################################################################
+    # SCIM
+    ###############################################################################################
+    @staticmethod
+    def _scim_now() -> str:
+        return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+    def _scim_list(self, items: dict[str, dict], query: dict, **_) -> dict:
+        resources = list(items.values())
+        if query.get("filter"):
+            # Only the filter used for incremental listings is supported
+            match = re.fullmatch(r'meta\.lastModified (gt|ge) "([^"]+)"', query.get("filter"))
+            if match is None:
+                raise MockError(400, "INVALID_PARAMETER_VALUE", f"""Unsupported filter: {query.get("filter")}""")
+            operator, timestamp = match.groups()
+            resources = [r for r in resources if r["meta"]["lastModified"] > timestamp or (operator == "ge" and r["meta"]["lastModified"] == timestamp)]
+        start_index = int(query.get("startIndex", 1))
+        count = min(int(query.get("count", 10000)), self.scim_max_count or 10000)
+        page = resources[start_index - 1:start_index - 1 + count]
+        if query.get("attributes"):
+            page = [project(r, ["id", *query.get("attributes").split(",")]) for r in page]  # "id" is always returned
+        elif query.get("excludedAttributes"):
+            excluded = query.get("excludedAttributes").split(",")
+            page = [{k: v for k, v in r.items() if k not in excluded} for r in page]
+        return {
+            "schemas": ["urn:ietf:params:scim:api:messages:2.0:ListResponse"],
+            "totalResults": len(resources),
+            "startIndex": start_index,
+            "itemsPerPage": len(page),
+            "Resources": page,
+        }
+
+    def _scim_create_user(self, users: dict[str, dict], data: dict, workspace: WorkspaceState = None, **_) -> dict:
+        user_name = data.get("userName")
+        if any(u.get("userName") == user_name for u in users.values()):
+            raise MockError(409, "RESOURCE_CONFLICT", f"User with username {user_name} already exists.")
+        user_id = str(self._ids())
+        user = {"id": user_id, "userName": user_name, "displayName": user_name, "active": True,
+                "emails": [{"value": user_name, "primary": True}], "roles": list(), "groups": list(), "entitlements": list(),
+                "meta": {"resourceType": "User", "lastModified": self._scim_now()}}
+        users[user_id] = user
+        if workspace is not None:
+            # New workspace users are automatically members of the "users" group
+            users_group = next(g for g in workspace.groups.values() if g.get("displayName") == "users")
+            users_group["members"].append({"value": user_id, "display": user_name})
+            users_group["meta"]["lastModified"] = self._scim_now()
+        return user
+
+    def _scim_create_group(self, groups: dict[str, dict], data: dict, **_) -> dict:
+        group_id = str(self._ids())
+        group = {"id": group_id, "displayName": data.get("displayName"), "members": list(data.get("members", list())),
+                 "meta": {"resourceType": "Group", "lastModified": self._scim_now()}}
+        groups[group_id] = group
+        return group
+
+    def _scim_patch_group(self, groups: dict[str, dict], group_id: str, data: dict, **_) -> dict:
+        group = self._get(groups, group_id, "group")
+        for operation in data.get("Operations", list()):
+            if operation.get("op") == "add":
+                for key, values in operation.get("value", dict()).items():
+                    existing = group.setdefault(key, list())
+                    existing.extend(v for v in values if v not in existing)
+            elif operation.get("op") == "remove" and (match := re.match(r'(\w+)\[value eq "([^"]+)"', operation.get("path", ""))):
+                key, value = match.groups()
+                group[key] = [v for v in group.get(key, list()) if v.get("value") != value]
+        group["meta"]["lastModified"] = self._scim_now()
+        return group
+
+    def _scim_delete(self, items: dict[str, dict], item_id: str) -> dict:
+        return self._pop(items, item_id, "principal")
+
+    ###############################################################################################
+    # Unity Catalog
+    ###############################################################################################
+    def _create_metastore(self, ws, data, **_) -> dict:
+        metastore_id = str(uuid.uuid4())
+        metastore = {"metastore_id": metastore_id, "name": data.get("name"), "storage_root": data.get("storage_root"), "region": data.get("region")}
+        self.metastores[metastore_id] = metastore
+        self.metastore_permissions[metastore_id] = dict()
+        return metastore
+
+    def _get_metastore(self, metastore_id: str) -> dict:
+        return self._get(self.metastores, metastore_id, "metastore")
+
+    def _update_metastore(self, ws, metastore_id, data, **_) -> dict:
+        metastore = self._get_metastore(metastore_id)
+        metastore.update(data)
+        return metastore
+
+    def _delete_metastore(self, ws, metastore_id, **_) -> dict:
+        self.metastore_permissions.pop(metastore_id, None)
+        return self._pop(self.metastores, metastore_id, "metastore")
+
+    def _assign_metastore(self, ws, workspace_id, data, **_) -> dict:
+        self._get_metastore(data.get("metastore_id"))
+        self.metastore_assignments[int(workspace_id)] = {"workspace_id": int(workspace_id), **data}
+        return dict()
+
+    def _current_metastore_assignment(self, ws, **_) -> dict:
+        return self._get(self.metastore_assignments, ws.workspace_id, "metastore assignment")
+
+    def _get_metastore_permissions(self, ws, metastore_id, **_) -> dict:
+        return self._privilege_assignments(self._get(self.metastore_permissions, metastore_id, "metastore"))
+
+    def _update_metastore_permissions(self, ws, metastore_id, data, **_) -> dict:
+        return self._apply_permission_changes(self._get(self.metastore_permissions, metastore_id, "metastore"), data)
+
+    @staticmethod
+    def _privilege_assignments(permissions: dict[str, set]) -> dict:
+        return {"privilege_assignments": [{"principal": p, "privileges": sorted(v)} for p, v in permissions.items()]}
+
+    @staticmethod
+    def _apply_permission_changes(permissions: dict[str, set], data: dict) -> dict:
+        for change in data.get("changes", list()):
+            privileges = permissions.setdefault(change.get("principal"), set())
+            privileges.update(change.get("add", list()))
+            privileges.difference_update(change.get("remove", list()))
+        return MockDatabricksServer._privilege_assignments(permissions)
+
+    def _securable_key(self, ws, securable_type: str, full_name: str) -> tuple[str, str, str]:
+        # Securables belong to the metastore assigned to the workspace
+        return self._current_metastore_assignment(ws).get("metastore_id"), securable_type, full_name
+
+    def _get_securable(self, ws, securable_type: str, full_name: str) -> dict:
+        return self._get(self.securables, self._securable_key(ws, securable_type, full_name), securable_type.replace("_", " "))
+
+    def _create_securable(self, ws, securable_type: str, data: dict) -> dict:
+        if securable_type == "external_location":
+            self._get(self.storage_credentials, data.get("credential_name"), "storage credential")
+            full_name = data.get("name")
+        elif securable_type == "catalog":
+            full_name = data.get("name")
+        elif securable_type == "schema":
+            full_name = self._get_securable(ws, "catalog", data.get("catalog_name")).get("full_name") + "." + data.get("name")
+        else:
+            schema = self._get_securable(ws, "schema", f"""{data.get("catalog_name")}.{data.get("schema_name")}""")
+            full_name = schema.get("full_name") + "." + data.get("name")
+            if data.get("volume_type") == "EXTERNAL":
+                locations = [v for (m, t, _), v in self.securables.items() if m == schema.get("metastore_id") and t == "external_location"]
+                if not any(data.get("storage_location", "").startswith(l.get("url")) for l in locations):
+                    raise MockError(400, "INVALID_PARAMETER_VALUE", f"""No external location covers {data.get("storage_location")}.""")
+
+        key = self._securable_key(ws, securable_type, full_name)
+        if key in self.securables:
+            raise MockError(409, "RESOURCE_ALREADY_EXISTS", f"""The {securable_type.replace("_", " ")} {full_name} already exists.""")
+        self.securables[key] = {**data, "full_name": full_name, "metastore_id": key[0]}
+        self.securable_permissions[key] = dict()
+        return self.securables[key]
+
+    def _get_securable_permissions(self, ws, securable_type, full_name, **_) -> dict:
+        permissions = self._get(self.securable_permissions, self._securable_key(ws, securable_type, full_name), securable_type.replace("_", " "))
+        return self._privilege_assignments(permissions)
+
+    def _update_securable_permissions(self, ws, securable_type, full_name, data, **_) -> dict:
+        permissions = self._get(self.securable_permissions, self._securable_key(ws, securable_type, full_name), securable_type.replace("_", " "))
+        return self._apply_permission_changes(permissions, data)
+
+    def _get_storage_credential(self, ws, name, **_) -> dict:
+        return self._get(self.storage_credentials, name, "storage credential")
+
+    def _create_storage_credential(self, ws, data, **_) -> dict:
+        credential = {"id": str(uuid.uuid4()), **data}
+        self.storage_credentials[data.get("name")] = credential
+        return credential
+
+    def _validate_storage_credential(self, ws, data, **_) -> dict:
+        self._get(self.storage_credentials, data.get("storage_credential_name"), "storage credential")
+        return {"is_dir": True, "results": [{"operation": operation, "result": "PASS"} for operation in ["READ", "LIST", "WRITE", "DELETE"]]}
+
+    ###############################################################################################
+    # SQL warehouses
+    ###############################################################################################
+    def _create_warehouse(self, ws, data, **_) -> dict:
+        warehouse_id = uuid.uuid4().hex[:16]
+        ws.warehouses[warehouse_id] = {"cluster_size": "2X-Small", "min_num_clusters": 1, "max_num_clusters": 1, **data, "id": warehouse_id, "state": "RUNNING"}
+        return {"id": warehouse_id}
+
+    def _execute_statement(self, ws, data, **_) -> dict:
+        with self._lock:
+            warehouse = self._get(ws.warehouses, data.get("warehouse_id"), "warehouse")
+            size = WAREHOUSE_SIZES.index(warehouse.get("cluster_size", "2X-Small"))
+            slots_key = (warehouse.get("id"), int(warehouse.get("max_num_clusters", 1)))
+            slots = self._statement_slots.setdefault(slots_key, threading.BoundedSemaphore(slots_key[1] * STATEMENTS_PER_CLUSTER))
+
+        with slots:
+            time.sleep(self.statement_seconds / 1.6 ** size)  # Each size runs a statement about 1.6 times as fast
+        return {"statement_id": uuid.uuid4().hex, "status": {"state": "SUCCEEDED"}}
+
+    ###############################################################################################
+    # Jobs
+    ###############################################################################################
+    def _list_jobs(self, ws, query, **_) -> dict:
+        jobs = [j for j in ws.jobs.values() if query.get("name") in (None, j.get("settings").get("name"))]
+        offset, limit = int(query.get("offset", 0)), int(query.get("limit", 20))
+        page = jobs[offset:offset + limit]
+        return {"jobs": page, "has_more": offset + limit < len(jobs)} if page else {"has_more": False}
+
+    def _create_job(self, ws, data, **_) -> dict:
+        job_id = self._ids()
+        ws.jobs[job_id] = {"job_id": job_id, "settings": data, "created_time": int(time.time() * 1000)}
+        return {"job_id": job_id}
+
+    def _reset_job(self, ws, data, **_) -> dict:
+        job = self._get(ws.jobs, data.get("job_id"), "job")
+        job["settings"] = data.get("new_settings")
+        return dict()
+
+    def _run_now(self, ws, data, **_) -> dict:
+        job_id = data.get("job_id")
+        self._get(ws.jobs, job_id, "job")
+        run_id = self._ids()
+        ws.runs[run_id] = {"run_id": run_id, "job_id": job_id, "_polls": 0,
+                           "state": {"life_cycle_state": "PENDING", "state_message": ""}}
+        return {"run_id": run_id, "number_in_job": run_id}
+
+    def _get_run(self, ws, query, **_) -> dict:
+        run = self._get(ws.runs, int(query.get("run_id", 0)), "run")
+        run["_polls"] += 1
+        if run["_polls"] > self.run_polls:
+            run["state"] = {"life_cycle_state": "TERMINATED", "result_state": "SUCCESS", "state_message": ""}
+        elif run["_polls"] > 0:
+            run["state"] = {"life_cycle_state": "RUNNING", "state_message": "In run"}
+        return {k: v for k, v in run.items() if not k.startswith("_")}
+
+    def _list_runs(self, ws, query, **_) -> dict:
+        runs = [r for r in ws.runs.values() if query.get("job_id") in (None, str(r.get("job_id")))]
+        if query.get("active_only") == "true":
+            runs = [r for r in runs if r.get("state").get("life_cycle_state") in ["PENDING", "RUNNING", "TERMINATING"]]
+        return {"runs": [{k: v for k, v in r.items() if not k.startswith("_")} for r in runs], "has_more": False}
+
+    ###############################################################################################
+    # Compute
+    ###############################################################################################
+    def _create_cluster(self, ws, data, **_) -> dict:
+        cluster_id = f"{time.strftime('%m%d')}-{self._ids():06d}-mock"
+        ws.clusters[cluster_id] = {"cluster_id": cluster_id, "state": "RUNNING", **data}
+        return {"cluster_id": cluster_id}
+
+    def _edit_instance_pool(self, ws, data, **_) -> dict:
+        pool = self._get(ws.instance_pools, data.get("instance_pool_id"), "instance pool")
+        pool.update(data)
+        pool["stats"] = {"idle_count": pool.get("min_idle_instances", 0), "used_count": 0, "pending_idle_count": 0}
+        return dict()
+
+    def add_cluster_policy(self, name: str, workspace_name: str = DEFAULT_WORKSPACE) -> str:
+        policy_id = uuid.uuid4().hex[:16].upper()
+        self.workspaces[workspace_name].policies[policy_id] = {"policy_id": policy_id, "name": name}
+        return policy_id
+
+    def add_instance_pool(self, name: str, node_type_id: str, workspace_name: str = DEFAULT_WORKSPACE, **attributes) -> str:
+        pool_id = f"{time.strftime('%m%d')}-{self._ids():06d}-pool"
+        self.workspaces[workspace_name].instance_pools[pool_id] = {
+            "instance_pool_id": pool_id, "instance_pool_name": name, "node_type_id": node_type_id,
+            "min_idle_instances": 0, "stats": {"idle_count": 0, "used_count": 0, "pending_idle_count": 0}, **attributes}
+        return pool_id
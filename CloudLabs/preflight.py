@@ -0,0 +1,179 @@
+import json, os, tempfile, threading, time, uuid
+from urllib.parse import parse_qs, urlparse
+from simplified_rest_client import SimpleRestClient
+
+NODE_TYPES_PATH = "/api/2.0/clusters/list-node-types"
+SPARK_VERSIONS_PATH = "/api/2.0/clusters/spark-versions"
+
+
+class ComputeCatalog:
+    """The node type ids and Spark version keys offered by the workspaces of one cloud."""
+
+    def __init__(self, cloud: str, node_type_ids: set[str], spark_versions: set[str], fetched_at: float):
+        self.cloud = cloud
+        self.node_type_ids = node_type_ids
+        self.spark_versions = spark_versions
+        self.fetched_at = fetched_at
+
+    def to_dict(self) -> dict:
+        return {"cloud": self.cloud, "node_type_ids": sorted(self.node_type_ids), "spark_versions": sorted(self.spark_versions), "fetched_at": self.fetched_at}
+
+    @staticmethod
+    def from_dict(entry: dict) -> "ComputeCatalog":
+        return ComputeCatalog(entry.get("cloud"), set(entry.get("node_type_ids", list())), set(entry.get("spark_versions", list())), entry.get("fetched_at", 0.0))
+
+
+class ComputeCatalogCache:
+    """
+    Per-cloud cache of the node types and Spark versions offered by Databricks, kept as one JSON file per cloud under
+    WORKSPACE_SETUP_CACHE_DIR so that it is shared by every run on the machine, or on the workspace when the folder
+    is in DBFS. Files are replaced whole, so readers never see a partial write.
+
+    Entries expire after `ttl_seconds`. A lookup for a node type or Spark version that is not in the catalog refreshes
+    it once before giving up, so one released, or only offered in some regions, since the catalog was fetched is still
+    found.
+    """
+
+    ENV_CACHE_DIR = "WORKSPACE_SETUP_CACHE_DIR"
+
+    def __init__(self, path: str = None, ttl_seconds: int = 24 * 60 * 60):
+        self.path = path or os.environ.get(self.ENV_CACHE_DIR) or os.path.join(tempfile.gettempdir(), "workspace-setup-cache")
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+    def get(self, client: SimpleRestClient, cloud: str, refresh: bool = False) -> ComputeCatalog:
+        with self._lock:
+            file_name = self._file_name(cloud)
+            if not refresh and os.path.exists(file_name):
+                with open(file_name, "r", encoding="utf-8") as f:
+                    catalog = ComputeCatalog.from_dict(json.load(f))
+                if time.time() - catalog.fetched_at < self.ttl_seconds:
+                    return catalog
+
+            print(f"Refreshing the cached node types and Spark versions of {cloud}.")
+            node_types = client.call("GET", NODE_TYPES_PATH).get("node_types", list())
+            spark_versions = client.call("GET", SPARK_VERSIONS_PATH).get("versions", list())
+            catalog = ComputeCatalog(cloud, {n.get("node_type_id") for n in node_types}, {v.get("key") for v in spark_versions}, time.time())
+
+            os.makedirs(self.path, exist_ok=True)
+            partial_name = f"{file_name}.{uuid.uuid4().hex}.part"  # The pid alone may clash across the clusters sharing DBFS
+            with open(partial_name, "w", encoding="utf-8") as f:
+                json.dump(catalog.to_dict(), f)
+            os.replace(partial_name, file_name)
+            return catalog
+
+    def invalidate(self, cloud: str = None) -> None:
+        """Drops the cached catalog of `cloud`, or of every cloud if not specified."""
+        with self._lock:
+            if not os.path.isdir(self.path):
+                return
+            for file_name in os.listdir(self.path):
+                if file_name.startswith("compute-catalog-") and file_name.endswith(".json"):
+                    if cloud is None or file_name == os.path.basename(self._file_name(cloud)):
+                        os.remove(os.path.join(self.path, file_name))
+
+    def _file_name(self, cloud: str) -> str:
+        return os.path.join(self.path, f"compute-catalog-{cloud.lower()}.json")
+
+
+def cloud_for_url(workspace_url: str) -> str:
+    """
+    The cloud of a workspace, named as in WorkspaceConfig.cloud, from its URL.
+
+    >>> cloud_for_url("https://adb-1234.5.azuredatabricks.net"), cloud_for_url("https://1234.5.gcp.databricks.com")
+    ('MSA', 'GCP')
+    """
+    host = urlparse(workspace_url).netloc.lower()
+    if host.endswith(".azuredatabricks.net"):
+        return "MSA"
+    elif host.endswith(".gcp.databricks.com"):
+        return "GCP"
+    else:
+        return "AWS"
+
+
+def parse_course_definition(definition: str) -> dict[str, str]:
+    """
+    The parameters of a courseware definition, either a bare query string or the CDS URL that it is appended to.
+
+    >>> parse_course_definition("course=example-course&version=v1.1.6")
+    {'course': 'example-course', 'version': 'v1.1.6'}
+    >>> parse_course_definition("https://dev.training.databricks.com/api/v1/courses/download.dbc?course=ml-in-production&token=asfd123")["course"]
+    'ml-in-production'
+    """
+    definition = definition.strip()
+    query = urlparse(definition).query if "?" in definition else definition
+    return {k: v[-1] for k, v in parse_qs(query).items()}
+
+
+def split_parameter(value) -> list[str]:
+    """
+    The entries of a comma separated parameter, which may also be given as a list; "none" and "null" mean no entries.
+
+    >>> split_parameter("example-course, ml-in-production,"), split_parameter("None"), split_parameter(["a"])
+    (['example-course', 'ml-in-production'], [], ['a'])
+    """
+    if value is None:
+        return list()
+    entries = value if isinstance(value, list) else value.split(",")
+    return [e.strip() for e in entries if e.strip() and e.strip().lower() not in ["none", "null"]]
+
+
+def find_problems(client: SimpleRestClient, cloud: str, *,
+                  node_type_id: str,
+                  spark_versions,
+                  datasets=None,
+                  courses=None,
+                  dataset_index: set[str] = None,
+                  cache: ComputeCatalogCache = None) -> list[str]:
+    """
+    Checks every setup parameter in one pass, returning a description of each problem found. The node type and Spark
+    versions are checked against the cloud's cached catalog, the datasets against `dataset_index` when specified, and
+    each courseware definition for the parameters the CDS requires; the CDS has no listing of its courses to check
+    them against.
+    """
+    problems = list()
+    spark_versions = split_parameter(spark_versions)
+
+    if not node_type_id:
+        problems.append("The node type id must be specified.")
+    if not spark_versions:
+        problems.append("The Spark version must be specified.")
+
+    if node_type_id or spark_versions:
+        cache = cache or catalog_cache
+        catalog = cache.get(client, cloud)
+        if (node_type_id and node_type_id not in catalog.node_type_ids) or not set(spark_versions) <= catalog.spark_versions:
+            catalog = cache.get(client, cloud, refresh=True)  # Refresh on miss
+        if node_type_id and node_type_id not in catalog.node_type_ids:
+            problems.append(f"""The node type "{node_type_id}" is not offered on {cloud}.""")
+        for spark_version in spark_versions:
+            if spark_version not in catalog.spark_versions:
+                problems.append(f"""The Spark version "{spark_version}" is not offered on {cloud}.""")
+
+    for dataset in split_parameter(datasets):
+        if dataset_index is not None and dataset not in dataset_index:
+            problems.append(f"""The dataset "{dataset}" does not exist.""")
+
+    for i, definition in enumerate(split_parameter(courses), start=1):
+        # Definitions carry CDS tokens, so they are identified by position and course name only
+        parameters = parse_course_definition(definition)
+        course = parameters.get("course")
+        if not course:
+            problems.append(f"The courseware definition #{i} does not specify the course.")
+        if not parameters.get("token"):
+            problems.append(f"""The courseware definition #{i} ({course or "unknown course"}) does not specify the CDS token.""")
+
+    return problems
+
+
+def preflight(client: SimpleRestClient, cloud: str, **parameters) -> None:
+    """Raises a ValueError listing every problem that find_problems() reports with the setup parameters, if any."""
+    problems = find_problems(client, cloud, **parameters)
+    if problems:
+        raise ValueError("The workspace setup parameters are invalid:\n" + "\n".join(f"* {p}" for p in problems))
+    print("The workspace setup parameters are valid.")
+
+
+# Shared by every script in this process; set WORKSPACE_SETUP_CACHE_DIR to relocate the catalogs.
+catalog_cache = ComputeCatalogCache()
@@ -0,0 +1,196 @@
+"""
+Pre-warms the compute of classroom workspaces ahead of their classes, so that the first queries and clusters of every
+student start on warm compute rather than all waiting on cold compute at once.
+
+    python prewarm_scheduler.py --schedule classes.json --lead-minutes 20 --relax-after-minutes 30
+
+The schedule lists the classes of the whole fleet, in the style of the CloudLabs cluster configs:
+
+    [{"workspaceUrl": "https://...", "workspaceToken": "...", "classStart": "2026-10-20T09:00:00-07:00",
+      "studentCount": 40, "course": "data-analysis-with-databricks-sql"}]
+
+`--lead-minutes` before each class, the scheduler starts the workspace's DBAcademy Warehouse, scaled to the clusters
+its students need at the start of a lab, and raises the idle instances of its DBAcademy pool to one per student.
+`--relax-after-minutes` after the class starts, once the students' clusters are running, both are returned to their
+original settings. Classes of a workspace that overlap are warmed as one.
+"""
+import argparse, dataclasses, heapq, json, threading, time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from typing import Iterator, Optional
+from client_registry import clients
+from instance_pools import POOL_DEFAULT_NAME, find_instance_pool, get_warm_target, prewarmed_pool
+from simplified_rest_client import SimpleRestClient
+from warehouse_sizing import size_warehouse
+
+WAREHOUSE_DEFAULT_NAME = "DBAcademy Warehouse"  # Matches WarehousesHelper.WAREHOUSES_DEFAULT_NAME
+
+# The settings of a warehouse that an edit, which replaces them as a whole, must restate
+WAREHOUSE_SETTINGS = ["name", "cluster_size", "min_num_clusters", "max_num_clusters", "auto_stop_mins", "enable_photon",
+                      "enable_serverless_compute", "warehouse_type", "spot_instance_policy", "channel", "tags"]
+
+
+@dataclasses.dataclass
+class PrewarmWindow:
+    """The time during which a workspace's compute is kept warm, covering one or more of its classes."""
+    workspace_url: str
+    workspace_token: str
+    prewarm_at: float
+    relax_at: float
+    idle_instances: int
+    warehouse_clusters: Optional[int]
+
+
+def plan_windows(classes: list[dict], lead_seconds: float, relax_after_seconds: float) -> list[PrewarmWindow]:
+    """
+    One window per workspace and run of overlapping classes, warm enough for the largest of them.
+
+    >>> classes = [{"workspaceUrl": "https://a", "workspaceToken": "t", "classStart": "2026-10-20T09:00:00+00:00", "studentCount": 40},
+    ...            {"workspaceUrl": "https://a", "workspaceToken": "t", "classStart": "2026-10-20T09:30:00+00:00", "studentCount": 60}]
+    >>> [(w.relax_at - w.prewarm_at, w.idle_instances) for w in plan_windows(classes, 20 * 60, 30 * 60)]
+    [(4800.0, 60)]
+    """
+    windows = list()
+    for c in sorted(classes, key=lambda c: (c.get("workspaceUrl"), class_start(c))):
+        student_count = int(c.get("studentCount", 0))
+        warehouse_clusters = size_warehouse(student_count, c.get("course")).max_num_clusters if student_count else None
+        window = PrewarmWindow(c.get("workspaceUrl"), c.get("workspaceToken"), class_start(c) - lead_seconds, class_start(c) + relax_after_seconds, student_count, warehouse_clusters)
+
+        last = windows[-1] if windows else None
+        if last and last.workspace_url == window.workspace_url and window.prewarm_at <= last.relax_at:
+            last.relax_at = max(last.relax_at, window.relax_at)
+            last.idle_instances = max(last.idle_instances, window.idle_instances)
+            last.warehouse_clusters = max(last.warehouse_clusters or 0, window.warehouse_clusters or 0) or None
+        else:
+            windows.append(window)
+    return windows
+
+
+def class_start(c: dict) -> float:
+    return datetime.fromisoformat(c.get("classStart")).timestamp()
+
+
+def find_warehouse(client: SimpleRestClient, name: str = WAREHOUSE_DEFAULT_NAME) -> Optional[dict]:
+    response = client.call("GET", "/api/2.0/sql/warehouses")
+    return next((w for w in response.get("warehouses", list()) if w.get("name") == name), None)
+
+
+def set_min_num_clusters(client: SimpleRestClient, warehouse: dict, min_num_clusters: int) -> None:
+    settings = {k: warehouse.get(k) for k in WAREHOUSE_SETTINGS if warehouse.get(k) is not None}
+    client.call("POST", f"""/api/2.0/sql/warehouses/{warehouse.get("id")}/edit""", {**settings, "min_num_clusters": min_num_clusters})
+
+
+@contextmanager
+def prewarmed_warehouse(client: SimpleRestClient, warehouse: dict, min_num_clusters: int = None) -> Iterator[dict]:
+    """
+    Starts the warehouse and, when specified, temporarily raises its min_num_clusters to `min_num_clusters` (bounded
+    by its max_num_clusters), restoring the original value on exit. The warehouse is left running on exit, to be
+    stopped by its own auto stop once idle.
+    """
+    original_min_num_clusters = warehouse.get("min_num_clusters", 1)
+    min_num_clusters = min(min_num_clusters or 0, warehouse.get("max_num_clusters", 1))
+    raised = min_num_clusters > original_min_num_clusters
+
+    print(f"""Starting the warehouse "{warehouse.get("name")}" with {max(min_num_clusters, original_min_num_clusters)} clusters.""")
+    if raised:
+        set_min_num_clusters(client, warehouse, min_num_clusters)
+    if warehouse.get("state") not in ["RUNNING", "STARTING"]:
+        client.call("POST", f"""/api/2.0/sql/warehouses/{warehouse.get("id")}/start""")
+    try:
+        yield warehouse
+    finally:
+        if raised:
+            print(f"""Restoring the warehouse "{warehouse.get("name")}" to {original_min_num_clusters} clusters.""")
+            set_min_num_clusters(client, warehouse, original_min_num_clusters)
+
+
+class PrewarmScheduler:
+    """
+    Pre-warms and relaxes the compute of every workspace in the fleet on schedule from a single process: one thread
+    waits for the next due window, while the REST calls of due windows run concurrently on `max_workers` threads.
+    Windows whose time has already passed are acted on at once; a window whose class is over is skipped. A failure
+    in one workspace is reported and does not affect the others.
+    """
+
+    def __init__(self, classes: list[dict], *,
+                 lead_minutes: float = 20,
+                 relax_after_minutes: float = 30,
+                 pool_name: str = POOL_DEFAULT_NAME,
+                 warehouse_name: str = WAREHOUSE_DEFAULT_NAME,
+                 max_workers: int = 16):
+        self.windows = plan_windows(classes, lead_minutes * 60, relax_after_minutes * 60)
+        self.pool_name = pool_name
+        self.warehouse_name = warehouse_name
+        self.max_workers = max_workers
+        self.failures: list[tuple[PrewarmWindow, Exception]] = list()
+        self._stacks: dict[int, ExitStack] = dict()
+
+    def run(self, stop: threading.Event = None) -> None:
+        """Runs until every window has been relaxed, or until `stop` is set, when the windows warmed are relaxed at once."""
+        stop = stop or threading.Event()
+        now = time.time()
+        events = [(at, relax, i) for i, w in enumerate(self.windows) if w.relax_at > now for at, relax in [(w.prewarm_at, False), (w.relax_at, True)]]
+        heapq.heapify(events)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            prewarming: dict[int, Future] = dict()
+            while events and not stop.wait(max(0.0, events[0][0] - time.time())):
+                _, relax, i = heapq.heappop(events)
+                if relax:
+                    executor.submit(self.relax, self.windows[i], prewarming.pop(i))
+                else:
+                    prewarming[i] = executor.submit(self.prewarm, self.windows[i])
+
+            for i, prewarmed in prewarming.items():
+                executor.submit(self.relax, self.windows[i], prewarmed)
+
+        print(f"Pre-warmed {len(self.windows)} windows with {len(self.failures)} failures.")
+
+    def prewarm(self, window: PrewarmWindow) -> None:
+        stack = self._stacks[id(window)] = ExitStack()
+        try:
+            workspaces_api = clients.get(url=window.workspace_url, token=window.workspace_token)
+            print(f"Pre-warming {window.workspace_url}.")
+
+            warehouse = find_warehouse(workspaces_api, self.warehouse_name)
+            if warehouse is None:
+                print(f"""| No warehouse "{self.warehouse_name}" in {window.workspace_url}.""")
+            else:
+                stack.enter_context(prewarmed_warehouse(workspaces_api, warehouse, window.warehouse_clusters))
+
+            pool = find_instance_pool(workspaces_api, self.pool_name)
+            if pool is None:
+                print(f"""| No instance pool "{self.pool_name}" in {window.workspace_url}.""")
+            elif window.idle_instances:
+                stack.enter_context(prewarmed_pool(workspaces_api, pool, get_warm_target(pool, window.idle_instances)))
+        except Exception as e:
+            print(f"Unable to pre-warm {window.workspace_url}: {e}")
+            self.failures.append((window, e))
+
+    def relax(self, window: PrewarmWindow, prewarmed: Future) -> None:
+        prewarmed.result()  # Relaxing waits for the window to be warmed, should that still be under way
+        try:
+            print(f"Relaxing {window.workspace_url}.")
+            self._stacks.pop(id(window)).close()
+        except Exception as e:
+            print(f"Unable to relax {window.workspace_url}: {e}")
+            self.failures.append((window, e))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--schedule", required=True, help="JSON file of the fleet's classes")
+    parser.add_argument("--lead-minutes", type=float, default=20)
+    parser.add_argument("--relax-after-minutes", type=float, default=30)
+    parser.add_argument("--max-workers", type=int, default=16)
+    args = parser.parse_args()
+
+    with open(args.schedule, "r", encoding="utf-8") as f:
+        classes = json.load(f)
+    scheduler = PrewarmScheduler(classes, lead_minutes=args.lead_minutes, relax_after_minutes=args.relax_after_minutes, max_workers=args.max_workers)
+    scheduler.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+from typing import Iterator, Optional
+from simplified_rest_client import SimpleRestClient, JsonStream
+
+ACCOUNT_SCIM_PATH = "/api/2.0/accounts/{account_id}/scim/v2"
+WORKSPACE_SCIM_PATH = "/api/2.0/preview/scim/v2"
+
+# The only SCIM attributes indexed; the rest (roles, entitlements, emails, every member's display name...) is left out
+# of the listings, which are otherwise large on big workspaces.
+USER_ATTRIBUTES = ["id", "userName"]
+GROUP_ATTRIBUTES = ["id", "displayName", "members.value"]
+
+
+def list_resources(client: SimpleRestClient, scim_path: str, resource_type: str, attributes: list[str], page_size: int = 1000, **params) -> Iterator[dict]:
+    """
+    Yields every resource of a paginated SCIM listing, e.g. resource_type="Users", each page streamed as it is parsed.
+    Additional `params`, e.g. `filter`, are passed with every page.
+    """
+    # The server may return fewer resources than the `page_size` requested, e.g. the account API returns at most 100
+    # groups a page, so only an empty page or one reaching totalResults is the last.
+    start_index = 1
+    while True:
+        count = 0
+        members = dict()
+        for resource in client.call("GET", f"""{scim_path.rstrip("/")}/{resource_type}""", _result_type=JsonStream, _stream_path="Resources", _stream_members=members,
+                                    _attributes=attributes, startIndex=start_index, count=page_size, **params):
+            count += 1
+            yield resource
+        if count == 0 or ("totalResults" in members and start_index + count > int(members.get("totalResults"))):
+            return
+        start_index += count
+
+
+class DirectoryUser:
+    __slots__ = ("id", "user_name")
+
+    def __init__(self, user_id: str, user_name: str):
+        self.id = user_id
+        self.user_name = user_name
+
+    def __repr__(self) -> str:
+        return f"DirectoryUser({self.id!r}, {self.user_name!r})"
+
+
+class DirectoryGroup:
+    __slots__ = ("id", "display_name", "member_ids")
+
+    def __init__(self, group_id: str, display_name: str, member_ids: set[str] = None):
+        self.id = group_id
+        self.display_name = display_name
+        self.member_ids = member_ids if member_ids is not None else set()
+
+    def __repr__(self) -> str:
+        return f"DirectoryGroup({self.id!r}, {self.display_name!r}, {len(self.member_ids)} members)"
+
+
+class ScimDirectory:
+    """
+    Compact index of the users and groups of an account or workspace, keeping only the ids and names that the setup
+    scripts read rather than the SCIM objects themselves. Users are indexed by userName and by id, groups by
+    displayName, and each group's members are a set of user ids, so every lookup and membership check is O(1).
+
+    The index is loaded page by page, each page streamed and reduced to its entries as it is parsed, and is then kept
+    current with add_user(), add_group() and add_member() as the scripts create users and groups, rather than by
+    listing again. With a `cache` (see scim_directory_cache.py) the index is loaded from, and these updates are
+    written through to, a directory cache shared by every run on the machine instead.
+
+    >>> directory = ScimDirectory(None, WORKSPACE_SCIM_PATH)
+    >>> directory.add_group({"id": "10", "displayName": "admins", "members": [{"value": "1"}]})
+    DirectoryGroup('10', 'admins', 1 members)
+    >>> directory.add_user({"id": "2", "userName": "class+001@databricks.com"})
+    DirectoryUser('2', 'class+001@databricks.com')
+    >>> directory.is_member("admins", "1"), directory.is_member("admins", "2")
+    (True, False)
+    """
+
+    def __init__(self, client: Optional[SimpleRestClient], scim_path: str, page_size: int = 1000, cache: "ScimDirectoryCache" = None):
+        self.client = client
+        self.scim_path = scim_path.rstrip("/")
+        self.page_size = page_size
+        self.cache = cache
+        self._users_by_name: dict[str, DirectoryUser] = dict()
+        self._users_by_id: dict[str, DirectoryUser] = dict()
+        self._groups_by_name: dict[str, DirectoryGroup] = dict()
+
+    def __len__(self) -> int:
+        return len(self._users_by_name)
+
+    def __contains__(self, user_name: str) -> bool:
+        return user_name in self._users_by_name
+
+    ###############################################################################################
+    # Loading
+    ###############################################################################################
+    def load(self) -> "ScimDirectory":
+        return self.load_groups().load_users()
+
+    def load_users(self) -> "ScimDirectory":
+        if self.cache is not None:
+            users = self.cache.users(self.client, self.scim_path)
+        else:
+            users = list_resources(self.client, self.scim_path, "Users", USER_ATTRIBUTES, self.page_size)
+        for user in users:
+            self._index_user(user)
+        return self
+
+    def load_groups(self) -> "ScimDirectory":
+        if self.cache is not None:
+            groups = self.cache.groups(self.client, self.scim_path)
+        else:
+            groups = list_resources(self.client, self.scim_path, "Groups", GROUP_ATTRIBUTES, self.page_size)
+        for group in groups:
+            self._index_group(group)
+        return self
+
+    ###############################################################################################
+    # Lookups and incremental updates
+    ###############################################################################################
+    def user(self, user_name: str) -> Optional[DirectoryUser]:
+        return self._users_by_name.get(user_name)
+
+    def user_by_id(self, user_id: str) -> Optional[DirectoryUser]:
+        return self._users_by_id.get(user_id)
+
+    def group(self, display_name: str) -> Optional[DirectoryGroup]:
+        return self._groups_by_name.get(display_name)
+
+    def is_member(self, display_name: str, user_id: str) -> bool:
+        group = self._groups_by_name.get(display_name)
+        return group is not None and user_id in group.member_ids
+
+    def add_user(self, user: dict) -> DirectoryUser:
+        """Indexes a SCIM user, e.g. as returned when it was created."""
+        if self.cache is not None:
+            self.cache.record_user(self.client, self.scim_path, user)
+        return self._index_user(user)
+
+    def add_group(self, group: dict) -> DirectoryGroup:
+        """Indexes a SCIM group, e.g. as returned when it was created."""
+        if self.cache is not None:
+            self.cache.record_group(self.client, self.scim_path, group)
+        return self._index_group(group)
+
+    def add_member(self, display_name: str, user_id: str) -> None:
+        """Records that `user_id` was added to the group, e.g. after the PATCH adding it succeeded."""
+        group = self._groups_by_name[display_name]
+        if self.cache is not None:
+            self.cache.record_member(self.client, self.scim_path, group.id, user_id)
+        group.member_ids.add(user_id)
+
+    def remove_group(self, display_name: str) -> None:
+        """Records that the group was deleted."""
+        group = self._groups_by_name.pop(display_name, None)
+        if group is not None and self.cache is not None:
+            self.cache.forget_group(self.client, self.scim_path, group.id)
+
+    def _index_user(self, user: dict) -> DirectoryUser:
+        entry = DirectoryUser(user.get("id"), user.get("userName"))
+        self._users_by_name[entry.user_name] = entry
+        self._users_by_id[entry.id] = entry
+        return entry
+
+    def _index_group(self, group: dict) -> DirectoryGroup:
+        entry = DirectoryGroup(group.get("id"), group.get("displayName"), {m.get("value") for m in group.get("members", list())})
+        self._groups_by_name[entry.display_name] = entry
+        return entry
@@ -0,0 +1,221 @@
+import os, sqlite3, tempfile, threading, time
+from contextlib import closing, contextmanager
+from typing import Iterator
+from simplified_rest_client import SimpleRestClient, DatabricksApiException
+from scim_directory import list_resources, USER_ATTRIBUTES, GROUP_ATTRIBUTES
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (scope TEXT, id TEXT, user_name TEXT, PRIMARY KEY (scope, id));
+CREATE TABLE IF NOT EXISTS groups (scope TEXT, id TEXT, display_name TEXT, PRIMARY KEY (scope, id));
+CREATE TABLE IF NOT EXISTS group_members (scope TEXT, group_id TEXT, user_id TEXT, PRIMARY KEY (scope, group_id, user_id));
+CREATE TABLE IF NOT EXISTS sync (scope TEXT, resource_type TEXT, full_refresh_at REAL, refreshed_at REAL, watermark TEXT, PRIMARY KEY (scope, resource_type));
+CREATE TABLE IF NOT EXISTS refresh_leases (scope TEXT, resource_type TEXT, leased_until REAL, PRIMARY KEY (scope, resource_type));
+"""
+
+
+class ScimDirectoryCache:
+    """
+    SQLite cache of the users and groups of SCIM directories, shared by every process on the machine, so that a fleet
+    of workspaces provisioned against one account lists the account's users and groups once rather than once per
+    workspace. Each directory is identified by its client's URL and SCIM path.
+
+    A directory is refreshed at most every `max_staleness_seconds`; within that window, lookups are local reads.
+    Refreshes are incremental, listing only the resources modified since the last one (SCIM `meta.lastModified`),
+    and a full refresh is made every `ttl_seconds`, which also bounds how long a deletion made elsewhere goes unseen.
+    Servers that do not support the filter, or do not report `meta.lastModified`, are always refreshed in full.
+    A refresh lease, taken and released in short transactions, makes processes starting together wait for a single
+    refresh, while the listing itself is made without holding SQLite's write lock, which is only taken to apply it.
+
+    The users, groups and memberships created by the setup scripts are written through to the cache as they are
+    made (see ScimDirectory), so that the runs that follow see them without waiting for a refresh; one made while a
+    full refresh is listing is replaced by that listing, and then seen again by the next incremental refresh.
+    """
+
+    ENV_CACHE_DIR = "WORKSPACE_SETUP_CACHE_DIR"
+
+    def __init__(self, path: str = None, *,
+                 max_staleness_seconds: int = 60,
+                 ttl_seconds: int = 60 * 60,
+                 busy_timeout_seconds: int = 5 * 60,
+                 page_size: int = 1000):
+
+        cache_dir = os.environ.get(self.ENV_CACHE_DIR) or os.path.join(tempfile.gettempdir(), "workspace-setup-cache")
+        self.path = path or os.path.join(cache_dir, "scim-directory.sqlite")
+        self.max_staleness_seconds = max_staleness_seconds
+        self.ttl_seconds = ttl_seconds
+        self.busy_timeout_seconds = busy_timeout_seconds
+        self.page_size = page_size
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def scope(client: SimpleRestClient, scim_path: str) -> str:
+        return client.url.rstrip("/") + "/" + scim_path.strip("/")
+
+    ###############################################################################################
+    # Reads
+    ###############################################################################################
+    def users(self, client: SimpleRestClient, scim_path: str) -> list[dict]:
+        """The directory's users as SCIM users reduced to USER_ATTRIBUTES, refreshed first if stale."""
+        scope = self.scope(client, scim_path)
+        self.refresh(client, scim_path, "Users")
+        with self._connect() as db:
+            rows = db.execute("SELECT id, user_name FROM users WHERE scope = ?", (scope,)).fetchall()
+        return [{"id": user_id, "userName": user_name} for user_id, user_name in rows]
+
+    def groups(self, client: SimpleRestClient, scim_path: str) -> list[dict]:
+        """The directory's groups as SCIM groups reduced to GROUP_ATTRIBUTES, refreshed first if stale."""
+        scope = self.scope(client, scim_path)
+        self.refresh(client, scim_path, "Groups")
+        with self._connect() as db:
+            groups = {group_id: {"id": group_id, "displayName": display_name, "members": list()}
+                      for group_id, display_name in db.execute("SELECT id, display_name FROM groups WHERE scope = ?", (scope,))}
+            for group_id, user_id in db.execute("SELECT group_id, user_id FROM group_members WHERE scope = ?", (scope,)):
+                if group_id in groups:
+                    groups[group_id]["members"].append({"value": user_id})
+        return list(groups.values())
+
+    ###############################################################################################
+    # Refresh
+    ###############################################################################################
+    def refresh(self, client: SimpleRestClient, scim_path: str, resource_type: str, force_full: bool = False) -> None:
+        scope = self.scope(client, scim_path)
+
+        # Take the refresh lease in a short transaction, or wait for the process holding it to finish its refresh
+        while True:
+            with self._transaction() as db:
+                row = db.execute("SELECT full_refresh_at, refreshed_at, watermark FROM sync WHERE scope = ? AND resource_type = ?", (scope, resource_type)).fetchone()
+                full_refresh_at, refreshed_at, watermark = row or (0.0, 0.0, None)
+
+                now = time.time()
+                if not force_full and now - refreshed_at < self.max_staleness_seconds:
+                    return  # Fresh, possibly refreshed by another process while this one waited for the lease
+
+                lease = db.execute("SELECT leased_until FROM refresh_leases WHERE scope = ? AND resource_type = ?", (scope, resource_type)).fetchone()
+                if lease is None or lease[0] < now:  # An expired lease was left by a process that died while refreshing
+                    db.execute("INSERT OR REPLACE INTO refresh_leases VALUES (?, ?, ?)", (scope, resource_type, now + self.busy_timeout_seconds))
+                    break
+            time.sleep(1)
+
+        try:
+            # Listed without holding the write lock, which is only taken to apply the result
+            full = force_full or watermark is None or now - full_refresh_at >= self.ttl_seconds
+            resources = None
+            if not full:
+                try:
+                    resources = list(self._list(client, scim_path, resource_type, filter=f'meta.lastModified ge "{watermark}"'))
+                except DatabricksApiException:
+                    full = True  # The filter is not supported
+
+            if full:
+                print(f"Refreshing the cached {resource_type} of {scope}.")
+                resources = list(self._list(client, scim_path, resource_type))
+                full_refresh_at = now
+                watermark = None
+
+            with self._transaction() as db:
+                if full:
+                    self._delete_scope(db, scope, resource_type)
+                for resource in resources:
+                    if resource_type == "Users":
+                        self._upsert_user(db, scope, resource)
+                    else:
+                        self._upsert_group(db, scope, resource)
+                    last_modified = resource.get("meta", dict()).get("lastModified")
+                    if last_modified is not None and (watermark is None or last_modified > watermark):
+                        watermark = last_modified
+
+                db.execute("INSERT OR REPLACE INTO sync VALUES (?, ?, ?, ?, ?)", (scope, resource_type, full_refresh_at, now, watermark))
+                db.execute("DELETE FROM refresh_leases WHERE scope = ? AND resource_type = ?", (scope, resource_type))
+        except BaseException:
+            with self._transaction() as db:
+                db.execute("DELETE FROM refresh_leases WHERE scope = ? AND resource_type = ?", (scope, resource_type))
+            raise
+
+    def invalidate(self, client: SimpleRestClient = None, scim_path: str = None) -> None:
+        """Forces the next read of the directory, or of every directory if not specified, to refresh in full."""
+        with self._transaction() as db:
+            if client is None:
+                db.execute("DELETE FROM sync")
+            else:
+                db.execute("DELETE FROM sync WHERE scope = ?", (self.scope(client, scim_path),))
+
+    def _list(self, client: SimpleRestClient, scim_path: str, resource_type: str, **params) -> Iterator[dict]:
+        attributes = USER_ATTRIBUTES if resource_type == "Users" else GROUP_ATTRIBUTES
+        return list_resources(client, scim_path, resource_type, [*attributes, "meta.lastModified"], self.page_size, **params)
+
+    ###############################################################################################
+    # Write-through of our own changes
+    ###############################################################################################
+    def record_user(self, client: SimpleRestClient, scim_path: str, user: dict) -> None:
+        with self._transaction() as db:
+            self._upsert_user(db, self.scope(client, scim_path), user)
+
+    def record_group(self, client: SimpleRestClient, scim_path: str, group: dict) -> None:
+        with self._transaction() as db:
+            self._upsert_group(db, self.scope(client, scim_path), group)
+
+    def record_member(self, client: SimpleRestClient, scim_path: str, group_id: str, user_id: str) -> None:
+        with self._transaction() as db:
+            db.execute("INSERT OR IGNORE INTO group_members VALUES (?, ?, ?)", (self.scope(client, scim_path), group_id, user_id))
+
+    def forget_group(self, client: SimpleRestClient, scim_path: str, group_id: str) -> None:
+        scope = self.scope(client, scim_path)
+        with self._transaction() as db:
+            db.execute("DELETE FROM groups WHERE scope = ? AND id = ?", (scope, group_id))
+            db.execute("DELETE FROM group_members WHERE scope = ? AND group_id = ?", (scope, group_id))
+
+    @staticmethod
+    def _upsert_user(db: sqlite3.Connection, scope: str, user: dict) -> None:
+        db.execute("INSERT OR REPLACE INTO users VALUES (?, ?, ?)", (scope, user.get("id"), user.get("userName")))
+
+    @staticmethod
+    def _upsert_group(db: sqlite3.Connection, scope: str, group: dict) -> None:
+        group_id = group.get("id")
+        db.execute("INSERT OR REPLACE INTO groups VALUES (?, ?, ?)", (scope, group_id, group.get("displayName")))
+        db.execute("DELETE FROM group_members WHERE scope = ? AND group_id = ?", (scope, group_id))
+        db.executemany("INSERT OR IGNORE INTO group_members VALUES (?, ?, ?)", [(scope, group_id, m.get("value")) for m in group.get("members", list())])
+
+    @staticmethod
+    def _delete_scope(db: sqlite3.Connection, scope: str, resource_type: str) -> None:
+        if resource_type == "Users":
+            db.execute("DELETE FROM users WHERE scope = ?", (scope,))
+        else:
+            db.execute("DELETE FROM groups WHERE scope = ?", (scope,))
+            db.execute("DELETE FROM group_members WHERE scope = ?", (scope,))
+
+    ###############################################################################################
+    # Connections
+    ###############################################################################################
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        self._initialize()
+        # Autocommit mode; transactions are begun explicitly by _transaction()
+        with closing(sqlite3.connect(self.path, timeout=self.busy_timeout_seconds, isolation_level=None)) as db:
+            yield db
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")  # Takes the write lock up front, so that reads followed by writes do not deadlock
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def _initialize(self) -> None:
+        with self._lock:
+            if self._initialized:
+                return
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with closing(sqlite3.connect(self.path, timeout=self.busy_timeout_seconds)) as db:
+                db.execute("PRAGMA journal_mode=WAL")  # Readers are not blocked by a refresh in progress
+                db.executescript(_SCHEMA)
+            self._initialized = True
+
+
+# Shared by every script in this process; set WORKSPACE_SETUP_CACHE_DIR to relocate the database.
+directory_cache = ScimDirectoryCache()
@@ -0,0 +1,199 @@
+import json, re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
+from dataset_copy import DATASETS_REPOSITORY, DATASETS_ROOT, install_datasets
+from simplified_rest_client import SimpleRestClient
+import tracing
+from tracing import Tracer
+from uc_grants import Grant, apply_grants
+
+# Where every classroom workspace finds the shared datasets, as /Volumes/dbacademy/datasets/shared/{dataset}/{version}/
+LOCATION_NAME = "dbacademy-datasets"
+CATALOG_NAME = "dbacademy"
+SCHEMA_NAME = "datasets"
+VOLUME_NAME = "shared"
+
+# Volumes are only readable from clusters of Databricks Runtime 13.3 LTS and later
+VOLUMES_RUNTIME = (13, 3)
+
+# The environment variable telling courseware where the datasets are installed, rather than dbfs:/mnt/dbacademy-datasets/
+DATASETS_PATH_ENV = "DBACADEMY_DATASETS_PATH"
+
+# Where the courseware of the pinned dbacademy library reads the datasets, as it does not read DATASETS_PATH_ENV
+DATASETS_MOUNT_POINT = DATASETS_ROOT[len("dbfs:"):].rstrip("/")
+
+
+def volume_path(catalog: str = CATALOG_NAME, schema: str = SCHEMA_NAME, volume: str = VOLUME_NAME) -> str:
+    """
+    The path of the shared datasets on the clusters and SQL warehouses of an attached workspace.
+
+    >>> volume_path()
+    '/Volumes/dbacademy/datasets/shared/'
+    """
+    return f"/Volumes/{catalog}/{schema}/{volume}/"
+
+
+def require_volumes_runtime(spark_versions: Iterable[str]) -> None:
+    """
+    Raises a ValueError if any of the Databricks Runtime versions, e.g. the classroom's default_spark_version, cannot
+    read volumes, and so the shared datasets.
+
+    >>> require_volumes_runtime(["13.3.x-scala2.12", "14.1.x-cpu-ml-scala2.12"])
+    >>> require_volumes_runtime(["11.3.x-scala2.12", "13.3.x-scala2.12"])
+    Traceback (most recent call last):
+    ...
+    ValueError: The shared datasets require Databricks Runtime 13.3 or later, found 11.3.x-scala2.12.
+    """
+    def version(spark_version: str) -> tuple:
+        match = re.match(r"(\d+)\.(\d+)", spark_version.strip())
+        return (int(match[1]), int(match[2])) if match else (0, 0)
+
+    unsupported = [v.strip() for v in spark_versions if version(v) < VOLUMES_RUNTIME]
+    if unsupported:
+        raise ValueError(f"""The shared datasets require Databricks Runtime {".".join(map(str, VOLUMES_RUNTIME))} or later, found {", ".join(unsupported)}.""")
+
+
+def point_policies_at_datasets(workspaces_api: SimpleRestClient, path: str, *, policy_prefix: str = "DBAcademy") -> list[str]:
+    """
+    Points the courseware at the datasets installed at `path`, e.g. the shared volume, by fixing DATASETS_PATH_ENV in
+    every cluster policy whose name starts with `policy_prefix`, and so on every cluster the students create. Only the
+    policies not already pointing there are edited; returns their names.
+    """
+    key = f"spark_env_vars.{DATASETS_PATH_ENV}"
+    edited = list()
+    for policy in workspaces_api.call("GET", "/api/2.0/policies/clusters/list").get("policies", list()):
+        if not policy.get("name", "").lower().startswith(policy_prefix.lower()):
+            continue
+        definition = json.loads(policy.get("definition") or "{}")
+        if definition.get(key) == {"type": "fixed", "value": path}:
+            continue
+        definition[key] = {"type": "fixed", "value": path}
+        workspaces_api.call("POST", "/api/2.0/policies/clusters/edit", {
+            "policy_id": policy.get("policy_id"),
+            "name": policy.get("name"),
+            "definition": json.dumps(definition)
+        })
+        edited.append(policy.get("name"))
+    return edited
+
+
+def mount_source(url: str) -> str:
+    """
+    The source of a DBFS mount of the storage at `url`, DBFS mounting S3 buckets through the s3a scheme.
+
+    >>> mount_source("s3://dbacademy-datasets-us-west-2/datasets/"), mount_source("abfss://datasets@dbacademy.dfs.core.windows.net/")
+    ('s3a://dbacademy-datasets-us-west-2/datasets/', 'abfss://datasets@dbacademy.dfs.core.windows.net/')
+    """
+    return "s3a://" + url[len("s3://"):] if url.startswith("s3://") else url
+
+
+def mount_shared_datasets(fs, url: str, *, mount_point: str = DATASETS_MOUNT_POINT, extra_configs: dict[str, str] = None) -> bool:
+    """
+    Exposes the fleet's datasets at `url` where the courseware reads them, i.e. dbfs:/mnt/dbacademy-datasets/, by
+    mounting the URL there with `fs`, i.e. dbutils.fs, along with any `extra_configs` its storage requires. Unlike the
+    volume, the mount is readable from any runtime, and only read only as far as the storage's permissions make it so.
+    A mount of another source is replaced; returns False if the URL was already mounted there.
+    """
+    source = mount_source(url).rstrip("/")
+    mount = next((m for m in fs.mounts() if m.mountPoint.rstrip("/") == mount_point), None)
+    if mount is not None and mount.source.rstrip("/") == source:
+        return False
+    if mount is not None:
+        fs.unmount(mount_point)
+    print(f"Mounting the shared datasets at {mount_point}.")
+    fs.mount(source=source, mount_point=mount_point, extra_configs=extra_configs or dict())
+    return True
+
+
+def root_credential_name(workspaces_api: SimpleRestClient) -> str:
+    """The name of the storage credential of the workspace's metastore root, as configured by bootstrap_metastore()."""
+    metastore_id = workspaces_api.call("GET", "/api/2.1/unity-catalog/current-metastore-assignment").get("metastore_id")
+    metastore = workspaces_api.call("GET", f"/api/2.1/unity-catalog/metastores/{metastore_id}")
+    credentials = workspaces_api.call("GET", "/api/2.1/unity-catalog/storage-credentials").get("storage_credentials", list())
+    return next(c.get("name") for c in credentials if c.get("id") == metastore.get("storage_root_credential_id"))
+
+
+def attach_shared_datasets(workspaces_api: SimpleRestClient, url: str, *,
+                           credential_name: str,
+                           read_only: bool = True,
+                           principal: str = "account users",
+                           location_name: str = LOCATION_NAME,
+                           catalog: str = CATALOG_NAME,
+                           schema: str = SCHEMA_NAME,
+                           volume: str = VOLUME_NAME,
+                           tracer: Tracer = None) -> str:
+    """
+    Exposes the fleet's datasets, installed once at `url`, to the workspace instead of copying them into it: the URL
+    is registered as an external location, read only unless specified otherwise, accessed with the storage
+    credential `credential_name`, e.g. that of the metastore's root, and mounted as an external volume that
+    `principal` may read. Returns the volume's path; see volume_path().
+
+    Only metadata is written, and only what is missing: the four securables are looked up concurrently, the missing
+    ones are created, the location and catalog together, and the grants are made with one PATCH per securable, so
+    that a new workspace costs a dozen calls and a configured one eight reads. They are recorded as a span by `tracer`,
+    the shared tracer unless specified.
+    """
+    schema_name = f"{catalog}.{schema}"
+    volume_name = f"{schema_name}.{volume}"
+    uc = "/api/2.1/unity-catalog"
+
+    with (tracer or tracing.tracer).span("shared-datasets", **{"datasets.url": url, "datasets.read_only": read_only}) as span, ThreadPoolExecutor(max_workers=4) as executor:
+        lookups = {path: executor.submit(workspaces_api.call, "GET", f"{uc}/{path}", _expected=(200, 404))
+                   for path in [f"external-locations/{location_name}", f"catalogs/{catalog}", f"schemas/{schema_name}", f"volumes/{volume_name}"]}
+        missing = {path.split("/")[0] for path, future in lookups.items() if future.result() is None}
+        span.set_attribute("datasets.created", sorted(missing))
+
+        ###############################################################################################
+        # Register the location and mount it as a volume
+        ###############################################################################################
+        creates = list()
+        if "external-locations" in missing:
+            print(f"Registering the shared datasets at {url}.")
+            creates.append(executor.submit(workspaces_api.call, "POST", f"{uc}/external-locations", {
+                "name": location_name,
+                "url": url,
+                "credential_name": credential_name,
+                "read_only": read_only,
+                "comment": "The datasets shared by every classroom workspace"
+            }))
+        if "catalogs" in missing:
+            creates.append(executor.submit(workspaces_api.call, "POST", f"{uc}/catalogs", {"name": catalog}))
+        for future in creates:
+            future.result()
+
+        if "schemas" in missing:
+            workspaces_api.call("POST", f"{uc}/schemas", {"catalog_name": catalog, "name": schema})
+        if "volumes" in missing:
+            workspaces_api.call("POST", f"{uc}/volumes", {
+                "catalog_name": catalog,
+                "schema_name": schema,
+                "name": volume,
+                "volume_type": "EXTERNAL",
+                "storage_location": url
+            })
+
+        ###############################################################################################
+        # Allow every user to read, but not write, the datasets
+        ###############################################################################################
+        apply_grants(workspaces_api, [
+            Grant("external_location", location_name, principal, ("READ FILES",)),
+            Grant("catalog", catalog, principal, ("USE CATALOG",)),
+            Grant("schema", schema_name, principal, ("USE SCHEMA",)),
+            Grant("volume", volume_name, principal, ("READ VOLUME",)),
+        ], lookup=len(missing) < 4, tracer=tracer)
+
+    return volume_path(catalog, schema, volume)
+
+
+def publish_datasets(workspaces_api: SimpleRestClient, spark, ls: Callable[[str], list], url: str,
+                     datasets: Optional[list[str]] = None, *,
+                     credential_name: str,
+                     repository: str = DATASETS_REPOSITORY,
+                     **options) -> dict:
+    """
+    Installs the datasets once for the whole fleet, from a workspace whose metastore may write to `url`: the location
+    is attached writable and the datasets are copied into its volume with install_datasets(). Returns the copy's
+    summary. Classroom workspaces then attach it read only with attach_shared_datasets().
+    """
+    root = attach_shared_datasets(workspaces_api, url, credential_name=credential_name, read_only=False, **options)
+    return install_datasets(spark, ls, datasets, repository=repository, root=root)
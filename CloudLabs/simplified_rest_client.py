@@ -1,9 +1,80 @@
-# Databricks notebook source
-from typing import Literal, Union, Container, Type, TypeVar, Any
-import base64, requests
+from contextlib import ExitStack, contextmanager
+from typing import Literal, Union, Container, Type, TypeVar, Any, Callable, Iterator
+import base64, requests, threading, time
+import tracing
+from tracing import Tracer, path_template
+from json_stream import iter_array_items
+
+
+class JsonStream:
+    """
+    Result type for :meth:`SimpleRestClient.call` that yields the members of a top-level array of the response, named
+    by `_stream_path` (e.g. "Resources" or "runs"), as they are parsed from the body rather than loading it whole.
+    """
+
+
+class _ResponseStream:
+    """
+    The members of a streamed response's array, parsed as its body is read. The bytes read are counted as they
+    arrive and `complete` is called with them once the stream is exhausted or closed, or the iterator is discarded,
+    before `call_scope` is closed, ending the call's span and in-flight count.
+    """
+
+    def __init__(self, response: requests.Response, stream_path: str, fields: list[str], members: dict, span: Any,
+                 complete: Callable[[int, int], None], call_scope: ExitStack):
+        self.response = response
+        self.span = span
+        self.complete = complete
+        self.call_scope = call_scope
+        self.received = [0]  # Not an attribute of the stream, which the parser must not reference to be discarded
+        self.items = iter_array_items(self._count(response.iter_content(chunk_size=64 * 1024), self.received), stream_path, fields, members)
+        self.closed = False
+
+    @staticmethod
+    def _count(chunks: Iterator[bytes], received: list[int]) -> Iterator[bytes]:
+        for chunk in chunks:
+            received[0] += len(chunk)
+            yield chunk
+
+    def __iter__(self) -> "_ResponseStream":
+        return self
+
+    def __next__(self) -> Any:
+        try:
+            return next(self.items)
+        except StopIteration:
+            self.close()
+            raise
+        except BaseException as e:
+            self.span.set_error(e)
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.items.close()
+            try:
+                wire_bytes_received = self.response.raw.tell()
+            except AttributeError:
+                wire_bytes_received = self.received[0]  # Not backed by urllib3, e.g. a mocked response
+            self.response.close()
+            self.complete(self.received[0], wire_bytes_received)
+        finally:
+            self.call_scope.close()
+
+    def __del__(self):
+        self.close()
+
+
 HttpMethod = Literal["GET", "PUT", "POST", "DELETE", "PATCH", "HEAD", "OPTIONS"]
 HttpStatusCodes = Union[int, Container[int]]
-HttpReturnType = TypeVar("HttpReturnType", bound=Union[dict, str, bytes, requests.Response, None])
+HttpReturnType = TypeVar("HttpReturnType", bound=Union[dict, str, bytes, requests.Response, Iterator[Any], None])
+
+# The encodings requests can decode; SCIM and list responses are mostly repeated keys and compress several fold.
+ACCEPT_ENCODING = "gzip, deflate"
 
 
 class DatabricksApiException(Exception):
@@ -51,12 +122,97 @@ class DatabricksApiException(Exception):
         return repr(self)
 
 
+class CallStats:
+    """
+    Thread-safe tally of REST calls by method and path template, along with the bytes sent and received.
+    Retried attempts are counted in `retries`, not as additional calls.
+
+    `bytes_received` is the size of the decoded response bodies and `wire_bytes_received` their size as transferred,
+    which is smaller when the response was compressed; `encodings` counts the responses by Content-Encoding.
+    """
+
+    def __init__(self):
+        from collections import Counter
+
+        self._lock = threading.Lock()
+        self.calls = Counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.wire_bytes_received = 0
+        self.retries = 0
+        self.encodings = Counter()
+
+    def record(self, method: str, route: str, bytes_sent: int, bytes_received: int, retries: int,
+               wire_bytes_received: int = None, content_encoding: str = "identity") -> None:
+        with self._lock:
+            self.calls[f"{method} {route}"] += 1
+            self.bytes_sent += bytes_sent
+            self.bytes_received += bytes_received
+            self.wire_bytes_received += bytes_received if wire_bytes_received is None else wire_bytes_received
+            self.retries += retries
+            self.encodings[content_encoding] += 1
+
+    @property
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls.clear()
+            self.bytes_sent = 0
+            self.bytes_received = 0
+            self.wire_bytes_received = 0
+            self.retries = 0
+            self.encodings.clear()
+
+    def summary(self) -> str:
+        lines = [f"{count:>6} {call}" for call, count in self.calls.most_common()]
+        lines.append(f"{self.total:>6} calls, {self.retries} retries, {self.bytes_sent} bytes sent, "
+                     f"{self.bytes_received} bytes received ({self.wire_bytes_received} on the wire)")
+        return "\n".join(lines)
+
+
+# Collectors installed by count_calls(), which receive the calls of every client in the process.
+_call_collectors: list[CallStats] = list()
+
+
+@contextmanager
+def count_calls() -> Iterator[CallStats]:
+    """
+    Counts the calls made by every SimpleRestClient in the process for the duration of the block, including clients
+    created inside the code being measured (e.g. by create_workspace).
+
+    >>> with count_calls() as stats:
+    ...     pass
+    >>> stats.total
+    0
+    """
+    stats = CallStats()
+    _call_collectors.append(stats)
+    try:
+        yield stats
+    finally:
+        _call_collectors.remove(stats)
+
+
+def assert_call_budget(stats: CallStats, budget: int, description: str = "The flow") -> None:
+    """
+    Test helper asserting that a flow stayed within its declared call budget, e.g. for a budget of
+    "30 + 1 per user": `assert_call_budget(stats, 30 + len(config.users), "create_workspace")`.
+    """
+    if stats.total > budget:
+        raise AssertionError(f"{description} made {stats.total} REST calls, exceeding its budget of {budget}:\n{stats.summary()}")
+
+
 class SimpleRestClient:
     """
     Simplified version of Databricks Edu's rest client, included here only for demonstration purposes.
+
+    A client may be shared by several threads (see client_registry.py); they share its connection pool, holding up to
+    `pool_maxsize` connections, and its backoff: after a 429 or REQUEST_LIMIT_EXCEEDED, every thread waits it out.
     """
 
-    def __init__(self, *, username=None, password=None, url=None, token=None):
+    def __init__(self, *, username=None, password=None, url=None, token=None, tracer: Tracer = None, pool_maxsize: int = 10):
         from requests.adapters import HTTPAdapter
 
         self.url = url
@@ -73,9 +229,9 @@ class SimpleRestClient:
             raise ValueError("Must specify either username/password or token")
 
         self.session = requests.Session()
-        self.session.headers = {'Authorization': self.authorization_header, 'Content-Type': 'text/json'}
+        self.session.headers = {'Authorization': self.authorization_header, 'Content-Type': 'text/json', 'Accept-Encoding': ACCEPT_ENCODING}
 
-        self.http_adapter = HTTPAdapter()
+        self.http_adapter = HTTPAdapter(pool_maxsize=pool_maxsize)
 
         # noinspection HttpUrlsUsage
         self.session.mount('http://', self.http_adapter)
@@ -85,6 +241,45 @@ class SimpleRestClient:
         self.connect_timeout = 5  # seconds
         self.retries = 20         # attempts
 
+        # Every call is recorded as a span; the shared tracer only writes when WORKSPACE_SETUP_TRACE_FILE is set.
+        self.tracer = tracer or tracing.tracer
+
+        # Every call is also counted here and by any collectors installed with count_calls().
+        self.stats = CallStats()
+
+        self.throttled_until = 0.0  # time.time() before which no thread sends a request
+        self._in_flight = 0
+        self._state = threading.Condition()
+
+    def close(self) -> None:
+        """Closes the pooled connections; calls made afterwards open new ones."""
+        self.session.close()
+
+    def drain(self, timeout_seconds: float = None) -> bool:
+        """Waits for the calls in progress on other threads to complete, returning False if `timeout_seconds` elapse first."""
+        with self._state:
+            return self._state.wait_for(lambda: self._in_flight == 0, timeout=timeout_seconds)
+
+    @contextmanager
+    def _track_in_flight(self) -> Iterator[None]:
+        with self._state:
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._state:
+                self._in_flight -= 1
+                self._state.notify_all()
+
+    def _wait_for_throttle(self) -> None:
+        delay = self.throttled_until - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _throttle(self, seconds: float) -> None:
+        with self._state:
+            self.throttled_until = max(self.throttled_until, time.time() + seconds)
+
     def call(self,
              _http_method: HttpMethod,
              _endpoint_path: str,
@@ -92,18 +287,41 @@ class SimpleRestClient:
              *,
              _expected: HttpStatusCodes = None,
              _result_type: Type[HttpReturnType] = dict,
+             _stream_path: str = None,
+             _fields: list[str] = None,
+             _stream_members: dict = None,
+             _attributes: list[str] = None,
+             _excluded_attributes: list[str] = None,
              _base_url: str = None, **data: Any) -> HttpReturnType:
+        """
+        With `_result_type=JsonStream`, returns an iterator over the members of the array `_stream_path`, each reduced
+        to `_fields` when specified (dotted names select nested fields, e.g. "members.value"); the response is held
+        open until the iterator is exhausted. The other members of the response that precede the array, e.g. SCIM's
+        "totalResults", are stored in `_stream_members` when specified.
 
-        import json, time, math
-        from urllib.parse import urljoin
+        `_attributes` and `_excluded_attributes` ask a SCIM endpoint to return only (or all but) the named attributes
+        of each resource, e.g. `_attributes=["id", "displayName", "members.value"]`.
+        """
+
+        import json, math
+        from urllib.parse import urljoin, urlparse
 
         if _data is None:
             _data = {}
 
+        stream = _result_type == JsonStream
+        if stream and _stream_path is None:
+            raise ValueError("_stream_path must be specified when _result_type is JsonStream.")
+
         if data:
             _data = _data.copy()
             _data.update(data)
 
+        if _attributes:
+            _data = {**_data, "attributes": ",".join(_attributes)}
+        if _excluded_attributes:
+            _data = {**_data, "excludedAttributes": ",".join(_excluded_attributes)}
+
         _base_url: str = urljoin(self.url, _base_url)
 
         self._verify_hostname(_base_url)
@@ -116,37 +334,71 @@ class SimpleRestClient:
         url = f"""{_base_url.rstrip("/")}/{_endpoint_path.lstrip("/")}"""
         timeout = (self.connect_timeout, self.read_timeout)
         connection_errors = 0
+        route = path_template(urlparse(url).path)
 
         response = None  # Precluding warning
 
-        for attempt in range(self.retries+1):
-            try:
-                if _http_method in ('GET', 'HEAD', 'OPTIONS'):
-                    params = {k: str(v).lower() if isinstance(v, bool) else v for k, v in _data.items()}
-                    response = self.session.request(_http_method, url, params=params, timeout=timeout)
-                else:
-                    json_data = json.dumps(_data)
-                    response = self.session.request(_http_method, url, data=json_data, timeout=timeout)
-
-                if response.status_code == 500:
-                    if "REQUEST_LIMIT_EXCEEDED" not in response.text:
-                        break  # Don't retry, this is a hard fail, not rate-limited
-                elif response.status_code not in [429]:
-                    break  # Don't retry, either we passed or it's a hard fail.
-
-            except requests.exceptions.ConnectionError as e:
-                connection_errors += 1
-                if connection_errors >= 2:
-                    raise e
-
-            # Attempt 1=1s, 2=1s, 3=5s, 4=16s, 5=13s, etc...
-            duration = math.ceil(attempt * attempt / 2)
-            time.sleep(duration)
-
-        if response is None:  # "None" should never happen
-            raise Exception("Unexpected processing error; the final response was None")
-        else:  # Always validate the final response
-            self._raise_for_status(response, _expected)
+        with ExitStack() as call_scope:
+            call_scope.enter_context(self._track_in_flight())
+            span = call_scope.enter_context(self.tracer.span(f"{_http_method} {route}", **{"http.method": _http_method, "http.route": route, "server.address": urlparse(url).hostname}))
+            bytes_sent = 0
+            bytes_received = 0
+            wire_bytes_received = 0
+            content_encoding = "identity"
+            for attempt in range(self.retries+1):
+                span.set_attribute("http.retries", attempt)
+                self._wait_for_throttle()
+                try:
+                    if _http_method in ('GET', 'HEAD', 'OPTIONS'):
+                        params = {k: str(v).lower() if isinstance(v, bool) else v for k, v in _data.items()}
+                        response = self.session.request(_http_method, url, params=params, timeout=timeout, stream=stream)
+                    else:
+                        json_data = json.dumps(_data)
+                        bytes_sent += len(json_data)
+                        response = self.session.request(_http_method, url, data=json_data, timeout=timeout, stream=stream)
+                    content_encoding = self._verify_content_encoding(response)
+                    if not (stream and 200 <= response.status_code < 300):
+                        # A streamed body is counted as it is read; see _ResponseStream
+                        bytes_received += len(response.content)
+                        wire_bytes_received += self._wire_size(response)
+
+                    if response.status_code == 500:
+                        if "REQUEST_LIMIT_EXCEEDED" not in response.text:
+                            break  # Don't retry, this is a hard fail, not rate-limited
+                    elif response.status_code not in [429]:
+                        break  # Don't retry, either we passed or it's a hard fail.
+
+                except requests.exceptions.ConnectionError as e:
+                    connection_errors += 1
+                    span.set_attribute("http.connection_errors", connection_errors)
+                    if connection_errors >= 2:
+                        raise e
+
+                # Attempt 1=1s, 2=1s, 3=5s, 4=16s, 5=13s, etc...
+                duration = math.ceil(attempt * attempt / 2)
+                self._throttle(duration)
+                self._wait_for_throttle()
+
+            def complete(body_bytes: int, wire_bytes: int) -> None:
+                span.set_attribute("http.request.body.size", bytes_sent)
+                span.set_attribute("http.response.body.size", wire_bytes)
+                span.set_attribute("http.response.body.uncompressed_size", body_bytes)
+                span.set_attribute("http.response.content_encoding", content_encoding)
+                if response is not None:
+                    span.set_attribute("http.status_code", response.status_code)
+
+                for stats in [self.stats, *_call_collectors]:
+                    stats.record(_http_method, route, bytes_sent, body_bytes, attempt, wire_bytes, content_encoding)
+
+            if response is None:  # "None" should never happen
+                complete(bytes_received, wire_bytes_received)
+                raise Exception("Unexpected processing error; the final response was None")
+            elif stream and 200 <= response.status_code < 300:
+                # The call, i.e. its span, in-flight count and stats, completes once the stream is exhausted or closed
+                return _ResponseStream(response, _stream_path, _fields, _stream_members, span, complete, call_scope.pop_all())
+            else:  # Always validate the final response
+                complete(bytes_received, wire_bytes_received)
+                self._raise_for_status(response, _expected)
 
         # TODO: Should we really return None on errors?  Kept for now for backwards compatibility.
         if not (200 <= response.status_code < 300):
@@ -169,6 +421,22 @@ class SimpleRestClient:
                 }
         # TODO @doug.bateman: missing else clause
 
+    @staticmethod
+    def _verify_content_encoding(response: requests.Response) -> str:
+        """Returns the response's Content-Encoding, raising if the server used one that was not offered in ACCEPT_ENCODING."""
+        encoding = response.headers.get("Content-Encoding", "identity").strip().lower() or "identity"
+        if encoding != "identity" and encoding not in [e.strip() for e in ACCEPT_ENCODING.split(",")]:
+            raise ValueError(f"""The server responded with Content-Encoding "{encoding}", expected one of "{ACCEPT_ENCODING}" for url: {response.url}""")
+        return encoding
+
+    @staticmethod
+    def _wire_size(response: requests.Response) -> int:
+        """The number of body bytes transferred for a response whose content has been read, before decompression."""
+        try:
+            return response.raw.tell()
+        except AttributeError:
+            return len(response.content)  # Not backed by urllib3, e.g. a mocked response
+
     @staticmethod
     def _verify_hostname(url: str) -> None:
         """Verify the host for the url-endpoint exists.  Throws socket.gaierror if it does not."""
@@ -0,0 +1,163 @@
+import glob, hashlib, json, os, re, secrets, threading, time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+
+class Span:
+    """A single timed operation; attributes may be added while the span is open."""
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: Optional[str], attributes: dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.attributes = dict(attributes)
+        self.status_code = "OK"
+        self.status_message = None
+        self.start_time_unix_nano = time.time_ns()
+        self.end_time_unix_nano = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, e: BaseException) -> None:
+        self.status_code = "ERROR"
+        self.status_message = f"{type(e).__name__}: {e}"
+
+    @property
+    def duration_seconds(self) -> float:
+        end = self.end_time_unix_nano or time.time_ns()
+        return (end - self.start_time_unix_nano) / 1e9
+
+    def to_dict(self, resource: dict[str, Any]) -> dict[str, Any]:
+        # Field names follow the OpenTelemetry span data model so the file can be loaded by OTLP-aware tooling.
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_time_unix_nano,
+            "end_time_unix_nano": self.end_time_unix_nano,
+            "duration_ms": round(self.duration_seconds * 1000, 3),
+            "attributes": self.attributes,
+            "status": {"code": self.status_code, "message": self.status_message},
+            "resource": resource,
+        }
+
+
+class Tracer:
+    """
+    Records nested spans to JSON-lines files, one finished span per line, so that the durations of setup stages and
+    REST calls can be aggregated across runs (e.g. latency histograms per endpoint).
+
+    Appends to a shared file are only atomic within a process, and not at all across the clusters of a job's tasks
+    writing through DBFS FUSE, so each tracer writes a file of its own next to `path`, named after the trace, its
+    stage and process, e.g. "traces-{trace_id}-install-datasets-1234-5f0e.jsonl"; read_spans() reads them all.
+
+    Tracing is disabled when no path is specified and the environment variable WORKSPACE_SETUP_TRACE_FILE is not set,
+    in which case spans are still timed but never written. Processes that record parts of the same operation, e.g. the
+    tasks of one job run, share a `trace_id` (see trace_id_for()).
+    """
+
+    ENV_TRACE_FILE = "WORKSPACE_SETUP_TRACE_FILE"
+
+    def __init__(self, path: str = None, service_name: str = "workspace-setup", trace_id: str = None, **resource_attributes: Any):
+        self.path = path or os.environ.get(self.ENV_TRACE_FILE)
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.resource = {"service.name": service_name, **resource_attributes}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self.file_path = None
+        if self.path:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            stem, extension = os.path.splitext(self.path)
+            task = re.sub(r"[^A-Za-z0-9_.-]", "_", str(self.resource.get("stage") or service_name))
+            self.file_path = f"{stem}-{self.trace_id}-{task}-{os.getpid()}-{secrets.token_hex(4)}{extension}"
+
+    @staticmethod
+    def trace_id_for(key: str) -> str:
+        """
+        A trace id derived from `key`, e.g. a job run id, so that separate processes record their spans in one trace.
+
+        >>> Tracer.trace_id_for("1234") == Tracer.trace_id_for("1234"), len(Tracer.trace_id_for("1234"))
+        (True, 32)
+        """
+        return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        stack = self._stack()
+        parent_span_id = stack[-1].span_id if stack else None
+        span = Span(name, self.trace_id, parent_span_id, attributes)
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            stack.remove(span)  # Not necessarily the last, e.g. a streamed call's span ends when its stream is consumed
+            span.end_time_unix_nano = time.time_ns()
+            self._export(span)
+
+    def _stack(self) -> list[Span]:
+        # Each thread nests its own spans; spans opened on worker threads are roots unless opened inside a span there.
+        if not hasattr(self._local, "stack"):
+            self._local.stack = list()
+        return self._local.stack
+
+    def _export(self, span: Span) -> None:
+        if not self.enabled:
+            return
+        line = json.dumps(span.to_dict(self.resource), default=str)
+        with self._lock:
+            with open(self.file_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+def read_spans(path: str, trace_id: str) -> list[dict[str, Any]]:
+    """The spans of one trace recorded by the tracers configured with `path`, in the order they finished."""
+    stem, extension = os.path.splitext(path)
+    spans = list()
+    for file_path in [path] + glob.glob(f"{glob.escape(stem)}-{trace_id}-*{extension}"):
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    span = json.loads(line)
+                    if span.get("trace_id") == trace_id:
+                        spans.append(span)
+    return sorted(spans, key=lambda s: s.get("end_time_unix_nano") or 0)
+
+
+# Path segments whose next segment is a resource name rather than a fixed part of the route.
+_NAMED_COLLECTIONS = {"storage-credentials", "external-locations", "catalogs", "schemas", "tables", "volumes", "shares", "recipients"}
+_ID_PATTERN = re.compile(r"^(\d+|[0-9a-fA-F-]{32,36}|[0-9a-fA-F]{12,}|\d{4}-\d{6}-[a-z0-9]+)$")
+
+
+def path_template(endpoint_path: str) -> str:
+    """
+    Reduces a concrete endpoint path to its route so that calls can be grouped by endpoint, e.g.
+    "/api/2.0/accounts/0a1b.../workspaces/1234" becomes "/api/2.0/accounts/{id}/workspaces/{id}".
+
+    >>> path_template("/api/2.1/unity-catalog/storage-credentials/classroom-001?x=1")
+    '/api/2.1/unity-catalog/storage-credentials/{name}'
+    """
+    segments = endpoint_path.split("?", 1)[0].split("/")
+    for i, segment in enumerate(segments):
+        if i > 0 and segments[i - 1] in _NAMED_COLLECTIONS and segment:
+            segments[i] = "{name}"
+        elif _ID_PATTERN.match(segment):
+            segments[i] = "{id}"
+    return "/".join(segments)
+
+
+# Shared by every client in this process; enabled by setting WORKSPACE_SETUP_TRACE_FILE.
+tracer = Tracer()
@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
+from simplified_rest_client import SimpleRestClient
+from tracing import tracer
+from uc_grants import Grant, apply_grants
+
+# Granted on the metastore to every account user, allowing the courseware to create its own resources
+METASTORE_PRIVILEGES = ["CREATE CATALOG", "CREATE EXTERNAL LOCATION", "CREATE SHARE", "CREATE RECIPIENT", "CREATE PROVIDER"]
+DELTA_SHARING_TOKEN_LIFETIME_SECONDS = 90 * 24 * 60 * 60  # 90 days
+
+
+def bootstrap_metastore(workspaces_api: SimpleRestClient, *,
+                        name: str,
+                        storage_root: str,
+                        region: str,
+                        owner: str,
+                        workspace_id: int,
+                        aws_iam_role_arn: str = None,
+                        msa_access_connector_id: str = None,
+                        principal: str = "account users") -> str:
+    """
+    Creates the workspace's metastore named `name` and brings it to the desired state, returning its id: owned by
+    `owner`, shared internally and externally, assigned to the workspace, rooted on the storage credential also named
+    `name`, and granting METASTORE_PRIVILEGES to `principal`.
+
+    Steps whose target is already in the desired state are skipped, so a rerun against a configured workspace only
+    reads. The steps that do not depend on each other run concurrently: the metastore and assignment lookups, and
+    once the metastore is assigned, the grants alongside the storage credential and the single PATCH of the
+    metastore's settings. The storage credential and the grants are addressed through the workspace's metastore,
+    which is why they wait for the assignment.
+    """
+    with tracer.span("uc-bootstrap", **{"uc.metastore.name": name}) as span, ThreadPoolExecutor(max_workers=2) as executor:
+        metastores_future = executor.submit(workspaces_api.call, "GET", "/api/2.1/unity-catalog/metastores")
+        assignment_future = executor.submit(workspaces_api.call, "GET", "/api/2.1/unity-catalog/current-metastore-assignment", _expected=(200, 404))
+        metastore = next((m for m in metastores_future.result().get("metastores", list()) if m.get("name") == name), None)
+        assignment = assignment_future.result() or dict()
+
+        ###############################################################################################
+        # Create the new metastore
+        ###############################################################################################
+        created = metastore is None
+        span.set_attribute("uc.metastore.created", created)
+        if created:
+            print(f"""Creating the metastore for {name}.""")
+            metastore = workspaces_api.call("POST", "/api/2.1/unity-catalog/metastores", {
+                "name": name,
+                "storage_root": storage_root,
+                "region": region
+            })
+        metastore_id = metastore.get("metastore_id")
+
+        ###############################################################################################
+        # Assign the metastore to the workspace
+        ###############################################################################################
+        if assignment.get("metastore_id") != metastore_id:
+            print(f"""Assigning the metastore to {name}.""")
+            workspaces_api.call("PUT", f"/api/2.1/unity-catalog/workspaces/{workspace_id}/metastore", {
+                "metastore_id": metastore_id,
+                "default_catalog_name": "main"
+            })
+
+        ###############################################################################################
+        # Configure the metastore's settings and grants
+        ###############################################################################################
+        settings_future = executor.submit(_configure_metastore, workspaces_api, metastore, created, owner, aws_iam_role_arn, msa_access_connector_id)
+        grants_future = executor.submit(_grant_privileges, workspaces_api, metastore_id, created, principal)
+        settings_future.result()
+        grants_future.result()
+
+    return metastore_id
+
+
+def _configure_metastore(workspaces_api: SimpleRestClient, metastore: dict, created: bool, owner: str, aws_iam_role_arn: str, msa_access_connector_id: str) -> None:
+    name = metastore.get("name")
+    metastore_id = metastore.get("metastore_id")
+
+    # A new metastore has no storage credentials yet, so there is nothing to look up
+    storage_credentials = None if created else workspaces_api.call("GET", f"/api/2.1/unity-catalog/storage-credentials/{name}", _expected=(200, 404))
+    if storage_credentials is None:
+        print(f"""Creating the metastore's storage credentials for {name}.""")
+        credentials_spec = {
+            "name": name,
+            "skip_validation": False,
+            "read_only": False,
+        }
+        if aws_iam_role_arn is not None:
+            credentials_spec["aws_iam_role"] = {
+                "role_arn": aws_iam_role_arn
+            }
+        if msa_access_connector_id is not None:
+            credentials_spec["azure_managed_identity"] = {
+                "access_connector_id": msa_access_connector_id
+            }
+        storage_credentials = workspaces_api.call("POST", "/api/2.1/unity-catalog/storage-credentials", credentials_spec)
+
+    # The ownership, sharing and storage credential settings in a single PATCH, limited to those not yet in place
+    settings = {
+        "owner": owner,
+        "delta_sharing_scope": "INTERNAL_AND_EXTERNAL",
+        "delta_sharing_recipient_token_lifetime_in_seconds": DELTA_SHARING_TOKEN_LIFETIME_SECONDS,
+        "delta_sharing_organization_name": name,
+        "storage_root_credential_id": storage_credentials.get("id"),
+    }
+    changes = {k: v for k, v in settings.items() if metastore.get(k) != v}
+    if changes:
+        print(f"""Configure the metastore for {name}.""")
+        workspaces_api.call("PATCH", f"/api/2.1/unity-catalog/metastores/{metastore_id}", changes)
+
+
+def _grant_privileges(workspaces_api: SimpleRestClient, metastore_id: str, created: bool, principal: str) -> None:
+    # A new metastore has no grants yet, so there is nothing to look up
+    apply_grants(workspaces_api, [Grant("metastore", metastore_id, principal, tuple(METASTORE_PRIVILEGES))], lookup=not created)
@@ -0,0 +1,144 @@
+import dataclasses, time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from simplified_rest_client import SimpleRestClient
+import tracing
+from tracing import Tracer
+
+# The securables whose grants the Unity Catalog permissions API manages, and how SQL names them
+REST_SECURABLE_TYPES = {
+    "metastore": "METASTORE",
+    "catalog": "CATALOG",
+    "schema": "SCHEMA",
+    "table": "TABLE",
+    "volume": "VOLUME",
+    "function": "FUNCTION",
+    "external_location": "EXTERNAL LOCATION",
+    "storage_credential": "STORAGE CREDENTIAL",
+    "share": "SHARE",
+}
+# Legacy securables, granted through SQL only
+SQL_SECURABLE_TYPES = {
+    "any_file": "ANY FILE",
+    "anonymous_function": "ANONYMOUS FUNCTION",
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class Grant:
+    """
+    Privileges on a securable for a principal, e.g. Grant("catalog", "main", "account users", ("USE CATALOG",)). The
+    full_name of a metastore is its id; that of ANY FILE or ANONYMOUS FUNCTION is the catalog whose context the grant
+    is made in, e.g. "hive_metastore", as these legacy grants are made per catalog.
+    """
+    securable_type: str
+    full_name: Optional[str]
+    principal: str
+    privileges: tuple[str, ...]
+
+    @property
+    def uses_rest(self) -> bool:
+        """Whether the permissions API can make the grant; grants on the hive_metastore's objects are legacy grants."""
+        in_hive_metastore = self.full_name is not None and self.full_name.split(".")[0] == "hive_metastore"
+        return self.securable_type in REST_SECURABLE_TYPES and not in_hive_metastore
+
+    def to_sql(self) -> str:
+        """
+        >>> Grant("any_file", "hive_metastore", "users", ("SELECT",)).to_sql()
+        'GRANT SELECT ON ANY FILE TO `users`'
+        >>> Grant("schema", "main.default", "account users", ("USE SCHEMA", "CREATE TABLE")).to_sql()
+        'GRANT USE SCHEMA, CREATE TABLE ON SCHEMA `main`.`default` TO `account users`'
+        """
+        privileges = ", ".join(self.privileges)
+        if self.securable_type in SQL_SECURABLE_TYPES:
+            return f"GRANT {privileges} ON {SQL_SECURABLE_TYPES[self.securable_type]} TO `{self.principal}`"
+        name = ".".join(f"`{part}`" for part in self.full_name.split("."))
+        return f"GRANT {privileges} ON {REST_SECURABLE_TYPES[self.securable_type]} {name} TO `{self.principal}`"
+
+
+def privilege_key(privilege: str) -> str:
+    # The API reports privileges as e.g. "CREATE_CATALOG" while grants may also be made as "CREATE CATALOG"
+    return privilege.replace(" ", "_").upper()
+
+
+def apply_grants(workspaces_api: SimpleRestClient, grants: list[Grant], *,
+                 sql: Callable[[str, Optional[str]], None] = None,
+                 lookup: bool = True,
+                 max_workers: int = 8,
+                 tracer: Tracer = None) -> dict[str, int]:
+    """
+    Makes the grants through the Unity Catalog permissions API, with a single PATCH per securable that adds the
+    privileges missing for every principal at once, and none for a securable whose grants are all in place. The
+    securables' current grants are read concurrently, unless `lookup` is False, e.g. for securables just created,
+    which have no grants yet.
+
+    Grants that the API cannot make, i.e. on legacy securables such as ANY FILE, are made by calling `sql` with the
+    grant's statement and the catalog to run it in, e.g. through a SQL warehouse; it is only called for those, and is
+    required only when there are any. Returns the number of PATCH requests and SQL statements made.
+
+    The grants are recorded as a span by `tracer`, the shared tracer unless specified.
+    """
+    rest_grants = [g for g in grants if g.uses_rest]
+    sql_grants = [g for g in grants if not g.uses_rest]
+    if sql_grants and sql is None:
+        raise ValueError(f"""The grants {[g.to_sql() for g in sql_grants]} can only be made through SQL, which was not specified.""")
+
+    with (tracer or tracing.tracer).span("uc-grants", **{"uc.grants.rest": len(rest_grants), "uc.grants.sql": len(sql_grants)}) as span:
+        securables: dict[tuple[str, str], dict[str, set[str]]] = defaultdict(lambda: defaultdict(set))
+        for grant in rest_grants:
+            securables[(grant.securable_type, grant.full_name)][grant.principal].update(grant.privileges)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            patches = sum(executor.map(lambda item: _update_securable(workspaces_api, *item[0], item[1], lookup), securables.items()))
+
+        for grant in sql_grants:
+            sql(grant.to_sql(), grant.full_name)
+
+        span.set_attribute("uc.grants.patches", patches)
+        return {"patches": patches, "statements": len(sql_grants)}
+
+
+def _update_securable(workspaces_api: SimpleRestClient, securable_type: str, full_name: str, wanted: dict[str, set[str]], lookup: bool) -> int:
+    path = f"/api/2.1/unity-catalog/permissions/{securable_type}/{full_name}"
+    granted = defaultdict(set)
+    if lookup:
+        for assignment in workspaces_api.call("GET", path).get("privilege_assignments", list()):
+            granted[assignment.get("principal")].update(privilege_key(p) for p in assignment.get("privileges", list()))
+
+    changes = list()
+    for principal, privileges in wanted.items():
+        missing = sorted(p for p in privileges if privilege_key(p) not in granted[principal])
+        if missing:
+            changes.append({"principal": principal, "add": missing})
+    if not changes:
+        return 0
+
+    print(f"""Granting {", ".join(c.get("principal") for c in changes)} privileges on the {securable_type} {full_name}.""")
+    workspaces_api.call("PATCH", path, {"changes": changes})
+    return 1
+
+
+def sql_statement_executor(workspaces_api: SimpleRestClient, warehouse_id: str, timeout_seconds: int = 10 * 60) -> Callable[[str, Optional[str]], None]:
+    """An `sql` for apply_grants() that runs each statement on the SQL warehouse through the Statement Execution API."""
+
+    def execute(statement: str, catalog: Optional[str]) -> None:
+        response = workspaces_api.call("POST", "/api/2.0/sql/statements", {
+            "statement": statement,
+            "warehouse_id": warehouse_id,
+            "catalog": catalog,
+            "schema": "default",
+            "wait_timeout": "50s"
+        })
+        deadline = time.time() + timeout_seconds
+        while response.get("status", dict()).get("state") in ["PENDING", "RUNNING"]:
+            if time.time() > deadline:
+                raise Exception(f"""The statement {response.get("statement_id")} did not complete within {timeout_seconds} seconds.""")
+            time.sleep(5)
+            response = workspaces_api.call("GET", f"""/api/2.0/sql/statements/{response.get("statement_id")}""")
+
+        status = response.get("status", dict())
+        if status.get("state") != "SUCCEEDED":
+            raise Exception(f"""The statement "{statement}" {status.get("state")}: {status.get("error", dict()).get("message")}""")
+
+    return execute
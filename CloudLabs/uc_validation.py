@@ -0,0 +1,121 @@
+import dataclasses
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from simplified_rest_client import SimpleRestClient
+import tracing
+from tracing import Tracer
+from uc_grants import privilege_key
+
+PASS = "PASS"
+FAIL = "FAIL"
+SKIP = "SKIP"
+
+
+@dataclasses.dataclass
+class CheckResult:
+    name: str
+    status: str
+    message: str
+
+
+@dataclasses.dataclass
+class UcValidation:
+    """The outcome of validate_unity_catalog(): one CheckResult per check, passing unless some check failed."""
+    workspace_url: str
+    metastore_id: Optional[str]
+    checks: list[CheckResult]
+
+    @property
+    def passed(self) -> bool:
+        return all(c.status != FAIL for c in self.checks)
+
+    def to_dict(self) -> dict:
+        return {"passed": self.passed, **dataclasses.asdict(self)}
+
+    def __str__(self) -> str:
+        lines = [f"""Unity Catalog validation of {self.workspace_url}: {PASS if self.passed else FAIL}"""]
+        lines.extend(f"| {c.status} {c.name}: {c.message}" for c in self.checks)
+        return "\n".join(lines)
+
+
+def validate_unity_catalog(workspaces_api: SimpleRestClient, *, principal: str = "account users", probe_storage: bool = False, tracer: Tracer = None) -> UcValidation:
+    """
+    Validates the workspace's Unity Catalog configuration from its metadata alone, i.e. without compute and without
+    writing to storage, checking what creating a catalog and a table in it would otherwise exercise: that a metastore
+    is assigned to the workspace, that it has a storage root and a storage credential for it, and that `principal` may
+    create catalogs. With `probe_storage`, the storage credential is also validated against the storage root, which
+    has Databricks read, write and delete a file there.
+
+    Checks that cannot run because one they depend on failed are reported as skipped. The validation is recorded as a
+    span by `tracer`, the shared tracer unless specified.
+    """
+    with (tracer or tracing.tracer).span("uc-validation", **{"uc.principal": principal}) as span:
+        checks = list()
+        assignment = workspaces_api.call("GET", "/api/2.1/unity-catalog/current-metastore-assignment", _expected=(200, 404)) or dict()
+        metastore_id = assignment.get("metastore_id")
+        if metastore_id is None:
+            checks.append(CheckResult("metastore-assignment", FAIL, "No metastore is assigned to the workspace."))
+            for name in ["storage-root-credential", "create-catalog"] + (["storage-probe"] if probe_storage else list()):
+                checks.append(CheckResult(name, SKIP, "No metastore is assigned to the workspace."))
+            span.set_attribute("uc.validation.passed", False)
+            return UcValidation(workspaces_api.url, None, checks)
+
+        checks.append(CheckResult("metastore-assignment", PASS, f"The metastore {metastore_id} is assigned to the workspace."))
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            metastore_future = executor.submit(workspaces_api.call, "GET", f"/api/2.1/unity-catalog/metastores/{metastore_id}")
+            credentials_future = executor.submit(workspaces_api.call, "GET", "/api/2.1/unity-catalog/storage-credentials")
+            permissions_future = executor.submit(workspaces_api.call, "GET", f"/api/2.1/unity-catalog/permissions/metastore/{metastore_id}")
+            metastore = metastore_future.result()
+            credentials = credentials_future.result().get("storage_credentials", list())
+            permissions = permissions_future.result()
+
+        ###############################################################################################
+        # Storage root and its credential
+        ###############################################################################################
+        storage_root = metastore.get("storage_root")
+        credential_id = metastore.get("storage_root_credential_id")
+        credential = next((c for c in credentials if c.get("id") == credential_id), None)
+        if not storage_root:
+            checks.append(CheckResult("storage-root-credential", FAIL, "The metastore has no storage root, so catalogs must each specify a managed location."))
+        elif credential is None:
+            checks.append(CheckResult("storage-root-credential", FAIL, f"The metastore's storage root {storage_root} has no storage credential."))
+        else:
+            checks.append(CheckResult("storage-root-credential", PASS, f"""The storage root {storage_root} is accessed with the storage credential {credential.get("name")}."""))
+
+        ###############################################################################################
+        # Permission to create catalogs
+        ###############################################################################################
+        granted = {privilege_key(p) for a in permissions.get("privilege_assignments", list()) if a.get("principal") == principal for p in a.get("privileges", list())}
+        if privilege_key("CREATE CATALOG") in granted or metastore.get("owner") == principal:
+            checks.append(CheckResult("create-catalog", PASS, f"{principal} may create catalogs."))
+        else:
+            checks.append(CheckResult("create-catalog", FAIL, f"{principal} is not granted CREATE CATALOG on the metastore."))
+
+        ###############################################################################################
+        # Storage probe
+        ###############################################################################################
+        if probe_storage:
+            if not storage_root or credential is None:
+                checks.append(CheckResult("storage-probe", SKIP, "The storage root or its credential is missing."))
+            else:
+                response = workspaces_api.call("POST", "/api/2.1/unity-catalog/validate-storage-credentials", {
+                    "storage_credential_name": credential.get("name"),
+                    "url": storage_root
+                })
+                failures = [r for r in response.get("results", list()) if r.get("result") == FAIL]
+                if failures:
+                    checks.append(CheckResult("storage-probe", FAIL, "; ".join(f"""{r.get("operation")}: {r.get("message")}""" for r in failures)))
+                else:
+                    checks.append(CheckResult("storage-probe", PASS, f"The storage credential may read, write and delete in {storage_root}."))
+
+        validation = UcValidation(workspaces_api.url, metastore_id, checks)
+        span.set_attribute("uc.validation.passed", validation.passed)
+        return validation
+
+
+def validate_fleet(workspaces: list[SimpleRestClient], max_workers: int = 8, **options) -> dict[str, UcValidation]:
+    """Validates the Unity Catalog configuration of many workspaces at once, keyed by workspace URL; see validate_unity_catalog()."""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        validations = executor.map(lambda w: validate_unity_catalog(w, **options), workspaces)
+        return {v.workspace_url: v for v in validations}
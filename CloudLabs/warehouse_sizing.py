@@ -0,0 +1,98 @@
+import dataclasses, math
+from typing import Optional
+
+# Serverless SQL warehouse sizes, smallest first, and the DBUs per hour of one cluster of each
+CLUSTER_SIZES = ["2X-Small", "X-Small", "Small", "Medium", "Large", "X-Large", "2X-Large", "3X-Large", "4X-Large"]
+CLUSTER_DBUS = {"2X-Small": 4, "X-Small": 6, "Small": 12, "Medium": 24, "Large": 40, "X-Large": 80, "2X-Large": 144, "3X-Large": 272, "4X-Large": 528}
+
+SPEEDUP_PER_SIZE = 1.6      # Each size doubles a cluster's compute but, for classroom queries, runs them about 1.6 times as fast
+QUERIES_PER_CLUSTER = 10    # Queries a cluster runs at once before queuing the next ones
+TARGET_UTILIZATION = 0.7    # Of the clusters' query slots, leaving room for bursts before queries queue
+MAX_NUM_CLUSTERS = 30
+
+
+@dataclasses.dataclass(frozen=True)
+class CourseLoad:
+    """The query load a single student puts on the class's warehouse."""
+    queries_per_student_minute: float   # While working through the course's exercises
+    query_seconds: float                # Mean run time of the course's queries on a 2X-Small cluster
+    peak_factor: float                  # Arrival rate at the start of a lab, when every student runs the same cells, over the average
+
+
+# Estimates rather than measurements, to be replaced by the calibrated_load that benchmark-warehouse.py reports when
+# replaying a recording of the course's queries; courses without a profile of their own use the default one.
+COURSE_LOADS = {
+    "data-analysis-with-databricks-sql": CourseLoad(queries_per_student_minute=2.0, query_seconds=4.0, peak_factor=3.0),
+    "data-engineering-with-databricks": CourseLoad(queries_per_student_minute=0.5, query_seconds=6.0, peak_factor=2.0),
+    "default": CourseLoad(queries_per_student_minute=0.5, query_seconds=3.0, peak_factor=2.0),
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class WarehouseSizing:
+    cluster_size: str
+    min_num_clusters: int
+    max_num_clusters: int
+    query_seconds: float    # Expected run time of a query, unqueued
+    dbus_per_hour: float    # At min_num_clusters
+
+    def to_spec(self) -> dict:
+        """The sizing as settings of the SQL warehouses API."""
+        return {"cluster_size": self.cluster_size, "min_num_clusters": self.min_num_clusters, "max_num_clusters": self.max_num_clusters}
+
+
+def course_load(course: Optional[str]) -> CourseLoad:
+    return COURSE_LOADS.get(course or "default", COURSE_LOADS.get("default"))
+
+
+def size_warehouse(student_count: int, course: str = None, *, target_query_seconds: float = 10.0, load: CourseLoad = None) -> WarehouseSizing:
+    """
+    The cheapest warehouse for `student_count` students of `course` whose queries run within `target_query_seconds`.
+
+    By Little's law, the queries in flight are the rate at which students run queries times how long a query runs.
+    A warehouse keeps its clusters' query slots below TARGET_UTILIZATION, so queries rarely queue, with enough
+    clusters for the average load at all times (min_num_clusters) and for the peak at the start of a lab when scaled
+    out (max_num_clusters). Larger clusters run each query faster, so they need fewer slots, but cost more: each size
+    is costed at its minimum number of clusters and the cheapest that meets the target is chosen.
+
+    >>> size_warehouse(250, "data-analysis-with-databricks-sql")
+    WarehouseSizing(cluster_size='X-Small', min_num_clusters=3, max_num_clusters=9, query_seconds=2.5, dbus_per_hour=18)
+    >>> size_warehouse(20).to_spec()
+    {'cluster_size': '2X-Small', 'min_num_clusters': 1, 'max_num_clusters': 1}
+    """
+    load = load or course_load(course)
+    queries_per_second = student_count * load.queries_per_student_minute / 60
+    best = None
+
+    for i, cluster_size in enumerate(CLUSTER_SIZES):
+        query_seconds = load.query_seconds / SPEEDUP_PER_SIZE ** i
+        if query_seconds > target_query_seconds:
+            continue
+
+        in_flight = queries_per_second * query_seconds
+        min_num_clusters = max(1, math.ceil(in_flight / (QUERIES_PER_CLUSTER * TARGET_UTILIZATION)))
+        max_num_clusters = max(min_num_clusters, math.ceil(in_flight * load.peak_factor / (QUERIES_PER_CLUSTER * TARGET_UTILIZATION)))
+        if max_num_clusters > MAX_NUM_CLUSTERS:
+            continue
+
+        sizing = WarehouseSizing(cluster_size, min_num_clusters, max_num_clusters, round(query_seconds, 3), CLUSTER_DBUS[cluster_size] * min_num_clusters)
+        if best is None or sizing.dbus_per_hour < best.dbus_per_hour:
+            best = sizing
+
+    if best is None:
+        raise ValueError(f"No warehouse runs the queries of {student_count} students of {course or 'the course'} within {target_query_seconds} seconds.")
+    return best
+
+
+def calibrate(load: CourseLoad, *, cluster_size: str, measured_query_seconds: float, queries_per_student_minute: float = None) -> CourseLoad:
+    """
+    The course's load with its query run time, and optionally its query rate, replaced by those measured on a
+    warehouse of `cluster_size`, e.g. by benchmark-warehouse.py.
+
+    >>> calibrate(COURSE_LOADS["default"], cluster_size="X-Small", measured_query_seconds=1.5).query_seconds
+    2.4
+    """
+    query_seconds = measured_query_seconds * SPEEDUP_PER_SIZE ** CLUSTER_SIZES.index(cluster_size)
+    return dataclasses.replace(load,
+                               query_seconds=round(query_seconds, 3),
+                               queries_per_student_minute=queries_per_student_minute or load.queries_per_student_minute)
@@ -0,0 +1,226 @@
+import dataclasses, importlib.util, math, os, sqlite3, tempfile, threading, time, uuid
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from typing import Iterator, Optional
+
+
+def _load_setup_script():
+    """cloudlabs-setup-script.py is not importable by name because of the hyphens in its file name."""
+    spec = importlib.util.spec_from_file_location("cloudlabs_setup_script", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cloudlabs-setup-script.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+setup_script = _load_setup_script()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pool_workspaces (pool TEXT, workspace_name TEXT, status TEXT, lab_id TEXT, updated_at REAL, PRIMARY KEY (pool, workspace_name));
+"""
+
+PROVISIONING = "PROVISIONING"
+READY = "READY"
+ASSIGNED = "ASSIGNED"
+REMOVING = "REMOVING"
+FAILED = "FAILED"
+
+
+def size_for_forecast(lab_starts_per_hour: float, refill_hours: float = 1.0, headroom: float = 0.25) -> int:
+    """
+    The pool size that covers the lab starts expected while a claimed workspace is being replaced, i.e. while a new
+    one is created and set up (about an hour), with `headroom` for bursts above the forecast.
+
+    >>> size_for_forecast(6, refill_hours=1.0, headroom=0.25)
+    8
+    """
+    return math.ceil(lab_starts_per_hour * refill_hours * (1 + headroom))
+
+
+class WorkspacePool:
+    """
+    Keeps `target_size` classroom workspaces fully set up ahead of demand, so that starting a lab only has to attach
+    its instructors, users and courseware to a warm workspace instead of waiting for create_workspace end to end.
+
+    Warm workspaces are created by create_workspace from `template`, without users or courseware and with their own
+    instructors group, which also owns their metastore. assign() claims the oldest warm workspace for a lab, attaches
+    the lab's users and courseware with assign_workspace, and refills the pool in the background; a workspace whose
+    assignment fails is marked FAILED rather than left ASSIGNED. When none is ready the lab falls back to
+    create_workspace. release() removes a lab's workspace once the lab is over. Set `target_size` from the demand
+    forecast, e.g. with size_for_forecast(), and call resize() as the forecast changes.
+
+    The pool's state is kept in SQLite under WORKSPACE_SETUP_CACHE_DIR, so that several processes can share a pool
+    and a restarted process resumes it; a workspace still PROVISIONING after `provisioning_timeout_seconds` is
+    presumed abandoned and no longer counts towards the pool.
+    """
+
+    ENV_CACHE_DIR = "WORKSPACE_SETUP_CACHE_DIR"
+
+    def __init__(self, template, *,
+                 name: str = "warm",
+                 target_size: int = 2,
+                 max_workers: int = 4,
+                 provisioning_timeout_seconds: int = 3 * 60 * 60,
+                 path: str = None):
+
+        cache_dir = os.environ.get(self.ENV_CACHE_DIR) or os.path.join(tempfile.gettempdir(), "workspace-setup-cache")
+        self.template = template
+        self.name = name
+        self.target_size = target_size
+        self.provisioning_timeout_seconds = provisioning_timeout_seconds
+        self.path = path or os.path.join(cache_dir, "workspace-pool.sqlite")
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"workspace-pool-{name}")
+        self.futures: list[Future] = list()
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    ###############################################################################################
+    # Pool management
+    ###############################################################################################
+    def refill(self) -> list[Future]:
+        """Starts creating the warm workspaces that the pool is short of, returning a future for each."""
+        with self._transaction() as db:
+            count = self._count_available(db)
+            names = [f"{self.name}-{uuid.uuid4().hex[:8]}" for _ in range(max(0, self.target_size - count))]
+            for workspace_name in names:
+                self._set_status(db, workspace_name, PROVISIONING)
+
+        futures = [self.executor.submit(self._provision, workspace_name) for workspace_name in names]
+        if futures:
+            print(f"""Refilling the workspace pool "{self.name}" with {len(futures)} workspaces.""")
+        self.futures = [f for f in self.futures if not f.done()] + futures
+        return futures
+
+    def resize(self, target_size: int) -> list[Future]:
+        """
+        Changes the number of warm workspaces kept, creating any now missing. Surplus warm workspaces are removed in
+        the background.
+        """
+        self.target_size = target_size
+        with self._transaction() as db:
+            surplus = self._count_available(db) - target_size
+            rows = db.execute("SELECT workspace_name FROM pool_workspaces WHERE pool = ? AND status = ? ORDER BY updated_at DESC LIMIT ?",
+                              (self.name, READY, max(0, surplus))).fetchall()
+            for (workspace_name,) in rows:
+                self._set_status(db, workspace_name, REMOVING)
+
+        futures = [self.executor.submit(self._remove, self._warm_config(workspace_name)) for (workspace_name,) in rows]
+        futures.extend(self.refill())
+        self.futures = [f for f in self.futures if not f.done()] + futures
+        return futures
+
+    def status(self) -> Counter:
+        with self._connect() as db:
+            return Counter({status: count for status, count in db.execute("SELECT status, COUNT(*) FROM pool_workspaces WHERE pool = ? GROUP BY status", (self.name,))})
+
+    def wait(self) -> None:
+        """Waits for the workspaces being created or removed in the background, re-raising the first failure."""
+        for future in list(self.futures):
+            future.result()
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.executor.shutdown(wait=wait)
+
+    ###############################################################################################
+    # Lab lifecycle
+    ###############################################################################################
+    def assign(self, lab_config):
+        """
+        Provides the lab described by `lab_config` with a workspace, returning the lab's configuration as applied: its
+        workspace_name and instructors_group_name are those of the warm workspace claimed, if any was ready.
+        """
+        workspace_name = self._claim(lab_config.lab_id)
+        if workspace_name is None:
+            print(f"""No warm workspace is ready in the pool "{self.name}", creating the workspace {lab_config.workspace_name}.""")
+            setup_script.create_workspace(lab_config)
+            self.refill()
+            return lab_config
+
+        print(f"""Assigning the warm workspace {workspace_name} to lab #{lab_config.lab_id}.""")
+        config = dataclasses.replace(lab_config, workspace_name=workspace_name, instructors_group_name=self._warm_config(workspace_name).instructors_group_name)
+        try:
+            setup_script.assign_workspace(config)
+        except BaseException:
+            # Not returned to the pool: some of the lab's users may already have been added to it
+            with self._transaction() as db:
+                self._set_status(db, workspace_name, FAILED, lab_id=str(lab_config.lab_id))
+            print(f"""Failed to assign the warm workspace {workspace_name} to lab #{lab_config.lab_id}; it is left in place for diagnosis.""")
+            raise
+        finally:
+            self.refill()
+        return config
+
+    def release(self, config) -> None:
+        """Removes the workspace of a lab that is over."""
+        self._remove(config)
+
+    ###############################################################################################
+    # Workers
+    ###############################################################################################
+    def _warm_config(self, workspace_name: str):
+        return dataclasses.replace(self.template,
+                                   workspace_name=workspace_name,
+                                   lab_description=f'Warm workspace of the pool "{self.name}"',
+                                   instructors=list(),
+                                   instructors_group_name=f"instructors-{workspace_name}",
+                                   users=list(),
+                                   courseware_urls=list())
+
+    def _provision(self, workspace_name: str) -> None:
+        try:
+            setup_script.create_workspace(self._warm_config(workspace_name))
+        except BaseException:
+            with self._transaction() as db:
+                self._set_status(db, workspace_name, FAILED)
+            print(f"""Failed to create the warm workspace {workspace_name}; it is left in place for diagnosis.""")
+            raise
+
+        with self._transaction() as db:
+            self._set_status(db, workspace_name, READY)
+
+    def _remove(self, config) -> None:
+        setup_script.remove_workspace(config)
+        with self._transaction() as db:
+            db.execute("DELETE FROM pool_workspaces WHERE pool = ? AND workspace_name = ?", (self.name, config.workspace_name))
+
+    ###############################################################################################
+    # State
+    ###############################################################################################
+    def _claim(self, lab_id) -> Optional[str]:
+        with self._transaction() as db:
+            row = db.execute("SELECT workspace_name FROM pool_workspaces WHERE pool = ? AND status = ? ORDER BY updated_at LIMIT 1", (self.name, READY)).fetchone()
+            if row is not None:
+                self._set_status(db, row[0], ASSIGNED, lab_id=str(lab_id))
+        return row[0] if row is not None else None
+
+    def _count_available(self, db: sqlite3.Connection) -> int:
+        # Ready workspaces, and those being created unless they have been at it for too long
+        return db.execute("SELECT COUNT(*) FROM pool_workspaces WHERE pool = ? AND (status = ? OR (status = ? AND updated_at > ?))",
+                          (self.name, READY, PROVISIONING, time.time() - self.provisioning_timeout_seconds)).fetchone()[0]
+
+    def _set_status(self, db: sqlite3.Connection, workspace_name: str, status: str, lab_id: str = None) -> None:
+        db.execute("INSERT OR REPLACE INTO pool_workspaces VALUES (?, ?, ?, ?, ?)", (self.name, workspace_name, status, lab_id, time.time()))
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            if not self._initialized:
+                if os.path.dirname(self.path):
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with closing(sqlite3.connect(self.path, timeout=60)) as db:
+                    db.executescript(_SCHEMA)
+                self._initialized = True
+        # Autocommit mode; transactions are begun explicitly by _transaction()
+        with closing(sqlite3.connect(self.path, timeout=60, isolation_level=None)) as db:
+            yield db
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")  # Serializes claims and refills across processes
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
@@ -17,47 +17,24 @@
 # COMMAND ----------
 
 # MAGIC %md
-# MAGIC ## Validate Libraries and Build PIP Command
-# MAGIC The following code works to ensure that the dbacademy library is reachable from this workspace and then define the pip command used to attach that library to the current cluster.
+# MAGIC ## Build PIP Command
+# MAGIC The following code defines the pip command used to attach the dbacademy library to the current cluster: none when the expected version is already attached, otherwise an install from the version-keyed cache of its wheels in DBFS, downloading it from GitHub only on a cache miss.
 
 # COMMAND ----------
 
-import requests
+import os, sys
+sys.path.append(os.path.abspath("CloudLabs" if os.path.isdir("CloudLabs") else "../CloudLabs"))
+
+from library_cache import dbacademy_pip_command
 
 version = spark.conf.get("dbacademy.library.version", "v3.0.68")
+# An alternative installation replaces the default one, which is then neither looked up nor downloaded
+pip_command = spark.conf.get("dbacademy.library.install", None)
 
-try:
-    from dbacademy import dbgems
-
-    installed_version = dbgems.lookup_current_module_version("dbacademy")
-    if installed_version == version:
-        pip_command = "list --quiet"  # Skipping pip install of pre-installed python library
-    else:
-        print(f"WARNING: The wrong version of dbacademy is attached to this cluster. Expected {version}, found {installed_version}.")
-        print(f"Installing the correct version.")
-        raise Exception("Forcing re-install")
-
-except Exception as e:
-    # The import fails if library is not attached to cluster
-    if not version.startswith("v"):
-        library_url = f"git+https://github.com/databricks-academy/dbacademy@{version}"
-    else:
-        library_url = f"https://github.com/databricks-academy/dbacademy/releases/download/{version}/dbacademy-{version[1:]}-py3-none-any.whl"
-
-    default_command = f"install --quiet --disable-pip-version-check {library_url}"
-    pip_command = spark.conf.get("dbacademy.library.install", default_command)
-
-    if pip_command != default_command:
-        print(f"WARNING: Using alternative library installation:\n| default: %pip {default_command}\n| current: %pip {pip_command}")
-    else:
-        # We are using the default libraries; next we need to verify that we can reach those libraries.
-        try:
-            site = "https://github.com/databricks-academy/dbacademy"
-            response = requests.get(site)
-            assert response.status_code == 200, f"Unable to access GitHub or PyPi resources (HTTP {response.status_code} for {site})."
-        except Exception as e:
-            if type(e) is AssertionError: raise e
-            raise AssertionError(f"Unable to access GitHub or PyPi resources ({site}).") from e
+if pip_command is None:
+    pip_command = dbacademy_pip_command(version)
+else:
+    print(f"WARNING: Using alternative library installation:\n| default: version {version}\n| current: %pip {pip_command}")
 
 # And print just for reference...
 print(pip_command)
@@ -1,6 +1,6 @@
 import os
+import sys
 import json
-import requests
 from dbacademy import common
 from dbacademy.dbrest import DBAcademyRestClient
 
@@ -16,7 +16,10 @@ endpoint = configs.get(f"dev-{cloud}").get("host")
 
 client = DBAcademyRestClient(token=token, endpoint=endpoint)
 
-job_def_text = requests.get("https://raw.githubusercontent.com/databricks-academy/workspace-setup/main/CloudLabs/dais-job-config.json").text
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "..", "CloudLabs"))
+from job_spec_loader import JobSpecLoader
+
+job_def_text = JobSpecLoader().load("https://raw.githubusercontent.com/databricks-academy/workspace-setup/main/CloudLabs/dais-job-config.json")
 
 job_def_text = job_def_text.replace("{{ODL-ID}}", "odl-id-123")
 job_def_text = job_def_text.replace("{{ODL-TITLE}}", "odl-title-some-random-course")
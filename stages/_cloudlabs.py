@@ -0,0 +1,14 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC # CloudLabs Modules
+# MAGIC Makes the shared helpers in **CloudLabs**, plain Python modules such as **simplified_rest_client.py** and **tracing.py**, importable by the setup notebook and each of its stages.
+# MAGIC
+# MAGIC Run it with **%run**, by **_dbacademy** before installing the library and by **_tracing** after, as **%pip** restarts Python.
+
+# COMMAND ----------
+
+import os, sys
+
+cloudlabs_path = os.path.abspath("CloudLabs" if os.path.isdir("CloudLabs") else "../CloudLabs")
+if cloudlabs_path not in sys.path:
+    sys.path.append(cloudlabs_path)
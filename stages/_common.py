@@ -0,0 +1,123 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC # Workspace Setup Parameters & Tracing
+# MAGIC Shared by the setup notebook and each of its stages, run with **%run** once the dbacademy library is installed.
+# MAGIC
+# MAGIC Defines the **client**, the parameters of the setup (e.g. **lab_id**, **node_type_id**, **datasets**) and the **tracer**.
+# MAGIC
+# MAGIC A stage names itself by defining **stage** before running this notebook.
+
+# COMMAND ----------
+
+# # Removes all widgets while testing
+# dbutils.widgets.removeAll()
+
+# COMMAND ----------
+
+from dbacademy import dbgems
+from dbacademy.common import Cloud
+from dbacademy.dbhelper import WorkspaceHelper
+from dbacademy.dbrest import DBAcademyRestClient
+
+# Used throughout for different operations
+client = DBAcademyRestClient(throttle_seconds=1)
+
+# Not a dbacademy parameter: the class's enrollment, from which the SQL warehouse is sized
+PARAM_STUDENT_COUNT = "student_count"
+
+# Nor these, of the stage install-datasets: how the datasets are installed, see that stage
+PARAM_DATASETS_INSTALL_MODE = "datasets_install_mode"
+PARAM_DATASETS_USAGE_FOLDER = "datasets_usage_folder"
+PARAM_SHARED_DATASETS_URL = "shared_datasets_url"
+
+
+def get_optional_parameter(name: str, default: str = None) -> str:
+    """A stage's own parameter, or `default` where it is not declared, blank, or a {{variable}} left unbound."""
+    value = (dbgems.get_parameter(name, None) or "").strip()
+    return default if value.lower() in ["", "none", "null"] or value.startswith("{{") else value
+
+try:
+    created_widgets=False
+    dbutils.widgets.get(WorkspaceHelper.PARAM_EVENT_ID)
+    dbutils.widgets.get(WorkspaceHelper.PARAM_EVENT_DESCRIPTION)
+    dbutils.widgets.get(WorkspaceHelper.PARAM_POOLS_NODE_TYPE_ID)
+    dbutils.widgets.get(WorkspaceHelper.PARAM_DEFAULT_SPARK_VERSION)
+    dbutils.widgets.get(WorkspaceHelper.PARAM_DATASETS)
+    dbutils.widgets.get(WorkspaceHelper.PARAM_COURSES)
+except:
+    created_widgets = False if dbgems.is_job() else True
+    
+    # lab_id is the name assigned to this event/class or alternatively its class number
+    dbutils.widgets.text(WorkspaceHelper.PARAM_EVENT_ID, "", "1. Class/Event/Lab ID (optional)")
+    dbutils.widgets.text(WorkspaceHelper.PARAM_EVENT_DESCRIPTION, "", "2. Event Description (optional)")
+    dbutils.widgets.text(WorkspaceHelper.PARAM_POOLS_NODE_TYPE_ID, "", "3. Pool's Node Type ID (required)")
+    dbutils.widgets.text(WorkspaceHelper.PARAM_DEFAULT_SPARK_VERSION, "", "4. Default Spark Versions (required)")
+    dbutils.widgets.text(WorkspaceHelper.PARAM_DATASETS, "", "5. Datasets (defaults to all)")
+    dbutils.widgets.text(WorkspaceHelper.PARAM_COURSES, "", "6. DBC URLs (defaults to none)")
+    dbutils.widgets.text(PARAM_STUDENT_COUNT, "", "7. Student Count (optional)")
+    dbutils.widgets.text(PARAM_DATASETS_INSTALL_MODE, "", "8. Datasets Install Mode (defaults to auto)")
+    dbutils.widgets.text(PARAM_DATASETS_USAGE_FOLDER, "", "9. Datasets Usage Folder (optional)")
+    dbutils.widgets.text(PARAM_SHARED_DATASETS_URL, "", "10. Shared Datasets URL (required when shared)")
+
+
+# COMMAND ----------
+
+if created_widgets:
+    # This has to exist in a different cell or the widgets won't be created.
+    raise Exception("Please fill out widgets at the top and then reexecute \"Run All\"")
+else:
+    # Start a timer so we can benchmark execution duration.
+    setup_start = dbgems.clock_start()
+    
+    lab_id = dbgems.get_parameter(WorkspaceHelper.PARAM_EVENT_ID, None)
+    print("Lab ID:        ", lab_id or "None")
+    
+    workspace_description = dbgems.get_parameter(WorkspaceHelper.PARAM_EVENT_DESCRIPTION, None)
+    print("Description:   ", workspace_description or "None")
+    
+    node_type_id = dbgems.get_parameter(WorkspaceHelper.PARAM_POOLS_NODE_TYPE_ID, None)
+    assert node_type_id is not None, f"The parameter \"Node Type ID\" must be specified."
+    print("Node Type ID:  ", node_type_id or "None")
+    
+    spark_version = dbgems.get_parameter(WorkspaceHelper.PARAM_DEFAULT_SPARK_VERSION, None)
+    assert spark_version is not None, f"The parameter \"Spark Version\" must be specified."
+    print("Spark Versions:", spark_version or "None")
+    
+    datasets = dbgems.get_parameter(WorkspaceHelper.PARAM_DATASETS, None)
+    datasets = None if datasets is None or datasets.lower().strip() in ["", "none", "null"] else datasets
+    print("Datasets:      ", datasets or "All ILT Datasets")
+        
+    courses = dbgems.get_parameter(WorkspaceHelper.PARAM_COURSES, None)
+    courses = None if courses is None or courses.lower().strip() in ["", "none", "null"] else courses
+    print("Courses:       ", courses or "None")
+
+    student_count = dbgems.get_parameter(PARAM_STUDENT_COUNT, None)
+    student_count = int(student_count) if student_count and student_count.strip().isdigit() else None
+    print("Student Count: ", student_count or "None")
+
+    workspace_name = WorkspaceHelper.get_workspace_name()
+    print("Workspace Name:", workspace_name)
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC
+# MAGIC ## Configure Tracing
+# MAGIC Each stage is recorded as a span in a JSON-lines file so that slow stages can be identified across runs; see **_tracing**.
+
+# COMMAND ----------
+
+# MAGIC %run ./_tracing
+
+# COMMAND ----------
+
+tracer = Tracer(path=trace_file,
+                service_name="universal-workspace-setup",
+                trace_id=trace_id,
+                stage=globals().get("stage"),
+                workspace_name=workspace_name,
+                lab_id=lab_id,
+                spark_version=spark_version,
+                node_type_id=node_type_id)
+print("Trace File:    ", tracer.file_path)
+print("Trace ID:      ", tracer.trace_id)
@@ -0,0 +1,24 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC # Install the dbacademy library
+# MAGIC Defines the **pip_command** installing the dbacademy library, shared by the setup notebook and each of its stages so that they all install the same version.
+# MAGIC
+# MAGIC Run it with **%run** and follow it with a cell running **%pip $pip_command**.
+# MAGIC
+# MAGIC The library is installed from a version-keyed cache of its wheels in DBFS, downloading it from GitHub only on a cache miss, and pip is skipped altogether when the version is already installed. Set the environment variable **WORKSPACE_SETUP_LIBRARY_CACHE_DIR** to relocate the cache, e.g. to a Volume.
+# MAGIC
+# MAGIC See also https://github.com/databricks-academy/dbacademy
+
+# COMMAND ----------
+
+# MAGIC %run ./_cloudlabs
+
+# COMMAND ----------
+
+from library_cache import dbacademy_pip_command
+
+version = "v4.0.7"
+pip_command = dbacademy_pip_command(version)
+
+# And print just for reference...
+print(pip_command)
@@ -0,0 +1,27 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC # Workspace Setup Tracing
+# MAGIC Shared by the setup notebook and each of its stages, run with **%run**; it does not need the dbacademy library.
+# MAGIC
+# MAGIC Defines **trace_file**, where the stages record their spans, and **trace_id**, the trace they share. The path defaults to **/dbfs/tmp/dbacademy/workspace-setup/traces.jsonl** and can be overridden with the environment variable **WORKSPACE_SETUP_TRACE_FILE**; each stage writes a JSON-lines file of its own next to it, e.g. **traces-{trace_id}-install-datasets-{pid}-{suffix}.jsonl**, as the stages may run at the same time on different clusters.
+# MAGIC
+# MAGIC The stages of one run of the Workspace-Setup job, each its own task, share a trace derived from the job's run id; when run from the setup notebook, they are passed its trace id instead.
+
+# COMMAND ----------
+
+# MAGIC %run ./_cloudlabs
+
+# COMMAND ----------
+
+import json, os
+
+from tracing import Tracer
+
+trace_file = os.environ.get(Tracer.ENV_TRACE_FILE, "/dbfs/tmp/dbacademy/workspace-setup/traces.jsonl")
+
+try:
+    trace_id = dbutils.widgets.get("trace_id") or None
+except:
+    context = json.loads(dbutils.notebook.entry_point.getDbutils().notebook().getContext().toJson())
+    job_run_id = context.get("tags", dict()).get("multitaskParentRunId")
+    trace_id = Tracer.trace_id_for(job_run_id) if job_run_id else None
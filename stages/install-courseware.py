@@ -0,0 +1,33 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC # Workspace Setup: Install Courses
+# MAGIC Pre-installs the specified courseware, expressed as a comma seperated list of courseware defintions; see **universal-workspace-setup** for their format.
+# MAGIC
+# MAGIC One of the stages of the Workspace-Setup job, each run as its own task (see **universal-workspace-setup-job-config.json**); the setup notebook **universal-workspace-setup** runs them all.
+
+# COMMAND ----------
+
+# MAGIC %run ./_dbacademy
+
+# COMMAND ----------
+
+# MAGIC %pip $pip_command
+
+# COMMAND ----------
+
+stage = "install-courseware"
+
+# COMMAND ----------
+
+# MAGIC %run ./_common
+
+# COMMAND ----------
+
+with tracer.span("uninstall-courseware"):
+    WorkspaceHelper.uninstall_courseware(client, courses, subdirectory=None)
+
+# COMMAND ----------
+
+# Only the count is recorded; courseware URLs carry CDS tokens.
+with tracer.span("install-courseware", course_count=len(courses.split(",")) if courses else 0):
+    WorkspaceHelper.install_courseware(client, courses, subdirectory=None)
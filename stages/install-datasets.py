@@ -0,0 +1,98 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC # Workspace Setup: Install Datasets
+# MAGIC If a specific dataset is not specified, all datasets will be installed, including the latest and latest-1 datasets to account for courses where-in two versions of the same course are being used in any given season of development.
+# MAGIC
+# MAGIC On a cluster with workers, the files are copied by the executors in parallel (see **CloudLabs/dataset_copy.py**), which is why the job runs this stage on a cluster of its own that autoscales with the copy; on a single node cluster, the driver copies them.
+# MAGIC
+# MAGIC Either way, files whose contents are identical, within and across dataset versions, are downloaded once and then copied locally. This saves downloads only: DBFS does not support hard links, so on DBFS every copy still takes up storage of its own.
+# MAGIC
+# MAGIC With **datasets_install_mode** set to **lazy**, only the datasets of the scheduled courses are installed, along with those that recent classes across the fleet used most, as published to **datasets_usage_folder**; any other dataset is installed the first time a course uses it, through **DatasetRegistry.dataset_path()** (see **CloudLabs/lazy_datasets.py**).
+# MAGIC
+# MAGIC With **datasets_install_mode** set to **shared**, nothing is copied: the datasets installed once for the whole fleet at **shared_datasets_url** are attached read only as the volume **/Volumes/dbacademy/datasets/shared** (see **CloudLabs/shared_datasets.py**), to which the stage **pools-and-policies** points the environment variable **DBACADEMY_DATASETS_PATH**. As the courseware of the pinned dbacademy library does not read that variable, the same URL is also mounted at **dbfs:/mnt/dbacademy-datasets/**, from which the courseware reads the datasets. Volumes need Databricks Runtime 13.3 LTS or later, so this mode requires a **default_spark_version** of at least 13.3.
+# MAGIC
+# MAGIC One of the stages of the Workspace-Setup job, each run as its own task (see **universal-workspace-setup-job-config.json**); the setup notebook **universal-workspace-setup** runs them all.
+
+# COMMAND ----------
+
+# MAGIC %run ./_dbacademy
+
+# COMMAND ----------
+
+# MAGIC %pip $pip_command
+
+# COMMAND ----------
+
+stage = "install-datasets"
+
+# COMMAND ----------
+
+# MAGIC %run ./_common
+
+# COMMAND ----------
+
+from client_registry import clients
+from dataset_copy import cluster_workers, install_datasets
+from lazy_datasets import DatasetRegistry, scheduled_datasets
+from preflight import parse_course_definition, split_parameter
+from shared_datasets import DATASETS_MOUNT_POINT, attach_shared_datasets, mount_shared_datasets, require_volumes_runtime, root_credential_name
+
+# On a cluster with workers, e.g. the job's Workspace-Setup-Datasets-Cluster, the copy is spread over the executors;
+# on a single node cluster, the driver copies every file. Set "datasets_install_mode" to override,
+# to "lazy" to install only the scheduled courses' datasets and those recent classes used most, or to "shared" to
+# attach the fleet's shared datasets at "shared_datasets_url" read only, without copying them.
+install_mode = get_optional_parameter(PARAM_DATASETS_INSTALL_MODE, "auto")
+
+# In lazy mode, the folder shared by the fleet's workspaces where each publishes its usage log, e.g. a DBFS mount or a
+# volume, from which the popular datasets are prefetched; without it, only this workspace's own usage is counted.
+usage_folder = get_optional_parameter(PARAM_DATASETS_USAGE_FOLDER)
+distributed = install_mode == "distributed" or (install_mode in ["auto", "lazy"] and cluster_workers(spark) > 0)
+
+with tracer.span("install-datasets", datasets=datasets or "all", distributed=distributed, install_mode=install_mode) as span:
+    if install_mode == "shared":
+        # Registered rather than copied: the datasets were installed once for the fleet with publish_datasets()
+        shared_datasets_url = get_optional_parameter(PARAM_SHARED_DATASETS_URL)
+        if shared_datasets_url is None:
+            raise ValueError("""The parameter "shared_datasets_url" must be specified when "datasets_install_mode" is "shared".""")
+        require_volumes_runtime(spark_version.split(","))  # The classroom's clusters are pointed at the volume
+
+        context = dbutils.notebook.entry_point.getDbutils().notebook().getContext()
+        workspaces_api = clients.get(url=context.apiUrl().get(), token=context.apiToken().get(), tracer=tracer)
+        shared_path = attach_shared_datasets(workspaces_api, shared_datasets_url, credential_name=root_credential_name(workspaces_api), tracer=tracer)
+        print(f"The shared datasets are available at {shared_path}")
+        span.set_attribute("datasets.shared_path", shared_path)
+
+        # And where the courseware reads them, as the library it pins ignores DBACADEMY_DATASETS_PATH
+        mounted = mount_shared_datasets(dbutils.fs, shared_datasets_url)
+        print(f"The shared datasets are {'now' if mounted else 'already'} mounted at {DATASETS_MOUNT_POINT}")
+
+    elif install_mode == "lazy":
+        registry = DatasetRegistry(dbutils.fs.ls, usage_folder=usage_folder)
+        registered = registry.register()
+        course_names = [parse_course_definition(c).get("course") for c in split_parameter(courses)]
+        scheduled = scheduled_datasets(split_parameter(datasets), course_names, registered)
+        eager = [d for d in scheduled if not registry.is_installed(d)]
+        print(f"""Installing the scheduled datasets: {", ".join(eager) or "None"}""")
+        if distributed and eager:
+            install_datasets(spark, dbutils.fs.ls, eager)
+            for dataset in eager:
+                registry.mark_installed(dataset)
+        else:
+            for dataset in eager:
+                registry.install(dataset)
+        prefetched = registry.prefetch()
+        print(f"""Prefetched the popular datasets: {", ".join(prefetched) or "None"}""")
+
+        # Recorded after prefetching, so that the fleet's usage, not this class's, decides what is prefetched
+        for dataset in scheduled:
+            registry.record_use(dataset, used_by=lab_id or workspace_name)
+        shared_usage = registry.share_usage(workspace_name)
+        print(f"Shared the usage log as {shared_usage or 'None'}")
+        span.set_attribute("datasets.eager", len(eager))
+        span.set_attribute("datasets.prefetched", len(prefetched))
+
+    else:
+        # From the driver on a single node cluster, the downloads deduplicated all the same
+        result = install_datasets(spark if distributed else None, dbutils.fs.ls, split_parameter(datasets))
+        for key, value in result.items():
+            span.set_attribute(f"datasets.{key}", value)
@@ -0,0 +1,73 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC # Workspace Setup: Instance Pool & Cluster Policies
+# MAGIC Creates the Instance Pool **DBAcademy** and the three class-specific cluster policies: **DBAcademy**, **DBAcademy Jobs** and **DBAcademy DLT**.
+# MAGIC
+# MAGIC With **datasets_install_mode** set to **shared**, the policies also fix the environment variable **DBACADEMY_DATASETS_PATH** of every cluster to the shared volume. The courseware of the pinned dbacademy library does not read it, and reads the datasets from their mount instead; see **install-datasets**.
+# MAGIC
+# MAGIC One of the stages of the Workspace-Setup job, each run as its own task (see **universal-workspace-setup-job-config.json**); the setup notebook **universal-workspace-setup** runs them all.
+
+# COMMAND ----------
+
+# MAGIC %run ./_dbacademy
+
+# COMMAND ----------
+
+# MAGIC %pip $pip_command
+
+# COMMAND ----------
+
+stage = "pools-and-policies"
+
+# COMMAND ----------
+
+# MAGIC %run ./_common
+
+# COMMAND ----------
+
+from dbacademy.dbhelper.clusters_helper_class import ClustersHelper
+
+with tracer.span("create-instance-pool"):
+    instance_pool_id = ClustersHelper.create_named_instance_pool(
+        client=client,
+        name=ClustersHelper.POOL_DEFAULT_NAME,
+        min_idle_instances=0,
+        idle_instance_autotermination_minutes=15,
+        lab_id=lab_id,
+        workspace_description=workspace_description,
+        workspace_name=workspace_name,
+        org_id=dbgems.get_org_id(),
+        node_type_id=node_type_id,
+        preloaded_spark_version=spark_version)
+
+# COMMAND ----------
+
+with tracer.span("create-cluster-policies"):
+    ClustersHelper.create_all_purpose_policy(client=client, 
+                                             instance_pool_id=instance_pool_id, 
+                                             spark_version=spark_version,
+                                             autotermination_minutes_max=180,
+                                             autotermination_minutes_default=120)
+
+    ClustersHelper.create_jobs_policy(client=client, 
+                                      instance_pool_id=instance_pool_id, 
+                                      spark_version=spark_version)
+
+    ClustersHelper.create_dlt_policy(client=client, 
+                                     lab_id=lab_id, 
+                                     workspace_description=workspace_description, 
+                                     workspace_name=workspace_name,
+                                     org_id=dbgems.get_org_id())
+
+# COMMAND ----------
+
+from client_registry import clients
+from shared_datasets import point_policies_at_datasets, volume_path
+
+# With the fleet's shared datasets (see install-datasets), the clusters are pointed at the volume
+if get_optional_parameter(PARAM_DATASETS_INSTALL_MODE) == "shared":
+    with tracer.span("point-policies-at-datasets"):
+        context = dbutils.notebook.entry_point.getDbutils().notebook().getContext()
+        workspaces_api = clients.get(url=context.apiUrl().get(), token=context.apiToken().get(), tracer=tracer)
+        edited = point_policies_at_datasets(workspaces_api, volume_path())
+        print(f"""Pointed the policies at {volume_path()}: {", ".join(edited) or "None"}""")
@@ -0,0 +1,59 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC # Workspace Setup: Preflight
+# MAGIC Checks every parameter of the setup in one pass before any other stage starts, so that a typo fails the job in seconds rather than hours into it:
+# MAGIC * The node type and Spark versions against those offered on the workspace's cloud, cached for a day in **/dbfs/tmp/dbacademy/workspace-setup/cache**.
+# MAGIC * The datasets against those in the datasets repository.
+# MAGIC * Each courseware definition for the course and CDS token it requires.
+# MAGIC
+# MAGIC One of the stages of the Workspace-Setup job (see **universal-workspace-setup-job-config.json**), on which every other stage depends. It does not need the dbacademy library and so does not install it.
+
+# COMMAND ----------
+
+stage = "preflight"
+
+# COMMAND ----------
+
+# MAGIC %run ./_tracing
+
+# COMMAND ----------
+
+from client_registry import clients
+from dataset_copy import DATASETS_REPOSITORY
+from preflight import ComputeCatalogCache, cloud_for_url, preflight
+
+# The widgets are those of WorkspaceHelper, whose parameter names are the job's parameter names
+def get_parameter(name: str):
+    try:
+        return dbutils.widgets.get(name) or None
+    except:
+        return None
+
+context = dbutils.notebook.entry_point.getDbutils().notebook().getContext()
+workspace_url = context.apiUrl().get()
+tracer = Tracer(path=trace_file, service_name="universal-workspace-setup", trace_id=trace_id, stage=stage)
+client = clients.get(url=workspace_url, token=context.apiToken().get(), tracer=tracer)
+cloud = cloud_for_url(workspace_url)
+
+print("Cloud:         ", cloud)
+print("Trace ID:      ", tracer.trace_id)
+
+# COMMAND ----------
+
+# The course name of each dataset is a folder of the datasets repository; if it cannot be listed, datasets are not checked
+try:
+    dataset_index = {f.name.rstrip("/") for f in dbutils.fs.ls(DATASETS_REPOSITORY)}
+except Exception as e:
+    print(f"WARNING: Unable to list the datasets repository, the datasets are not checked ({e}).")
+    dataset_index = None
+
+# COMMAND ----------
+
+with tracer.span("preflight"):
+    preflight(client, cloud,
+              node_type_id=get_parameter("pools_node_type_id"),
+              spark_versions=get_parameter("default_spark_version"),
+              datasets=get_parameter("datasets"),
+              courses=get_parameter("courses"),
+              dataset_index=dataset_index,
+              cache=ComputeCatalogCache("/dbfs/tmp/dbacademy/workspace-setup/cache"))
@@ -0,0 +1,32 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC # Workspace Setup: Complete
+# MAGIC Runs once every other stage of the Workspace-Setup job has succeeded, reporting how long each stage took.
+# MAGIC
+# MAGIC The stages run in parallel, so the setup takes as long as the longest of them rather than their sum. This stage does not need the dbacademy library and so does not install it.
+
+# COMMAND ----------
+
+# MAGIC %run ./_tracing
+
+# COMMAND ----------
+
+from tracing import read_spans
+
+print("Trace File:    ", trace_file)
+print("Trace ID:      ", trace_id)
+
+# COMMAND ----------
+
+# Only the top-level span of each stage, not the REST calls and other spans nested in them
+spans = [s for s in read_spans(trace_file, trace_id) if s.get("parent_span_id") is None] if trace_id else list()
+
+if not spans:
+    print("No stages were traced in this run.")
+else:
+    for span in sorted(spans, key=lambda s: s.get("start_time_unix_nano")):
+        print(f"""{span.get("resource", dict()).get("stage") or "-":<22} {span.get("name"):<24} {span.get("duration_ms") / 1000:8.1f} sec  {span.get("status", dict()).get("code")}""")
+
+    started = min(s.get("start_time_unix_nano") for s in spans)
+    ended = max(s.get("end_time_unix_nano") for s in spans)
+    print(f"""Setup completed in {(ended - started) / 1e9:,.1f} sec, {sum(s.get("duration_ms") for s in spans) / 1000:,.1f} sec across all stages""")
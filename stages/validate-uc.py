@@ -0,0 +1,47 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC # Workspace Setup: Validate UC Configuration
+# MAGIC Validates the workspace's Unity Catalog configuration through the Unity Catalog REST API, without compute and without writing to storage: that a metastore is assigned to the workspace, that its storage root has a storage credential and that **account users** may create catalogs.
+# MAGIC
+# MAGIC The parameter **uc_validation** (see the job's configuration) selects how far the validation goes:
+# MAGIC * **rest**, the default, only reads the metadata above.
+# MAGIC * **probe** also has the credential validation API read, write and delete a file in the storage root.
+# MAGIC * **spark** also probes the storage root, then creates a catalog and a table in that catalog, as classes do; if UC is not configured properly then this operation would be expected to fail.
+# MAGIC
+# MAGIC One of the stages of the Workspace-Setup job, each run as its own task (see **universal-workspace-setup-job-config.json**); the setup notebook **universal-workspace-setup** runs them all. It does not need the dbacademy library and so does not install it.
+
+# COMMAND ----------
+
+stage = "validate-uc"
+
+# COMMAND ----------
+
+# MAGIC %run ./_tracing
+
+# COMMAND ----------
+
+from client_registry import clients
+from uc_validation import validate_unity_catalog
+
+try:
+    uc_validation = dbutils.widgets.get("uc_validation") or "rest"
+except:
+    uc_validation = "rest"
+
+context = dbutils.notebook.entry_point.getDbutils().notebook().getContext()
+tracer = Tracer(path=trace_file, service_name="universal-workspace-setup", trace_id=trace_id, stage=stage)
+client = clients.get(url=context.apiUrl().get(), token=context.apiToken().get(), tracer=tracer)
+
+# COMMAND ----------
+
+with tracer.span("validate-uc", uc_validation=uc_validation):
+    validation = validate_unity_catalog(client, probe_storage=uc_validation in ["probe", "spark"], tracer=tracer)
+    print(validation)
+    if not validation.passed:
+        raise Exception("Unity Catalog is not configured properly.")
+
+    if uc_validation == "spark":
+        spark.sql("CREATE CATALOG IF NOT EXISTS WORKSPACE_SETUP")
+        spark.sql("CREATE TABLE IF NOT EXISTS WORKSPACE_SETUP.default.test AS SELECT true AS test_passed")
+        assert spark.table("WORKSPACE_SETUP.default.test").first().test_passed
+        spark.sql("DROP CATALOG WORKSPACE_SETUP CASCADE")
@@ -0,0 +1,72 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC # Workspace Setup: SQL Warehouse & Grants
+# MAGIC Creates the shared **DBAcademy Warehouse**, sized for the class when its **student_count** is specified (see **CloudLabs/warehouse_sizing.py**), for use in Databricks SQL exercises and updates the workspace-specific grants in the **main** and **hive_metastore** catalogs, which is required for the DAWD class. Grants are made through the Unity Catalog permissions API, using the warehouse only for legacy grants that have no API, such as those on **ANY FILE**.
+# MAGIC
+# MAGIC One of the stages of the Workspace-Setup job, each run as its own task (see **universal-workspace-setup-job-config.json**); the setup notebook **universal-workspace-setup** runs them all.
+
+# COMMAND ----------
+
+# MAGIC %run ./_dbacademy
+
+# COMMAND ----------
+
+# MAGIC %pip $pip_command
+
+# COMMAND ----------
+
+stage = "warehouse-and-grants"
+
+# COMMAND ----------
+
+# MAGIC %run ./_common
+
+# COMMAND ----------
+
+from dbacademy.dbhelper.warehouses_helper_class import WarehousesHelper
+from client_registry import clients
+from preflight import parse_course_definition, split_parameter
+from warehouse_sizing import size_warehouse
+
+context = dbutils.notebook.entry_point.getDbutils().notebook().getContext()
+workspaces_api = clients.get(url=context.apiUrl().get(), token=context.apiToken().get(), tracer=tracer)
+
+# Sized for the class's enrollment when the student count is known, by the query load of its first course
+if student_count:
+    course = next((parse_course_definition(c).get("course") for c in split_parameter(courses)), None)
+    sizing = size_warehouse(student_count, course)
+    print(f"Sizing the warehouse for {student_count} students of {course or 'an unknown course'}: {sizing}")
+else:
+    sizing = None
+
+with tracer.span("create-sql-warehouse", **(sizing.to_spec() if sizing else dict())):
+    # Remove the existing Starter Warehouse
+    client.sql.endpoints.delete_by_name("Starter Warehouse")
+    client.sql.endpoints.delete_by_name("Serverless Starter Warehouse")
+
+    # Create the new DBAcademy Warehouse
+    warehouse_id = WarehousesHelper.create_sql_warehouse(client=client,
+                                                         name=WarehousesHelper.WAREHOUSES_DEFAULT_NAME,
+                                                         auto_stop_mins=None,
+                                                         min_num_clusters=sizing.min_num_clusters if sizing else 1,
+                                                         max_num_clusters=sizing.max_num_clusters if sizing else 20,
+                                                         enable_serverless_compute=True)
+    if sizing:
+        # WarehousesHelper always creates a 2X-Small warehouse; an edit replaces the warehouse's settings as a whole
+        warehouse = workspaces_api.call("GET", f"/api/2.0/sql/warehouses/{warehouse_id}")
+        settings = ["name", "auto_stop_mins", "enable_photon", "enable_serverless_compute", "warehouse_type", "spot_instance_policy", "channel", "tags"]
+        workspaces_api.call("POST", f"/api/2.0/sql/warehouses/{warehouse_id}/edit", {**{k: warehouse.get(k) for k in settings if k in warehouse}, **sizing.to_spec()})
+
+# COMMAND ----------
+
+from uc_grants import Grant, apply_grants
+
+# Grants on Unity Catalog securables are made through its permissions API; only legacy grants, such as those on ANY
+# FILE here, are made through SQL on the warehouse.
+with tracer.span("configure-permissions"):
+    def execute_sql(statement: str, catalog: str) -> None:
+        endpoint = client.sql.endpoints.get_by_name(WarehousesHelper.WAREHOUSES_DEFAULT_NAME)
+        client.sql.statements.execute(warehouse_id=endpoint.get("id"), catalog=catalog, schema="default", statement=statement)
+
+    grants = [Grant("any_file", catalog, "users", ("SELECT",)) for catalog in ["main", "hive_metastore"]]
+    apply_grants(workspaces_api, grants, sql=execute_sql, tracer=tracer)
@@ -0,0 +1,47 @@
+import contextlib, importlib.util, io, os, sys
+import pytest
+
+# The CloudLabs scripts import one another by module name, as they do when run from their folder
+CLOUDLABS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "CloudLabs")
+sys.path.insert(0, CLOUDLABS_DIR)
+
+from client_registry import clients
+from mock_databricks_server import MockDatabricksServer
+
+
+def load_script(file_name: str, module_name: str):
+    """The CloudLabs scripts are not importable by name because of the hyphens in their file names."""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(CLOUDLABS_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """An empty WORKSPACE_SETUP_CACHE_DIR, with the compute catalog cache moved into it."""
+    import preflight
+
+    monkeypatch.setenv("WORKSPACE_SETUP_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(preflight, "catalog_cache", preflight.ComputeCatalogCache(str(tmp_path)))
+    return tmp_path
+
+
+@pytest.fixture
+def server():
+    with MockDatabricksServer(seed=42) as server:
+        yield server
+    clients.close()  # The server, and with it every pooled connection, goes away with the test
+
+
+@pytest.fixture
+def workspace(server, cache_dir, monkeypatch):
+    """A client of the workspace "classroom-001", provisioned by create_workspace and so with its metastore assigned."""
+    from scim_directory_cache import ScimDirectoryCache
+
+    benchmark = load_script("benchmark-provisioning.py", "benchmark_provisioning")
+    monkeypatch.setattr(benchmark.setup_script, "directory_cache", ScimDirectoryCache(str(cache_dir / "scim-directory.sqlite")))
+    config = benchmark.make_config(server, 1, 2)
+    with contextlib.redirect_stdout(io.StringIO()):  # The setup script is chatty
+        benchmark.setup_script.create_workspace(config)
+    return clients.get(url=server.workspace_url(config.workspace_name), token="mock")
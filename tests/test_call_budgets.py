@@ -0,0 +1,37 @@
+import contextlib, io
+import pytest
+from conftest import load_script
+from scim_directory_cache import ScimDirectoryCache
+from simplified_rest_client import assert_call_budget, count_calls
+
+benchmark = load_script("benchmark-provisioning.py", "benchmark_provisioning")
+
+
+@pytest.mark.parametrize("user_count", [1, 10])
+def test_flows_stay_within_their_call_budgets(server, cache_dir, monkeypatch, user_count):
+    monkeypatch.setattr(benchmark.setup_script, "directory_cache", ScimDirectoryCache(str(cache_dir / "scim-directory.sqlite")))
+    configs = [benchmark.make_config(server, i, user_count) for i in range(1, 3)]
+    flows = {
+        "provisioning": benchmark.setup_script.create_workspace,
+        "shared-datasets": lambda c: benchmark.attach_datasets(server, c),
+        "audit": lambda c: benchmark.audit_workspace(server, c),
+        "teardown": benchmark.setup_script.remove_workspace,
+    }
+    assert flows.keys() == benchmark.CALL_BUDGETS.keys()
+
+    for flow, function in flows.items():  # In order: each flow works on the workspaces of the one before
+        for config in configs:
+            with count_calls() as stats, contextlib.redirect_stdout(io.StringIO()):
+                function(config)
+            assert_call_budget(stats, benchmark.CALL_BUDGETS[flow](config), f"The {flow} flow of {config.workspace_name}")
+
+
+def test_fails_flows_exceeding_their_call_budgets(server):
+    client = benchmark.clients.get(url=server.url, token="mock")
+    with count_calls() as stats:
+        client.call("GET", "/api/2.0/clusters/list")
+        client.call("GET", "/api/2.0/clusters/list")
+
+    assert_call_budget(stats, 2)
+    with pytest.raises(AssertionError, match="made 2 REST calls, exceeding its budget of 1"):
+        assert_call_budget(stats, 1)
@@ -0,0 +1,25 @@
+import contextlib, io
+from conftest import load_script
+
+cluster_policies = load_script("cluster-policies.py", "cluster_policies")
+
+
+def test_lowers_the_idle_instances_after_each_wave(server, monkeypatch):
+    pool_id = server.add_instance_pool("DBAcademy", "i3.xlarge", max_capacity=2)
+    targets = list()
+    set_min_idle_instances = cluster_policies.set_min_idle_instances
+
+    def recorded_set_min_idle_instances(client, pool, min_idle_instances):
+        targets.append(min_idle_instances)
+        set_min_idle_instances(client, pool, min_idle_instances)
+
+    monkeypatch.setattr(cluster_policies, "set_min_idle_instances", recorded_set_min_idle_instances)
+
+    configs = [{**cluster_policies.cluster_config, "workspaceUrl": server.url, "workspaceToken": "mock", "clusterName": f"Lab-Cluster-{i}",
+                "clusterPolicy": None} for i in range(5)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        deployed = list(cluster_policies.deploy_class_clusters(configs, wave_interval_seconds=0))
+
+    assert len(deployed) == 5
+    assert targets == [1, 0]  # After the waves of 2, 2 and 1 clusters; the pool was raised to its capacity of 2
+    assert server.workspaces["default"].instance_pools[pool_id]["min_idle_instances"] == 0
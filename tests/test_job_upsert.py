@@ -0,0 +1,46 @@
+from job_upsert import SPEC_HASH_TAG, hash_job_spec, upsert_and_run, upsert_job
+from simplified_rest_client import SimpleRestClient
+
+JOB_SPEC = {
+    "name": "DBAcademy Workspace-Setup",
+    "tasks": [{"task_key": "preflight", "notebook_task": {"notebook_path": "stages/preflight", "source": "GIT"}}],
+}
+
+
+def test_hash_ignores_key_order_and_hash_tag():
+    tagged = {**JOB_SPEC, "tags": {"dbacademy.course": "example-course"}}
+    read_back = {"tags": {SPEC_HASH_TAG: hash_job_spec(tagged), "dbacademy.course": "example-course"}, "tasks": JOB_SPEC.get("tasks"), "name": JOB_SPEC.get("name")}
+    assert hash_job_spec(read_back) == hash_job_spec(tagged)
+
+
+def test_creates_then_resets_only_changed_jobs(server):
+    client = SimpleRestClient(url=server.url, token="mock")
+
+    job_id, changed = upsert_job(client, JOB_SPEC)
+    assert changed
+    assert upsert_job(client, JOB_SPEC) == (job_id, False)
+
+    updated = {**JOB_SPEC, "timeout_seconds": 10800}
+    assert upsert_job(client, updated) == (job_id, True)
+    assert server.workspaces["default"].jobs[job_id]["settings"]["timeout_seconds"] == 10800
+    assert server.requests[("POST", "/api/2.1/jobs/create")] == 1
+    assert server.requests[("POST", "/api/2.1/jobs/reset")] == 1
+
+
+def test_attaches_to_the_active_run_of_an_unchanged_job(server):
+    client = SimpleRestClient(url=server.url, token="mock")
+
+    run_id = upsert_and_run(client, JOB_SPEC)
+    assert upsert_and_run(client, JOB_SPEC) == run_id
+    assert server.requests[("POST", "/api/2.1/jobs/run-now")] == 1
+
+
+def test_runs_a_changed_job_once_the_active_run_completes(server):
+    client = SimpleRestClient(url=server.url, token="mock")
+
+    run_id = upsert_and_run(client, JOB_SPEC)
+    new_run_id = upsert_and_run(client, {**JOB_SPEC, "timeout_seconds": 10800})
+
+    assert new_run_id != run_id
+    assert server.workspaces["default"].runs[run_id]["state"]["life_cycle_state"] == "TERMINATED"
+    assert server.requests[("POST", "/api/2.1/jobs/run-now")] == 2
@@ -0,0 +1,32 @@
+import json
+import pytest
+from json_stream import iter_array_items
+
+BODY = json.dumps({
+    "totalResults": 4,
+    "Resources": [
+        {"id": "1", "userName": "élève@databricks.com", "score": -12.5e-3},
+        {"id": "2", "active": True, "groups": [], "manager": None},
+        1234567890,
+        "]},\"",
+    ],
+    "startIndex": 1,
+}, ensure_ascii=False).encode("utf-8")
+
+
+@pytest.mark.parametrize("split", range(1, len(BODY)))
+def test_parses_members_split_across_chunks(split):
+    members = dict()
+    items = list(iter_array_items([BODY[:split], BODY[split:]], "Resources", members=members))
+    assert items == json.loads(BODY).get("Resources")
+    assert members == {"totalResults": 4}
+
+
+def test_parses_byte_by_byte():
+    chunks = [BODY[i:i + 1] for i in range(len(BODY))]
+    assert list(iter_array_items(chunks, "Resources[*]", ["id"])) == [{"id": "1"}, {"id": "2"}, 1234567890, "]},\""]
+
+
+def test_yields_nothing_without_the_array():
+    assert list(iter_array_items([b'{"has_more": false}'], "jobs")) == list()
+    assert list(iter_array_items([b'{"jobs": null}'], "jobs")) == list()
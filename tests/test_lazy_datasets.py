@@ -0,0 +1,20 @@
+import os
+from lazy_datasets import DatasetRegistry
+
+
+def test_records_each_writers_uses_in_a_file_of_its_own(tmp_path):
+    root, usage_folder = f"{tmp_path}/datasets/", str(tmp_path / "usage")
+    clusters = [DatasetRegistry(os.listdir, root=root, usage_folder=usage_folder) for _ in range(2)]  # e.g. two clusters of a workspace
+
+    clusters[0].record_use("example-course", used_by="class-1")
+    clusters[1].record_use("example-course", used_by="class-2")
+    clusters[1].record_use("ml-in-production", used_by="class-2")
+
+    assert len(os.listdir(tmp_path / "datasets" / DatasetRegistry.USAGE_FOLDER)) == 2
+    assert clusters[0].popular() == ["example-course", "ml-in-production"]
+
+    # Published as one file per workspace, whose uses are not counted twice
+    shared = clusters[0].share_usage("classroom-001")
+    assert os.listdir(usage_folder) == [os.path.basename(shared)]
+    assert DatasetRegistry(os.listdir, root=f"{tmp_path}/other/", usage_folder=usage_folder).popular() == ["example-course", "ml-in-production"]
+    assert clusters[0].popular() == ["example-course", "ml-in-production"]
@@ -0,0 +1,35 @@
+import pytest
+from conftest import load_script
+from mock_databricks_server import MockDatabricksServer
+from simplified_rest_client import DatabricksApiException, SimpleRestClient, count_calls
+
+
+def test_retries_rate_limited_calls():
+    with MockDatabricksServer(rate_limit_probability=0.3, request_limit_exceeded_probability=0.1, seed=7) as server:
+        client = SimpleRestClient(url=server.url, token="mock")
+        with count_calls() as stats:
+            for _ in range(10):
+                assert client.call("GET", "/api/2.0/clusters/list") == {"clusters": []}
+        client.close()
+
+    # Retried attempts are requests to the server, but not additional calls
+    assert stats.total == 10
+    assert stats.retries > 0
+    assert server.request_count == stats.total + stats.retries
+
+
+def test_does_not_retry_hard_failures(server):
+    client = SimpleRestClient(url=server.url, token="mock")
+    with pytest.raises(DatabricksApiException):
+        client.call("GET", "/api/2.1/jobs/get", job_id=1)
+    assert client.stats.retries == 0
+    assert server.request_count == 1
+
+
+def test_benchmark_stays_within_budgets(tmp_path, capsys):
+    benchmark = load_script("benchmark-provisioning.py", "benchmark_provisioning")
+    output = tmp_path / "bench.json"
+
+    assert benchmark.main(["--scales", "1,3", "--users", "2", "--output", str(output)]) == 0
+    assert benchmark.main(["--scales", "1,3", "--users", "2", "--baseline", str(output)]) == 0
+    assert "REGRESSION" not in capsys.readouterr().out
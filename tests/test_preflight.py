@@ -0,0 +1,53 @@
+import contextlib, dataclasses, io
+import pytest
+from conftest import load_script
+from preflight import ComputeCatalogCache, find_problems
+from simplified_rest_client import SimpleRestClient
+
+benchmark = load_script("benchmark-provisioning.py", "benchmark_provisioning")
+
+
+def test_reports_every_problem_at_once(server, cache_dir):
+    client = SimpleRestClient(url=server.url, token="mock")
+    problems = find_problems(client, "AWS",
+                             node_type_id="i3.huge",
+                             spark_versions="11.3.x-scala2.12, 9.1.x-scala2.12",
+                             datasets="example-course, missing-course",
+                             courses="course=example-course&token=abc, version=v1.0.0&token=abc, course=ml-in-production",
+                             dataset_index={"example-course"},
+                             cache=ComputeCatalogCache(str(cache_dir)))
+
+    assert problems == [
+        'The node type "i3.huge" is not offered on AWS.',
+        'The Spark version "9.1.x-scala2.12" is not offered on AWS.',
+        'The dataset "missing-course" does not exist.',
+        "The courseware definition #2 does not specify the course.",
+        "The courseware definition #3 (ml-in-production) does not specify the CDS token.",
+    ]
+
+
+def test_refreshes_the_cached_catalog_on_a_miss(server, cache_dir):
+    client = SimpleRestClient(url=server.url, token="mock")
+    server.reset_counters()
+
+    assert find_problems(client, "AWS", node_type_id="i3.xlarge", spark_versions="11.3.x-scala2.12", cache=ComputeCatalogCache(str(cache_dir))) == list()
+    assert server.request_count == 2  # The node types and Spark versions
+
+    # Read from the cache by another process
+    assert find_problems(client, "AWS", node_type_id="i3.xlarge", spark_versions="11.3.x-scala2.12", cache=ComputeCatalogCache(str(cache_dir))) == list()
+    assert server.request_count == 2
+
+    assert len(find_problems(client, "AWS", node_type_id="i3.huge", spark_versions="11.3.x-scala2.12", cache=ComputeCatalogCache(str(cache_dir)))) == 1
+    assert server.request_count == 4  # Refreshed once before giving up
+
+
+def test_validates_before_changing_a_workspace(server, workspace):
+    invalid = dict(default_node_type_id="i3.huge")
+    with pytest.raises(ValueError, match='The node type "i3.huge" is not offered on AWS.'), contextlib.redirect_stdout(io.StringIO()):
+        benchmark.setup_script.create_workspace(dataclasses.replace(benchmark.make_config(server, 2, 2), **invalid))
+    assert "classroom-002" not in server.workspaces  # Validated through classroom-001
+
+    user_count = len(server.workspaces["classroom-001"].users)
+    with pytest.raises(ValueError, match='The node type "i3.huge" is not offered on AWS.'), contextlib.redirect_stdout(io.StringIO()):
+        benchmark.setup_script.assign_workspace(dataclasses.replace(benchmark.make_config(server, 1, 5), **invalid))
+    assert len(server.workspaces["classroom-001"].users) == user_count
@@ -0,0 +1,39 @@
+from mock_databricks_server import MockDatabricksServer
+from scim_directory import WORKSPACE_SCIM_PATH, ScimDirectory, list_resources
+from simplified_rest_client import SimpleRestClient
+
+
+def add_users(client: SimpleRestClient, first: int, last: int) -> list[dict]:
+    return [client.call("POST", f"{WORKSPACE_SCIM_PATH}/Users", {"userName": f"class+{i:03d}@databricks.com"}) for i in range(first, last + 1)]
+
+
+def test_indexes_users_and_groups(server):
+    client = SimpleRestClient(url=server.url, token="mock")
+    users = add_users(client, 1, 3)
+    server.reset_counters()
+
+    directory = ScimDirectory(client, WORKSPACE_SCIM_PATH).load()
+    assert len(directory) == 3
+    assert directory.user("class+002@databricks.com").id == users[1].get("id")
+    assert directory.user_by_id(users[2].get("id")).user_name == "class+003@databricks.com"
+    assert all(directory.is_member("users", u.get("id")) for u in users)  # New workspace users join "users"
+    assert server.request_count == 2  # A page of groups and one of users
+
+    directory.add_group({"id": "10", "displayName": "instructors", "members": list()})  # e.g. as the group was created
+    directory.add_member("instructors", users[0].get("id"))
+    assert directory.is_member("instructors", users[0].get("id"))
+    assert not directory.is_member("instructors", users[1].get("id"))
+    assert server.request_count == 2  # Kept current without listing again
+
+
+def test_pages_until_total_results():
+    with MockDatabricksServer(scim_max_count=100) as server:
+        client = SimpleRestClient(url=server.url, token="mock")
+        add_users(client, 1, 250)
+        server.reset_counters()
+
+        users = list(list_resources(client, WORKSPACE_SCIM_PATH, "Users", ["userName"], page_size=1000))
+        client.close()
+
+    assert len({u.get("id") for u in users}) == 250
+    assert server.request_count == 3  # Pages of 100, 100 and 50, not a fourth, empty, page
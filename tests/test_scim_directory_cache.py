@@ -0,0 +1,60 @@
+from scim_directory import WORKSPACE_SCIM_PATH
+from scim_directory_cache import ScimDirectoryCache
+from simplified_rest_client import SimpleRestClient
+
+
+def add_users(client: SimpleRestClient, first: int, last: int) -> None:
+    for i in range(first, last + 1):
+        client.call("POST", f"{WORKSPACE_SCIM_PATH}/Users", {"userName": f"class+{i:03d}@databricks.com"})
+
+
+def user_names(cache: ScimDirectoryCache, client: SimpleRestClient) -> list[str]:
+    return sorted(u.get("userName") for u in cache.users(client, WORKSPACE_SCIM_PATH))
+
+
+def test_refreshes_incrementally(server, tmp_path, monkeypatch):
+    client = SimpleRestClient(url=server.url, token="mock")
+    cache = ScimDirectoryCache(str(tmp_path / "scim-directory.sqlite"), max_staleness_seconds=0)
+    listings = list()
+    list_resources = cache._list
+
+    def recorded_list(*args, **params):
+        resources = list(list_resources(*args, **params))
+        listings.append((params, resources))
+        return iter(resources)
+
+    monkeypatch.setattr(cache, "_list", recorded_list)
+
+    add_users(client, 1, 5)
+    assert len(user_names(cache, client)) == 5
+    assert listings[-1][0] == dict()  # The first refresh is in full
+
+    add_users(client, 6, 7)
+    assert user_names(cache, client) == [f"class+{i:03d}@databricks.com" for i in range(1, 8)]
+    params, resources = listings[-1]
+    assert params.get("filter").startswith("meta.lastModified ge ")
+    assert 2 <= len(resources) < 7  # Only those modified since the last refresh, and those modified at the same time
+
+    # A deletion made elsewhere is only seen by the next full refresh
+    deleted = next(u for u in server.workspaces["default"].users.values() if u.get("userName") == "class+001@databricks.com")
+    del server.workspaces["default"].users[deleted.get("id")]
+    assert len(user_names(cache, client)) == 7
+    cache.refresh(client, WORKSPACE_SCIM_PATH, "Users", force_full=True)
+    assert "class+001@databricks.com" not in user_names(cache, client)
+
+
+def test_reads_fresh_directories_locally(server, tmp_path):
+    client = SimpleRestClient(url=server.url, token="mock")
+    add_users(client, 1, 3)
+    cache = ScimDirectoryCache(str(tmp_path / "scim-directory.sqlite"), max_staleness_seconds=60)
+
+    server.reset_counters()
+    for _ in range(3):
+        assert len(user_names(cache, client)) == 3
+    assert server.request_count == 1
+
+    # Our own changes are written through, so that they are seen without a refresh
+    user = client.call("POST", f"{WORKSPACE_SCIM_PATH}/Users", {"userName": "instructor@databricks.com"})
+    cache.record_user(client, WORKSPACE_SCIM_PATH, user)
+    assert "instructor@databricks.com" in user_names(cache, client)
+    assert server.request_count == 2
@@ -0,0 +1,78 @@
+import json
+from types import SimpleNamespace
+from shared_datasets import DATASETS_MOUNT_POINT, attach_shared_datasets, mount_shared_datasets, point_policies_at_datasets, root_credential_name, volume_path
+from simplified_rest_client import SimpleRestClient
+from tracing import Tracer, read_spans
+
+URL = "s3://dbacademy-datasets-us-west-2/datasets/"
+
+
+class MountingFileSystem:
+    """Records the mounts made through it, as dbutils.fs does."""
+
+    def __init__(self, **mounts: str):
+        self._mounts = dict(mounts)
+        self.changes = list()
+
+    def mounts(self):
+        return [SimpleNamespace(mountPoint=m, source=s) for m, s in self._mounts.items()]
+
+    def mount(self, source: str, mount_point: str, extra_configs: dict) -> None:
+        self._mounts[mount_point] = source
+        self.changes.append(("mount", mount_point))
+
+    def unmount(self, mount_point: str) -> None:
+        del self._mounts[mount_point]
+        self.changes.append(("unmount", mount_point))
+
+
+def test_attaches_the_datasets_once(server, workspace, tmp_path):
+    tracer = Tracer(path=str(tmp_path / "traces.jsonl"))
+    credential_name = root_credential_name(workspace)
+
+    server.reset_counters()
+    assert attach_shared_datasets(workspace, URL, credential_name=credential_name, tracer=tracer) == volume_path()
+    assert server.request_count == 12
+
+    location = workspace.call("GET", "/api/2.1/unity-catalog/external-locations/dbacademy-datasets")
+    assert (location.get("url"), location.get("read_only")) == (URL, True)
+    assert workspace.call("GET", "/api/2.1/unity-catalog/permissions/volume/dbacademy.datasets.shared").get("privilege_assignments") == [
+        {"principal": "account users", "privileges": ["READ VOLUME"]}
+    ]
+
+    # Configured already, it is only read
+    server.reset_counters()
+    attach_shared_datasets(workspace, URL, credential_name=credential_name, tracer=tracer)
+    assert server.request_count == 8
+
+    spans = read_spans(tracer.path, tracer.trace_id)
+    assert [s.get("name") for s in spans if s.get("parent_span_id") is None] == ["shared-datasets", "shared-datasets"]
+    assert [s.get("attributes").get("datasets.created") for s in spans if s.get("name") == "shared-datasets"] == [
+        ["catalogs", "external-locations", "schemas", "volumes"], []
+    ]
+
+
+def test_mounts_the_datasets_where_the_courseware_reads_them():
+    fs = MountingFileSystem()
+    assert mount_shared_datasets(fs, URL)
+    assert mount_shared_datasets(fs, URL) is False
+    assert fs.changes == [("mount", DATASETS_MOUNT_POINT)]
+    assert DATASETS_MOUNT_POINT == "/mnt/dbacademy-datasets"
+
+    # Mounted from elsewhere, e.g. the datasets repository, the mount is replaced
+    fs = MountingFileSystem(**{DATASETS_MOUNT_POINT: "wasbs://courseware@dbacademy.blob.core.windows.net"})
+    assert mount_shared_datasets(fs, URL)
+    assert fs.changes == [("unmount", DATASETS_MOUNT_POINT), ("mount", DATASETS_MOUNT_POINT)]
+    assert fs.mounts()[0].source == "s3a://dbacademy-datasets-us-west-2/datasets"
+
+
+def test_points_the_policies_at_the_datasets(server):
+    client = SimpleRestClient(url=server.url, token="mock")
+    for name in ["DBAcademy", "DBAcademy Jobs", "Other"]:
+        server.add_cluster_policy(name)
+
+    assert point_policies_at_datasets(client, volume_path()) == ["DBAcademy", "DBAcademy Jobs"]
+    assert point_policies_at_datasets(client, volume_path()) == list()
+
+    policy = next(p for p in server.workspaces["default"].policies.values() if p.get("name") == "DBAcademy")
+    assert json.loads(policy.get("definition")) == {"spark_env_vars.DBACADEMY_DATASETS_PATH": {"type": "fixed", "value": "/Volumes/dbacademy/datasets/shared/"}}
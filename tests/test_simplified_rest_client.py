@@ -0,0 +1,39 @@
+from simplified_rest_client import JsonStream, SimpleRestClient
+
+USERS_PATH = "/api/2.0/preview/scim/v2/Users"
+
+
+def add_users(client: SimpleRestClient, count: int) -> None:
+    for i in range(count):
+        client.call("POST", USERS_PATH, {"userName": f"class+{i:03d}@databricks.com"})
+
+
+def test_streams_listings(server):
+    client = SimpleRestClient(url=server.url, token="mock")
+    add_users(client, 250)
+    client.stats.reset()
+    server.reset_counters()
+
+    members = dict()
+    users = client.call("GET", USERS_PATH, _result_type=JsonStream, _stream_path="Resources", _stream_members=members, _attributes=["userName"])
+    assert client.stats.total == 0  # The call completes once the stream is consumed
+    user_names = [u.get("userName") for u in users]
+
+    assert len(user_names) == 250
+    assert members.get("totalResults") == 250
+    assert client.stats.total == 1
+    assert client.stats.bytes_received > client.stats.wire_bytes_received == server.bytes_sent  # Gzipped on the wire
+    assert client.drain(timeout_seconds=1)
+
+
+def test_releases_abandoned_streams(server):
+    client = SimpleRestClient(url=server.url, token="mock")
+    add_users(client, 10)
+    client.stats.reset()
+
+    users = client.call("GET", USERS_PATH, _result_type=JsonStream, _stream_path="Resources")
+    next(users)
+    del users
+
+    assert client.drain(timeout_seconds=1)
+    assert client.stats.total == 1
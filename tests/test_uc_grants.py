@@ -0,0 +1,55 @@
+import pytest
+from uc_grants import Grant, apply_grants, sql_statement_executor
+
+UC = "/api/2.1/unity-catalog"
+
+
+@pytest.fixture
+def catalog(workspace):
+    workspace.call("POST", f"{UC}/catalogs", {"name": "dbacademy"})
+    workspace.call("POST", f"{UC}/schemas", {"catalog_name": "dbacademy", "name": "datasets"})
+    return "dbacademy"
+
+
+def test_patches_each_securable_once(server, workspace, catalog):
+    grants = [
+        Grant("catalog", catalog, "account users", ("USE CATALOG",)),
+        Grant("catalog", catalog, "instructors", ("USE CATALOG", "CREATE SCHEMA")),
+        Grant("schema", f"{catalog}.datasets", "account users", ("USE SCHEMA", "SELECT")),
+    ]
+    server.reset_counters()
+    assert apply_grants(workspace, grants) == {"patches": 2, "statements": 0}
+    assert server.request_count == 4  # A lookup and a PATCH per securable
+
+    assert workspace.call("GET", f"{UC}/permissions/catalog/{catalog}").get("privilege_assignments") == [
+        {"principal": "account users", "privileges": ["USE CATALOG"]},
+        {"principal": "instructors", "privileges": ["CREATE SCHEMA", "USE CATALOG"]},
+    ]
+
+    # Once in place, the grants are only looked up
+    server.reset_counters()
+    assert apply_grants(workspace, grants) == {"patches": 0, "statements": 0}
+    assert server.request_count == 2
+
+
+def test_skips_the_lookups_of_new_securables(server, workspace, catalog):
+    server.reset_counters()
+    apply_grants(workspace, [Grant("catalog", catalog, "account users", ("USE CATALOG",))], lookup=False)
+    assert server.request_count == 1
+
+
+def test_makes_legacy_grants_through_sql(server, workspace, catalog):
+    grants = [Grant("catalog", catalog, "account users", ("USE CATALOG",))] + [Grant("any_file", c, "users", ("SELECT",)) for c in ["main", "hive_metastore"]]
+    with pytest.raises(ValueError, match="can only be made through SQL"):
+        apply_grants(workspace, grants)
+
+    statements = list()
+    assert apply_grants(workspace, grants, sql=lambda statement, catalog_name: statements.append((statement, catalog_name))) == {"patches": 1, "statements": 2}
+    assert statements == [("GRANT SELECT ON ANY FILE TO `users`", "main"), ("GRANT SELECT ON ANY FILE TO `users`", "hive_metastore")]
+
+
+def test_executes_statements_on_a_warehouse(server, workspace):
+    warehouse_id = workspace.call("POST", "/api/2.0/sql/warehouses", {"name": "DBAcademy Warehouse"}).get("id")
+    server.reset_counters()
+    apply_grants(workspace, [Grant("any_file", "hive_metastore", "users", ("SELECT",))], sql=sql_statement_executor(workspace, warehouse_id))
+    assert server.requests.get(("POST", "/api/2.0/sql/statements")) == 1
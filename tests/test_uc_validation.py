@@ -0,0 +1,45 @@
+from simplified_rest_client import SimpleRestClient
+from tracing import Tracer, read_spans
+from uc_validation import FAIL, PASS, SKIP, validate_fleet, validate_unity_catalog
+
+
+def test_passes_a_provisioned_workspace(workspace, tmp_path):
+    tracer = Tracer(path=str(tmp_path / "traces.jsonl"))
+    validation = validate_unity_catalog(workspace, probe_storage=True, tracer=tracer)
+
+    assert validation.passed, str(validation)
+    assert [(c.name, c.status) for c in validation.checks] == [
+        ("metastore-assignment", PASS),
+        ("storage-root-credential", PASS),
+        ("create-catalog", PASS),
+        ("storage-probe", PASS),
+    ]
+    spans = read_spans(tracer.path, tracer.trace_id)
+    assert [s.get("attributes").get("uc.validation.passed") for s in spans if s.get("name") == "uc-validation"] == [True]
+
+
+def test_skips_the_checks_of_a_workspace_without_metastore(server):
+    validation = validate_unity_catalog(SimpleRestClient(url=server.url, token="mock"), probe_storage=True)
+
+    assert not validation.passed
+    assert validation.metastore_id is None
+    assert [(c.name, c.status) for c in validation.checks] == [
+        ("metastore-assignment", FAIL),
+        ("storage-root-credential", SKIP),
+        ("create-catalog", SKIP),
+        ("storage-probe", SKIP),
+    ]
+
+
+def test_validates_a_fleet(server, workspace):
+    unassigned = SimpleRestClient(url=server.url, token="mock")
+    validations = validate_fleet([workspace, unassigned])
+
+    assert {url: v.passed for url, v in validations.items()} == {workspace.url: True, unassigned.url: False}
+
+
+def test_fails_a_principal_that_may_not_create_catalogs(workspace):
+    validation = validate_unity_catalog(workspace, principal="students")
+
+    assert not validation.passed
+    assert [c.name for c in validation.checks if c.status == FAIL] == ["create-catalog"]
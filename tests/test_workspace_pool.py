@@ -0,0 +1,73 @@
+import contextlib, dataclasses, io
+import pytest
+from conftest import load_script
+from scim_directory_cache import ScimDirectoryCache
+
+benchmark = load_script("benchmark-provisioning.py", "benchmark_provisioning")
+
+
+@pytest.fixture
+def workspace_pool(cache_dir, monkeypatch):
+    import workspace_pool
+
+    # The pool's copy of the setup script has a directory cache of its own
+    monkeypatch.setattr(workspace_pool.setup_script, "directory_cache", ScimDirectoryCache(str(cache_dir / "scim-directory.sqlite")))
+    return workspace_pool
+
+
+@pytest.fixture
+def pool(server, workspace_pool):
+    pool = workspace_pool.WorkspacePool(benchmark.make_config(server, 0, 0), name="warm", target_size=2)
+    with contextlib.redirect_stdout(io.StringIO()):  # The setup script is chatty
+        yield pool
+    pool.shutdown()
+
+
+def lab_config(server, index: int):
+    return dataclasses.replace(benchmark.make_config(server, index, 3), courseware_urls=["course=example-course&token=abc"])
+
+
+def test_refills_to_the_target_size(pool, workspace_pool):
+    pool.refill()
+    pool.wait()
+    assert pool.status() == {workspace_pool.READY: 2}
+
+    pool.resize(1)
+    pool.wait()
+    assert pool.status() == {workspace_pool.READY: 1}
+
+
+def test_assigns_warm_workspaces(server, pool, workspace_pool):
+    pool.refill()
+    pool.wait()
+
+    config = pool.assign(lab_config(server, 1))
+    pool.wait()
+    assert config.workspace_name.startswith("warm-")
+    assert pool.status() == {workspace_pool.ASSIGNED: 1, workspace_pool.READY: 2}
+
+    pool.release(config)
+    assert pool.status() == {workspace_pool.READY: 2}
+
+
+def test_marks_failed_assignments(server, pool, workspace_pool, monkeypatch):
+    pool.refill()
+    pool.wait()
+
+    def assign_workspace(config):
+        raise Exception("Unable to add the users.")
+
+    monkeypatch.setattr(workspace_pool.setup_script, "assign_workspace", assign_workspace)
+    with pytest.raises(Exception, match="Unable to add the users."):
+        pool.assign(lab_config(server, 1))
+    pool.wait()
+
+    # Not returned to the pool, which is refilled all the same
+    assert pool.status() == {workspace_pool.FAILED: 1, workspace_pool.READY: 2}
+
+
+def test_creates_a_workspace_when_none_is_ready(server, pool, workspace_pool):
+    pool.target_size = 0
+    config = pool.assign(lab_config(server, 1))
+    assert config.workspace_name == "classroom-001"
+    assert pool.status() == dict()
@@ -11,6 +11,8 @@
 # MAGIC     * **DBAcademy DLT** - which should be used on DLT piplines.
 # MAGIC * Create or update the shared **DBAcademy Warehouse** for use in Databricks SQL exercises.
 # MAGIC * Updating workspace-specific grants in the **main** and **hive_metastore** catalogs.
+# MAGIC
+# MAGIC Each of these is a stage in the folder **stages**, run by the Workspace-Setup job as its own task (see **universal-workspace-setup-job-config.json**). This notebook runs the same stages, in parallel, for use outside of the job.
 
 # COMMAND ----------
 
@@ -20,12 +22,7 @@
 
 # COMMAND ----------
 
-version = "v4.0.7"
-library_url = f"https://github.com/databricks-academy/dbacademy/releases/download/{version}/dbacademy-{version[1:]}-py3-none-any.whl"
-pip_command = f"install --quiet --disable-pip-version-check {library_url}"
-
-# And print just for reference...
-print(pip_command)
+# MAGIC %run ./stages/_dbacademy
 
 # COMMAND ----------
 
@@ -35,207 +32,13 @@ print(pip_command)
 
 # MAGIC %md
 # MAGIC # Define Required Parameters (e.g. Widgets)
-# MAGIC The three variables defined by these widgets are used to configure our environment as a means of controlling class cost.
-
-# COMMAND ----------
-
-# # Removes all widgets while testing
-# dbutils.widgets.removeAll()
-
-# COMMAND ----------
-
-from dbacademy import dbgems
-from dbacademy.common import Cloud
-from dbacademy.dbhelper import WorkspaceHelper
-from dbacademy.dbrest import DBAcademyRestClient
-
-# Used throughout for different operations
-client = DBAcademyRestClient(throttle_seconds=1)
-
-try:
-    created_widgets=False
-    dbutils.widgets.get(WorkspaceHelper.PARAM_EVENT_ID)
-    dbutils.widgets.get(WorkspaceHelper.PARAM_EVENT_DESCRIPTION)
-    dbutils.widgets.get(WorkspaceHelper.PARAM_POOLS_NODE_TYPE_ID)
-    dbutils.widgets.get(WorkspaceHelper.PARAM_DEFAULT_SPARK_VERSION)
-    dbutils.widgets.get(WorkspaceHelper.PARAM_DATASETS)
-    dbutils.widgets.get(WorkspaceHelper.PARAM_COURSES)
-except:
-    created_widgets = False if dbgems.is_job() else True
-    
-    # lab_id is the name assigned to this event/class or alternatively its class number
-    dbutils.widgets.text(WorkspaceHelper.PARAM_EVENT_ID, "", "1. Class/Event/Lab ID (optional)")
-    dbutils.widgets.text(WorkspaceHelper.PARAM_EVENT_DESCRIPTION, "", "2. Event Description (optional)")
-    dbutils.widgets.text(WorkspaceHelper.PARAM_POOLS_NODE_TYPE_ID, "", "3. Pool's Node Type ID (required)")
-    dbutils.widgets.text(WorkspaceHelper.PARAM_DEFAULT_SPARK_VERSION, "", "4. Default Spark Versions (required)")
-    dbutils.widgets.text(WorkspaceHelper.PARAM_DATASETS, "", "5. Datasets (defaults to all)")
-    dbutils.widgets.text(WorkspaceHelper.PARAM_COURSES, "", "6. DBC URLs (defaults to none)")
-
-
-# COMMAND ----------
-
-if created_widgets:
-    # This has to exist in a different cell or the widgets won't be created.
-    raise Exception("Please fill out widgets at the top and then reexecute \"Run All\"")
-else:
-    # Start a timer so we can benchmark execution duration.
-    setup_start = dbgems.clock_start()
-    
-    lab_id = dbgems.get_parameter(WorkspaceHelper.PARAM_EVENT_ID, None)
-    print("Lab ID:        ", lab_id or "None")
-    
-    workspace_description = dbgems.get_parameter(WorkspaceHelper.PARAM_EVENT_DESCRIPTION, None)
-    print("Description:   ", workspace_description or "None")
-    
-    node_type_id = dbgems.get_parameter(WorkspaceHelper.PARAM_POOLS_NODE_TYPE_ID, None)
-    assert node_type_id is not None, f"The parameter \"Node Type ID\" must be specified."
-    print("Node Type ID:  ", node_type_id or "None")
-    
-    spark_version = dbgems.get_parameter(WorkspaceHelper.PARAM_DEFAULT_SPARK_VERSION, None)
-    assert spark_version is not None, f"The parameter \"Spark Version\" must be specified."
-    print("Spark Versions:", spark_version or "None")
-    
-    datasets = dbgems.get_parameter(WorkspaceHelper.PARAM_DATASETS, None)
-    datasets = None if datasets is None or datasets.lower().strip() in ["", "none", "null"] else datasets
-    print("Datasets:      ", datasets or "All ILT Datasets")
-        
-    courses = dbgems.get_parameter(WorkspaceHelper.PARAM_COURSES, None)
-    courses = None if courses is None or courses.lower().strip() in ["", "none", "null"] else courses
-    print("Courses:       ", courses or "None")
-
-    workspace_name = WorkspaceHelper.get_workspace_name()
-    print("Workspace Name:", workspace_name)
-
-
-# COMMAND ----------
-
-# MAGIC %md
+# MAGIC The variables defined by these widgets are used to configure our environment as a means of controlling class cost, and how the datasets are installed.
 # MAGIC
-# MAGIC ## Create Class Instance Pools
-# MAGIC The following cell configures the instance pool used for this class
+# MAGIC Tracing is configured along with them, recording each stage as a span in a file of its own next to **/dbfs/tmp/dbacademy/workspace-setup/traces.jsonl** unless overridden with the environment variable **WORKSPACE_SETUP_TRACE_FILE**.
 
 # COMMAND ----------
 
-from dbacademy.dbhelper.clusters_helper_class import ClustersHelper
-
-instance_pool_id = ClustersHelper.create_named_instance_pool(
-    client=client,
-    name=ClustersHelper.POOL_DEFAULT_NAME,
-    min_idle_instances=0,
-    idle_instance_autotermination_minutes=15,
-    lab_id=lab_id,
-    workspace_description=workspace_description,
-    workspace_name=workspace_name,
-    org_id=dbgems.get_org_id(),
-    node_type_id=node_type_id,
-    preloaded_spark_version=spark_version)
-
-# COMMAND ----------
-
-# MAGIC %md
-# MAGIC
-# MAGIC ## Create The Three Class-Specific Cluster Policies
-# MAGIC The following cells create the various cluster policies used by the class
-
-# COMMAND ----------
-
-ClustersHelper.create_all_purpose_policy(client=client, 
-                                         instance_pool_id=instance_pool_id, 
-                                         spark_version=spark_version,
-                                         autotermination_minutes_max=180,
-                                         autotermination_minutes_default=120)
-
-ClustersHelper.create_jobs_policy(client=client, 
-                                  instance_pool_id=instance_pool_id, 
-                                  spark_version=spark_version)
-
-ClustersHelper.create_dlt_policy(client=client, 
-                                 lab_id=lab_id, 
-                                 workspace_description=workspace_description, 
-                                 workspace_name=workspace_name,
-                                 org_id=dbgems.get_org_id())
-
-# COMMAND ----------
-
-# MAGIC %md
-# MAGIC
-# MAGIC ## Create Class-Shared Databricks SQL Warehouse/Endpoint
-# MAGIC Creates a single wharehouse to be used by all students.
-# MAGIC
-# MAGIC The configuration is derived from the number of students specified above.
-
-# COMMAND ----------
-
-from dbacademy.dbhelper.warehouses_helper_class import WarehousesHelper
-
-# Remove the existing Starter Warehouse
-client.sql.endpoints.delete_by_name("Starter Warehouse")
-client.sql.endpoints.delete_by_name("Serverless Starter Warehouse")
-
-# Create the new DBAcademy Warehouse
-warehouse_id = WarehousesHelper.create_sql_warehouse(client=client,
-                                                     name=WarehousesHelper.WAREHOUSES_DEFAULT_NAME,
-                                                     auto_stop_mins=None,
-                                                     min_num_clusters=1,
-                                                     max_num_clusters=20,
-                                                     enable_serverless_compute=True)
-
-# COMMAND ----------
-
-# MAGIC %md
-# MAGIC
-# MAGIC ## Configure Permissions
-# MAGIC This is required for the DAWD class. While we thought it was addressed with a courseware update, testing prior to DAIS indicated that it was still required.  
-
-# COMMAND ----------
-
-endpoint = client.sql.endpoints.get_by_name(WarehousesHelper.WAREHOUSES_DEFAULT_NAME)
-warehouse_id = endpoint.get("id")
-statements = [
-    "GRANT SELECT ON ANY FILE TO `users`"
-]
-for catalog in ["main", "hive_metastore"]:
-    for statement in statements:
-        client.sql.statements.execute(warehouse_id=warehouse_id, catalog=catalog, schema="default", statement=statement)
-
-# COMMAND ----------
-
-# MAGIC %md
-# MAGIC
-# MAGIC ## Validate UC Configuration.
-# MAGIC This operation attempts to create a catalog and a table in that catalog.
-# MAGIC
-# MAGIC If UC is not configured properly then this operation would be expected to fail.
-
-# COMMAND ----------
-
-# MAGIC %sql
-# MAGIC CREATE CATALOG IF NOT EXISTS WORKSPACE_SETUP ;
-# MAGIC SHOW DATABASES IN WORKSPACE_SETUP;
-# MAGIC CREATE TABLE IF NOT EXISTS WORKSPACE_SETUP.default.test AS SELECT true AS test_passed;
-# MAGIC SELECT * FROM WORKSPACE_SETUP.default.test;
-
-# COMMAND ----------
-
-# MAGIC %sql
-# MAGIC DROP CATALOG WORKSPACE_SETUP CASCADE;
-
-# COMMAND ----------
-
-# MAGIC %md
-# MAGIC
-# MAGIC # Install Datasets
-# MAGIC If a specific dataset is not specified, all datasets will be installed.
-# MAGIC
-# MAGIC This includes the latest and latest-1 datasets to account for courses where-in to datasets are being used two versions of the same course in any given season of development.
-
-# COMMAND ----------
-
-WorkspaceHelper.install_datasets(datasets)
-
-# COMMAND ----------
-
-print(f"Setup completed {dbgems.clock_stopped(setup_start)}")
+# MAGIC %run ./stages/_common
 
 # COMMAND ----------
 
@@ -261,8 +64,57 @@ print(f"Setup completed {dbgems.clock_stopped(setup_start)}")
 
 # COMMAND ----------
 
-WorkspaceHelper.uninstall_courseware(client, courses, subdirectory=None)
+# MAGIC %md
+# MAGIC
+# MAGIC # Run the Setup Stages
+# MAGIC Runs each of the job's tasks as a notebook, all at once except for those declaring **depends_on**, which start once the stages they depend on have completed.
+# MAGIC
+# MAGIC The setup therefore takes as long as its longest stage; the last stage, **setup-complete**, reports the duration of each.
 
 # COMMAND ----------
 
-WorkspaceHelper.install_courseware(client, courses, subdirectory=None)
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+with open("universal-workspace-setup-job-config.json", "r") as f:
+    stage_tasks = json.load(f).get("tasks")
+
+# The stages are passed this notebook's parameters, and its trace id so that their spans are recorded in its trace.
+arguments = {p: dbutils.widgets.get(p) for p in [WorkspaceHelper.PARAM_EVENT_ID,
+                                                 WorkspaceHelper.PARAM_EVENT_DESCRIPTION,
+                                                 WorkspaceHelper.PARAM_POOLS_NODE_TYPE_ID,
+                                                 WorkspaceHelper.PARAM_DEFAULT_SPARK_VERSION,
+                                                 WorkspaceHelper.PARAM_DATASETS,
+                                                 WorkspaceHelper.PARAM_COURSES]}
+arguments[PARAM_STUDENT_COUNT] = str(student_count or "")
+for p in [PARAM_DATASETS_INSTALL_MODE, PARAM_DATASETS_USAGE_FOLDER, PARAM_SHARED_DATASETS_URL]:
+    arguments[p] = get_optional_parameter(p, "")
+arguments["trace_id"] = tracer.trace_id
+
+
+def run_stage(task: dict) -> str:
+    print(f"""Starting the stage {task.get("task_key")}.""")
+    # Along with the stage's own parameters in the job's configuration, e.g. uc_validation, unless templated
+    base_parameters = task.get("notebook_task").get("base_parameters", dict())
+    stage_arguments = {**{k: v for k, v in base_parameters.items() if not v.startswith("{{")}, **arguments}
+    dbutils.notebook.run(f"""./{task.get("notebook_task").get("notebook_path")}""", task.get("timeout_seconds", 0), stage_arguments)
+    return task.get("task_key")
+
+
+completed = set()
+pending = list(stage_tasks)
+running = dict()
+with ThreadPoolExecutor(max_workers=len(stage_tasks)) as executor:
+    while pending or running:
+        for task in [t for t in pending if all(d.get("task_key") in completed for d in t.get("depends_on", list()))]:
+            pending.remove(task)
+            running[executor.submit(run_stage, task)] = task
+        
+        if not running:
+            raise Exception(f"""The stages {[t.get("task_key") for t in pending]} depend on stages that do not exist.""")
+        
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            running.pop(future)
+            completed.add(future.result())  # Re-raises the stage's failure
+
+print(f"Setup completed {dbgems.clock_stopped(setup_start)}")